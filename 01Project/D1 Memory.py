@@ -1,22 +1,185 @@
 # Aggiunta del layer Memory all'agente
 
 from openai import OpenAI
+from completion_cache import CompletionCache
+from memory_window import TokenWindow, count_message_tokens
+from session_store import JSONLSessionStore
+from concurrent.futures import Future, ThreadPoolExecutor
 from dotenv import load_dotenv
-from typing import List, Dict, Literal
+from typing import Callable, List, Dict, Literal, Optional
 import os
 
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a conversation between a user and an assistant. "
+    "Update the current summary with the new turns below. Keep every fact, name, number and "
+    "open question the assistant may need later; drop greetings and repetitions. "
+    "Reply with the updated summary only."
+)
+
+# Un solo pool condiviso per i riassunti in background di tutte le Memory del processo
+_summary_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="memory-summary")
+
+
+# Aggiorna il riassunto esistente con i nuovi turni (non lo rigenera da zero)
+def summarize_turns(previous_summary: Optional[str], turns: List[Dict[str, str]]) -> str:
+    transcript = "\n".join(f"{turn['role']}: {turn['content']}" for turn in turns)
+    response = client.chat.completions.create(
+        model="gpt-4o-mini",
+        temperature=0.0,
+        messages=[
+            {"role": "system", "content": SUMMARY_PROMPT},
+            {"role": "user", "content": f"Current summary:\n{previous_summary or '(empty)'}\n\n"
+                                        f"New turns:\n{transcript}"},
+        ],
+    )
+    return response.choices[0].message.content
+
+
 class Memory:
-    def __init__(self):
+    # max_tokens: budget di default per get_messages (None = cronologia completa)
+    # compact_after: oltre questa soglia di token i turni più vecchi vengono riassunti (None = disattivato)
+    # keep_last: quanti messaggi recenti restano sempre in forma integrale
+    # summarizer: funzione (riassunto precedente, nuovi turni) -> riassunto aggiornato
+    # store / session_id: archivio persistente (es. JSONLSessionStore) da cui ricaricare la sessione
+    def __init__(self,
+                 max_tokens: int = None,
+                 compact_after: int = None,
+                 keep_last: int = 6,
+                 summarizer: Callable[[Optional[str], List[Dict[str, str]]], str] = summarize_turns,
+                 store=None,
+                 session_id: str = None):
         self.messages: List[Dict[str, str]] = []
+        self.max_tokens = max_tokens
+        self._window = TokenWindow()
+        self._indexed = 0
+
+        self.compact_after = compact_after
+        self.keep_last = keep_last
+        self.summarizer = summarizer
+        self.summary: Optional[str] = None
+        self.archive: List[Dict[str, str]] = []
+        self._head = 0
+        self._turn_tokens = 0
+        self._pending: Optional[Future] = None
+        self._pending_count = 0
+        self._folded = 0  # messaggi del log sostituiti dal riassunto
+
+        self.store = store
+        self.session_id = session_id
+        if store is not None:
+            # Il log viene solo indicizzato: i messaggi sono decodificati quando servono
+            self.messages = store.load(session_id)
+            saved = store.load_summary(session_id)
+            if saved is not None:
+                self._restore_summary(*saved)
+            elif compact_after is not None:
+                for index, message in enumerate(self.messages):
+                    self._track(index, message)
 
     def add_message(self, role: Literal['user', 'system', 'assistant'], content: str):
-        self.messages.append({
+        message = {
             "role": role,
             "content": content
-        })
+        }
+        self._apply_compaction()
+        self.messages.append(message)
+        if self.store is not None:
+            self.store.append(self.session_id, message)
+        self._track(len(self.messages) - 1, message)
+        self._maybe_compact()
 
-    def get_messages(self) -> List[Dict[str, str]]:
-        return self.messages
+    # Con un budget restituisce il messaggio di sistema e i turni più recenti che ci stanno
+    def get_messages(self, max_tokens: int = None) -> List[Dict[str, str]]:
+        self._apply_compaction()
+        if max_tokens is None:
+            max_tokens = self.max_tokens
+        if max_tokens is None:
+            # Sempre una lista vera: i messaggi caricati da un archivio sono una LazyMessages
+            return list(self.messages)
+        self._sync_window()
+        return self._window.select(self.messages, max_tokens)
+
+    # Distingue i messaggi di sistema iniziali dai turni e conta i token di questi ultimi
+    def _track(self, index: int, message: Dict[str, str]):
+        if message["role"] == "system" and index == self._head and self.summary is None:
+            self._head += 1
+        else:
+            self._turn_tokens += count_message_tokens(message)
+
+    # Indicizza nella finestra i messaggi aggiunti (o caricati) dall'ultima chiamata
+    def _sync_window(self):
+        for message in self.messages[self._indexed:]:
+            self._window.append(message)
+        self._indexed = len(self.messages)
+
+    # Attende l'eventuale riassunto in corso e lo applica
+    def wait_compaction(self) -> None:
+        if self._pending is not None:
+            self._pending.exception()
+        self._apply_compaction()
+
+    # Avvia in background il riassunto dei turni più vecchi quando si supera la soglia
+    def _maybe_compact(self):
+        if self.compact_after is None or self._pending is not None:
+            return
+        if self._turn_tokens <= self.compact_after:
+            return
+        start = self._head + (1 if self.summary is not None else 0)
+        end = len(self.messages) - self.keep_last
+        if end <= start:
+            return
+        turns = list(self.messages[start:end])
+        self._pending = _summary_executor.submit(self.summarizer, self.summary, turns)
+        self._pending_count = len(turns)
+
+    # Se il riassunto è pronto sostituisce i turni riassunti con il messaggio di riepilogo
+    def _apply_compaction(self):
+        if self._pending is None or not self._pending.done():
+            return
+        future, count = self._pending, self._pending_count
+        self._pending = None
+        if future.exception() is not None:
+            # Il riassunto è fallito: i turni restano integrali e si riprova al prossimo messaggio
+            return
+
+        start = self._head + (1 if self.summary is not None else 0)
+        folded = self.messages[start:start + count]
+        recent = self.messages[start + count:]
+        self.archive.extend(folded)
+        self.summary = future.result()
+        self.messages = self.messages[:self._head] + [self._summary_message()] + recent
+        self._folded += count
+        if self.store is not None:
+            # Il log resta append-only: si salva solo il riassunto e quanti messaggi sostituisce
+            self.store.save_summary(self.session_id, self.summary, self._folded)
+
+        self._window.reset()
+        self._indexed = 0
+        self._turn_tokens = sum(count_message_tokens(message) for message in recent)
+
+    def _summary_message(self) -> Dict[str, str]:
+        return {
+            "role": "system",
+            "content": f"Summary of the earlier conversation: {self.summary}",
+        }
+
+    # Sessione ricaricata dopo una compattazione: i messaggi riassunti non vengono decodificati
+    def _restore_summary(self, summary: str, folded: int):
+        head = 0
+        while head < len(self.messages) and self.messages[head]["role"] == "system":
+            head += 1
+        recent = self.messages[head + folded:]
+        self.summary, self._folded, self._head = summary, folded, head
+        self.messages = self.messages[:head] + [self._summary_message()] + recent
+        self._turn_tokens = sum(count_message_tokens(message) for message in recent)
+
+    # Chiude il log mappato in memoria della sessione caricata dall'archivio
+    def close(self) -> None:
+        self.wait_compaction()
+        close = getattr(self.messages, "close", None)
+        if close is not None:
+            self.messages = list(self.messages)
+            close()
 
 # 1. Aggiunge il messaggio alla memoria
 # 2. Chiama l'LLM con la lista dei messaggi presenti in memoria
@@ -45,9 +208,11 @@ def chat(user_message: str = None, memory: Memory = None) -> str:
 if __name__ == '__main__':
     # Carica le variabili d'ambiente e inizializza il client OpenAI
     load_dotenv()
-    client = OpenAI(
+    # Le chiamate a temperatura 0 passano dalla cache: le domande ripetute non vengono pagate due volte
+    cache = CompletionCache(path="completions_cache.sqlite")
+    client = cache.wrap(OpenAI(
         api_key=os.getenv("OPENAI_API_KEY")
-    )
+    ))
 
     # Esempio 1: chat senza memoria
     user_message = "What have I asked before?"
@@ -97,4 +262,15 @@ if __name__ == '__main__':
     print(chat(user_message="what have I asked?", memory=memory_obj))
 
     print("\nStato finale della memoria:")
-    print(memory_obj.get_messages())
\ No newline at end of file
+    print(memory_obj.get_messages())
+
+    # Esempio 4: sessione persistente, ricaricata dal log su disco a ogni esecuzione
+    store = JSONLSessionStore("sessions")
+    persistent_memory = Memory(store=store, session_id="demo")
+    if not persistent_memory.get_messages():
+        persistent_memory.add_message(role="system", content="You're a helpful assistant")
+    print(f"\nSessione 'demo' ricaricata con {len(persistent_memory.get_messages())} messaggi")
+    print(chat(user_message="what have I asked in previous sessions?", memory=persistent_memory))
+    persistent_memory.close()
+
+    print("\nStatistiche cache:", cache.stats())
\ No newline at end of file
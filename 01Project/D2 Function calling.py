@@ -4,9 +4,14 @@ identifies when to use a tool (function), extracts arguments, executes the tool,
 conversation, enabling a full loop of reasoning and tool use.
 """
 
-from typing import List, Dict, Literal
+from typing import AsyncIterator, List, Dict, Literal
+import asyncio
 import json
 from openai import OpenAI
+from llm_clients import aclose_all, get_async_client
+from memory_window import TokenWindow
+from tool_cache import CachePolicy, ToolResultCache
+from tool_executor import ToolError, ToolExecutor
 from dotenv import load_dotenv
 import os
 
@@ -18,8 +23,10 @@ client = OpenAI(
 class Memory:
     """Memorizza i messaggi scambiati con l'assistente."""
 
-    def __init__(self):
+    def __init__(self, max_tokens: int = None):
         self._messages: List[Dict[str, str]] = []
+        self.max_tokens = max_tokens
+        self._window = TokenWindow()
 
     def add_message(self,
                     role: Literal['user', 'system', 'assistant', 'tool'],
@@ -44,10 +51,18 @@ class Memory:
             }
 
         self._messages.append(message)
-
-    def get_messages(self) -> List[Dict[str, str]]:
-        """Restituisce tutti i messaggi."""
-        return self._messages
+        self._window.append(message)
+
+    def get_messages(self, max_tokens: int = None) -> List[Dict[str, str]]:
+        """
+        Restituisce i messaggi. Con un budget di token (o self.max_tokens) restituisce il messaggio di
+        sistema e i turni più recenti che ci stanno, senza separare tool_calls e risultati dei tool.
+        """
+        if max_tokens is None:
+            max_tokens = self.max_tokens
+        if max_tokens is None:
+            return self._messages
+        return self._window.select(self._messages, max_tokens)
 
     def last_message(self) -> Dict:
         """Restituisce l'ultimo messaggio."""
@@ -58,6 +73,7 @@ class Memory:
     def reset(self) -> None:
         """Svuota la memoria."""
         self._messages = []
+        self._window.reset()
 
 
 """
@@ -109,24 +125,19 @@ def chat_with_tools(user_question: str = None,
                            tool_calls=tool_calls_list)
     return message
 
-def chat_with_tools_loop(user_question: str, memory: Memory, tools: list, model="gpt-4o-mini"):
+# max_concurrency: quante tool call dello stesso turno possono essere eseguite contemporaneamente
+def chat_with_tools_loop(user_question: str, memory: Memory, tools: list, model="gpt-4o-mini",
+                         max_concurrency: int = 4):
     # Step 1: manda il messaggio
     message = chat_with_tools(user_question, memory, tools=tools, model=model)
 
     # Step 2: controlla se il modello vuole usare un tool
     while hasattr(message, 'tool_calls') and message.tool_calls:
-        for call in message.tool_calls:
-            # Accedi agli attributi dell'oggetto, non come dizionario
-            tool_name = call.function.name
-            tool_args = json.loads(call.function.arguments)
-
-            print(f"Calling tool: {tool_name} with args: {tool_args}")
-
-            # Esegui il tool
-            result = run_tool(tool_name, tool_args)
-
-            print(f"Tool result: {result}")
+        # Esegui in parallelo tutti i tool richiesti in questo turno
+        results = run_tool_calls(message.tool_calls, max_concurrency=max_concurrency)
 
+        # I risultati vengono salvati nello stesso ordine delle tool call
+        for call, result in zip(message.tool_calls, results):
             # Inserisci il risultato nella memoria come messaggio "tool"
             memory.add_message(
                 role="tool",
@@ -194,14 +205,236 @@ tools = [
 
 
 
+# Associa il nome di ogni tool alla funzione Python (sincrona o async) che lo implementa
+available_tools = {
+    "get_current_weather": get_current_weather,
+    "power": power,
+}
+
+# Politica di cache per ogni tool, condivisa da tutte le sessioni del processo:
+# power è una funzione pura, il meteo cambia e vale solo per 10 minuti.
+# I tool non elencati non vengono mai messi in cache.
+tool_cache = ToolResultCache(policies={
+    "power": CachePolicy.forever(),
+    "get_current_weather": CachePolicy.expire_after(600),
+})
+
+# Ogni tool gira isolato con un timeout e un limite sul risultato; power può richiedere molta CPU
+# (es. 10 ** 10_000_000) e per questo viene eseguito in un processo separato.
+tool_executor = ToolExecutor(
+    cpu_bound={"power"},
+    timeout=5.0,
+    max_result_chars=4000,
+)
+
+
 def run_tool(tool_name, tool_args):
     """Esegue il tool richiesto."""
-    if tool_name == "get_current_weather":
-        return get_current_weather(**tool_args)
-    elif tool_name == "power":
-        return power(**tool_args)
-    else:
+    tool = available_tools.get(tool_name)
+    if tool is None:
         return "Tool not found"
+    hit, result = tool_cache.get(tool_name, tool_args)
+    if hit:
+        return result
+    try:
+        result = tool_executor.run(tool_name, tool, tool_args)
+    except ToolError as e:
+        # Timeout, crash o risultato troppo grande: l'errore strutturato viene restituito al modello
+        return e.to_json()
+    tool_cache.put(tool_name, tool_args, result)
+    return result
+
+
+async def run_tool_async(tool_name, tool_args):
+    """Esegue il tool senza bloccare l'event loop: i tool async vengono attesi, quelli sincroni girano nei pool."""
+    tool = available_tools.get(tool_name)
+    if tool is None:
+        return "Tool not found"
+    hit, result = tool_cache.get(tool_name, tool_args)
+    if hit:
+        return result
+    try:
+        result = await tool_executor.run_async(tool_name, tool, tool_args)
+    except ToolError as e:
+        return e.to_json()
+    tool_cache.put(tool_name, tool_args, result)
+    return result
+
+
+async def run_tool_calls_async(tool_calls, max_concurrency: int = 4) -> List[str]:
+    """Esegue in parallelo le tool call di un turno e restituisce i risultati nello stesso ordine."""
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def run_one(call):
+        async with semaphore:
+            try:
+                tool_args = json.loads(call.function.arguments)
+            except json.JSONDecodeError as e:
+                # Argomenti non validi: l'errore diventa il risultato, senza interrompere gli altri tool
+                return ToolError("invalid_arguments", str(e)).to_json()
+            print(f"Calling tool: {call.function.name} with args: {tool_args}")
+            result = await run_tool_async(call.function.name, tool_args)
+            print(f"Tool result: {result}")
+            return result
+
+    return await asyncio.gather(*(run_one(call) for call in tool_calls))
+
+
+def _require_no_running_loop(function: str, alternative: str) -> None:
+    """Le versioni sincrone creano il proprio event loop: dentro un loop (Jupyter, aiohttp) va usata quella async."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    raise RuntimeError(f"{function}() non può essere chiamata da un event loop in esecuzione: "
+                       f"usare `{alternative}`")
+
+
+def run_tool_calls(tool_calls, max_concurrency: int = 4) -> List[str]:
+    """Versione sincrona di run_tool_calls_async, usata da chat_with_tools_loop (fuori da un event loop)."""
+    _require_no_running_loop("run_tool_calls", "await run_tool_calls_async(...)")
+    return asyncio.run(run_tool_calls_async(tool_calls, max_concurrency=max_concurrency))
+
+
+class StreamedToolCall:
+    """
+    Tool call ricostruita dai delta dello streaming. Gli argomenti JSON vengono analizzati carattere
+    per carattere (profondità delle parentesi, stringhe, escape) mentre arrivano, così si sa appena
+    sono completi senza rileggere ogni volta tutto il buffer.
+    """
+
+    def __init__(self):
+        self.id = None
+        self.name = ""
+        self._arguments: List[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self.complete = False
+
+    @property
+    def arguments(self) -> str:
+        return "".join(self._arguments)
+
+    def feed(self, fragment: str) -> None:
+        self._arguments.append(fragment)
+        for char in fragment:
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self.complete = True
+
+    def to_dict(self) -> Dict:
+        return {
+            "id": self.id,
+            "type": "function",
+            "function": {"name": self.name, "arguments": self.arguments},
+        }
+
+
+async def astream_chat_with_tools_loop(user_question: str,
+                                       memory: Memory,
+                                       tools: list,
+                                       model: str = "gpt-4o-mini",
+                                       temperature: float = 0.0,
+                                       max_concurrency: int = 4) -> AsyncIterator[str]:
+    """
+    Versione in streaming di chat_with_tools_loop: restituisce i token di testo man mano che arrivano
+    e avvia ogni tool appena i suoi argomenti JSON sono completi, mentre il modello sta ancora
+    generando le tool call successive. In memoria i risultati restano nell'ordine delle tool call.
+    """
+    if user_question:
+        memory.add_message(role="user", content=user_question)
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def dispatch(call: StreamedToolCall) -> str:
+        async with semaphore:
+            try:
+                tool_args = json.loads(call.arguments)
+            except json.JSONDecodeError as e:
+                return ToolError("invalid_arguments", str(e)).to_json()
+            return await run_tool_async(call.name, tool_args)
+
+    while True:
+        # Client asincrono condiviso del registro, legato all'event loop in esecuzione
+        stream = await get_async_client().chat.completions.create(
+            model=model,
+            temperature=temperature,
+            messages=memory.get_messages(),
+            tools=tools,
+            stream=True,
+        )
+        content: List[str] = []
+        calls: Dict[int, StreamedToolCall] = {}
+        tasks: Dict[int, asyncio.Task] = {}
+
+        try:
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                if delta.content:
+                    content.append(delta.content)
+                    yield delta.content
+                for call_delta in delta.tool_calls or []:
+                    call = calls.setdefault(call_delta.index, StreamedToolCall())
+                    if call_delta.id:
+                        call.id = call_delta.id
+                    if call_delta.function and call_delta.function.name:
+                        call.name += call_delta.function.name
+                    if call_delta.function and call_delta.function.arguments:
+                        call.feed(call_delta.function.arguments)
+                    # Il tool parte subito, senza aspettare la fine della risposta
+                    if call.complete and call_delta.index not in tasks:
+                        tasks[call_delta.index] = asyncio.create_task(dispatch(call))
+        except BaseException:
+            # Stream fallito, cancellato o abbandonato dal chiamante: i tool già avviati non restano orfani
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            raise
+
+        ordered = [calls[index] for index in sorted(calls)]
+        memory.add_message(role="assistant",
+                           content="".join(content),
+                           tool_calls=[call.to_dict() for call in ordered])
+        if not ordered:
+            return
+
+        # Tool call con argomenti incompleti: vengono comunque eseguite per restituire l'errore al modello
+        for index in sorted(calls):
+            if index not in tasks:
+                tasks[index] = asyncio.create_task(dispatch(calls[index]))
+        results = await asyncio.gather(*(tasks[index] for index in sorted(calls)))
+        for call, result in zip(ordered, results):
+            memory.add_message(role="tool", content=str(result), tool_call_id=call.id)
+
+
+def chat_with_tools_stream(user_question: str, memory: Memory, tools: list, model="gpt-4o-mini") -> str:
+    """Stampa la risposta in streaming e restituisce il testo finale dell'assistente (fuori da un event loop)."""
+    _require_no_running_loop("chat_with_tools_stream", "async for token in astream_chat_with_tools_loop(...)")
+
+    async def consume():
+        try:
+            async for token in astream_chat_with_tools_loop(user_question, memory, tools, model=model):
+                print(token, end="", flush=True)
+        finally:
+            await aclose_all()
+        print()
+        return memory.last_message().get("content")
+
+    return asyncio.run(consume())
 
 if __name__ == "__main__":
     memory = Memory()
@@ -226,3 +459,11 @@ if __name__ == "__main__":
         print(f"\nLast message role: {last_msg.get('role')}")
         print(f"Last message content: {last_msg.get('content')}")
 
+    print(f"\nTool cache: {tool_cache.stats()}")
+
+    print("\n=== Test Function Calling in streaming ===")
+    chat_with_tools_stream("What's the weather in Rome and in London?", memory=memory, tools=tools)
+
+    # Un calcolo enorme non blocca più l'agente: scade il timeout e il modello riceve un errore strutturato
+    print(run_tool("power", {"base": 10, "exponent": 10_000_000}))
+
@@ -12,9 +12,13 @@
 # dipendenti più esperienze culturali, come musei, gallerie d'arte, concerti, ecc.
 
 
-from openai import OpenAI
+import asyncio
+from dataclasses import dataclass
+from typing import AsyncIterator, Iterable, List, Optional
+from openai import OpenAI, AsyncOpenAI
 from dotenv import load_dotenv
 import os
+from llm_clients import aclose_all, get_async_client
 
 load_dotenv()
 api_key = os.getenv("OPENAI_API_KEY")
@@ -47,6 +51,83 @@ def create_content(query: str,
 
     return content
 
+
+# Versione asincrona di create_content: stessa richiesta, ma non blocca l'event loop e permette
+# di inviare molte query in parallelo con lo stesso client AsyncOpenAI.
+async def create_content_async(query: str,
+                               client: AsyncOpenAI,
+                               system_prompt: str,
+                               model: str,
+                               temperature: float) -> str:
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": query},
+    ]
+    response = await client.chat.completions.create(
+        model=model,
+        messages=messages,
+        temperature=temperature,
+    )
+    return response.choices[0].message.content
+
+
+@dataclass
+class ContentResult:
+    """Esito di una singola query del batch: `content` se è andata bene, `error` altrimenti."""
+    index: int
+    query: str
+    content: Optional[str] = None
+    error: Optional[BaseException] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+async def stream_content_many(queries: Iterable[str],
+                              client: AsyncOpenAI,
+                              system_prompt: str,
+                              model: str,
+                              temperature: float,
+                              max_concurrency: int = 10) -> AsyncIterator[ContentResult]:
+    """
+    Genera i contenuti per tutte le query, al massimo `max_concurrency` richieste alla volta,
+    e restituisce ogni risultato appena è pronto (quindi non nell'ordine di input: usare `index`).
+    Un errore su una query viene riportato nel suo ContentResult e non interrompe le altre.
+    """
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def run(index: int, query: str) -> ContentResult:
+        async with semaphore:
+            try:
+                content = await create_content_async(query, client, system_prompt, model, temperature)
+                return ContentResult(index=index, query=query, content=content)
+            except Exception as e:
+                return ContentResult(index=index, query=query, error=e)
+
+    tasks = [asyncio.create_task(run(i, q)) for i, q in enumerate(queries)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # Se il chiamante smette di consumare i risultati, le richieste rimaste vengono annullate
+        for task in tasks:
+            task.cancel()
+
+
+async def create_content_many(queries: Iterable[str],
+                              client: AsyncOpenAI,
+                              system_prompt: str,
+                              model: str,
+                              temperature: float,
+                              max_concurrency: int = 10) -> List[ContentResult]:
+    """Come stream_content_many, ma attende tutto il batch e restituisce i risultati in ordine di input."""
+    queries = list(queries)
+    results: List[Optional[ContentResult]] = [None] * len(queries)
+    async for result in stream_content_many(queries, client, system_prompt, model, temperature, max_concurrency):
+        results[result.index] = result
+    return results
+
 if __name__ == '__main__':
     # Modello LLM da utilizzare
     model = "gpt-4o-mini"
@@ -75,6 +156,25 @@ if __name__ == '__main__':
 
     print(content)
 
+    # Batch asincrono: un post per ogni settore, pubblicato appena pronto
+    industries = ["automotive", "banking", "healthcare", "retail", "software"]
+    analyst_queries = [f"Create an instagram post for clients in the {industry} industry" for industry in industries]
+
+    async def publish_all():
+        # Client asincrono del registro condiviso (uno per event loop), chiuso alla fine del batch
+        async_client = get_async_client(api_key=api_key)
+        try:
+            async for result in stream_content_many(analyst_queries, async_client, system_prompt, model, temperature,
+                                                    max_concurrency=5):
+                if result.ok:
+                    print(f"\n[{result.index}] {result.query}\n{result.content}")
+                else:
+                    print(f"\n[{result.index}] {result.query} -> errore: {result.error}")
+        finally:
+            await aclose_all()
+
+    asyncio.run(publish_all())
+
 
 
 
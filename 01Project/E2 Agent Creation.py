@@ -14,8 +14,9 @@
 # - Assicurarsi che l'agente interagisca con un modello linguistico, passando il messaggio utente insieme alle istruzioni di sistema.
 # - Implementare un metodo per gestire l'elaborazione dei messaggi, assicurandosi che la risposta venga recuperata correttamente.
 
-from openai import OpenAI
 from dotenv import load_dotenv
+from llm_clients import get_client, prewarm
+from completion_cache import CompletionCache
 
 # Carica le variabili d'ambiente (ad esempio la chiave API OpenAI)
 load_dotenv()
@@ -60,6 +61,7 @@ class Agente:
         istruzioni: str = "Aiuta gli utenti con qualsiasi domanda",
         modello: str = "gpt-4o-mini",
         temperatura: float = 0.0,
+        cache: CompletionCache = None,
     ):
         """
         Inizializza l'agente con parametri personalizzabili.
@@ -68,13 +70,17 @@ class Agente:
         - istruzioni: istruzioni specifiche per il comportamento dell'agente
         - modello: modello OpenAI da utilizzare
         - temperatura: creatività delle risposte (0 = deterministico, 1 = creativo)
+        - cache: cache delle risposte, usata solo con temperatura 0 (opzionale)
         """
         self.nome = nome
         self.ruolo = ruolo
         self.istruzioni = istruzioni
         self.modello = modello
         self.temperatura = temperatura
-        self.client = OpenAI()
+        # Client condiviso tra tutti gli agenti: stesso pool di connessioni keep-alive
+        self.client = get_client()
+        if cache is not None:
+            self.client = cache.wrap(self.client)
 
     def invoca(self, messaggio: str) -> str:
         """
@@ -99,6 +105,9 @@ class Agente:
 
 # Se il file viene eseguito direttamente, vengono creati e testati diversi agenti
 if __name__ == '__main__':
+    # Apre in anticipo le connessioni del pool condiviso, usate da tutti gli agenti sotto
+    prewarm(connections=4)
+
     # Agente di default
     agente = Agente()
     risposta_default = agente.invoca("Qual è la capitale della Francia?")
@@ -69,10 +69,13 @@
 
 import json
 import os
-from typing import List, Dict, Literal
-from openai import OpenAI
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Literal, Optional
 from openai.types.chat.chat_completion_message import ChatCompletionMessage
 from dotenv import load_dotenv
+from llm_clients import get_client
+from memory_window import TokenWindow
+from reflection import HeuristicPreCritic, ReflectionStats, parse_critique, parse_verdict, similarity
 
 load_dotenv()
 
@@ -87,8 +90,61 @@ Provide a revised response if necessary in a Json Output structure:
 }
 """
 
+# Best-of-N: il critico valuta tutti i candidati e li fonde in un'unica risposta
+BEST_OF_N_PROMPT = """
+Below are several candidate responses to my last message.
+Score each candidate from 1 to 10 for accuracy, clarity and completeness.
+Then write the best possible final response, merging the strengths of the candidates and fixing their mistakes.
+Answer in a Json Output structure:
+{
+    "scores": [],
+    "best_candidate": 1,
+    "final_response": ""
+}
+"""
+
+# Un solo pool condiviso per generare i candidati di tutti gli agenti del processo
+_candidate_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="reflection-candidate")
+
 class Memory:
-    def __init__(self):
+    def __init__(self, max_tokens: int = None):
+        self._messages: List[Dict[str, str]] = []
+        self.max_tokens = max_tokens
+        self._window = TokenWindow()
+
+    def add_message(self, role: Literal['user', 'system', 'assistant'], content: str):
+        message = {
+            "role": role,
+            "content": content
+        }
+        self._messages.append(message)
+        self._window.append(message)
+
+    def get_messages(self, max_tokens: int = None) -> List[Dict[str, str]]:
+        if max_tokens is None:
+            max_tokens = self.max_tokens
+        if max_tokens is None:
+            return self._messages
+        return self._window.select(self._messages, max_tokens)
+
+    def last_message(self) -> None:
+        if self._messages:
+            return self._messages[-1]
+
+    def branch(self) -> "Scratchpad":
+        """Ramo temporaneo per i passaggi intermedi (vedi Scratchpad)."""
+        return Scratchpad(self)
+
+
+class Scratchpad:
+    """
+    Ramo copy-on-write della memoria per la riflessione: legge i messaggi del padre senza copiarli
+    e tiene in locale bozze, critiche e candidati. Se non viene salvato nulla, il padre resta com'è;
+    il budget di token del padre vale solo per i suoi messaggi.
+    """
+
+    def __init__(self, parent: Memory):
+        self.parent = parent
         self._messages: List[Dict[str, str]] = []
 
     def add_message(self, role: Literal['user', 'system', 'assistant'], content: str):
@@ -97,12 +153,13 @@ class Memory:
             "content": content
         })
 
-    def get_messages(self) -> List[Dict[str, str]]:
-        return self._messages
+    def get_messages(self, max_tokens: int = None) -> List[Dict[str, str]]:
+        return list(self.parent.get_messages(max_tokens)) + self._messages
 
     def last_message(self) -> None:
         if self._messages:
             return self._messages[-1]
+        return self.parent.last_message()
 
 
 class Agent:
@@ -115,7 +172,15 @@ class Agent:
             instructions: str = "Help users with any question",
             model: str = "gpt-4o-mini",
             temperature: float = 0.0,
-            critique_prompt: str = SELF_CRITIQUE_PROMPT
+            critique_prompt: str = SELF_CRITIQUE_PROMPT,
+            convergence_threshold: float = 0.95,
+            best_of_n_prompt: str = BEST_OF_N_PROMPT,
+            candidate_temperature: float = 0.8,
+            scratchpad: bool = True,
+            critic_model: Optional[str] = None,
+            critic_temperature: Optional[float] = None,
+            pre_critic: Optional[HeuristicPreCritic] = None,
+            max_tokens: Optional[int] = None
     ):
         self.name = name
         self.role = role
@@ -123,11 +188,12 @@ class Agent:
         self.model = model
         self.temperature = temperature
 
-        self.client = OpenAI(
+        self.client = get_client(
             api_key=os.getenv("OPENAI_API_KEY")
         )
 
-        self.memory = Memory()
+        # max_tokens: budget di token della cronologia inviata al modello (None = cronologia completa)
+        self.memory = Memory(max_tokens=max_tokens)
         self.memory.add_message(
             role="system",
             content=f"You're an AI Agent, your role is {self.role}, "
@@ -135,18 +201,41 @@ class Agent:
         )
 
         self.critique_prompt = critique_prompt
+        # Due risposte successive con similarità >= soglia sono considerate la stessa risposta
+        self.convergence_threshold = convergence_threshold
+        self.best_of_n_prompt = best_of_n_prompt
+        # I candidati devono essere diversi tra loro: con temperature 0 sarebbero tutti uguali
+        self.candidate_temperature = candidate_temperature
+        # Con scratchpad=True bozze e critiche restano fuori da self.memory: si salva solo la risposta finale
+        self.scratchpad = scratchpad
+        # Cascata: il modello (di solito più economico) che critica può essere diverso da quello che genera,
+        # e un pre-critico locale può accettare la bozza senza chiamare nessun modello
+        self.critic_model = critic_model or model
+        self.critic_temperature = temperature if critic_temperature is None else critic_temperature
+        self.pre_critic = pre_critic
+        self.stats = ReflectionStats()
 
     def invoke(self,
                user_message: str,
                self_reflection: bool = False,
                max_iter: int = 1,
-               verbose: bool = False) -> str:
+               verbose: bool = False,
+               early_exit: bool = True,
+               strategy: Literal['iterative', 'parallel'] = 'iterative',
+               n_candidates: int = 3) -> str:
 
         # Rules
         # - Non consentire valori inferiori a 1
         # - Non consentire valori superiori a 3
         # - Il valore massimo dell'iter è controllato dal flag self_reflection.
         # - Se impostato su true, è necessario chiamare l'LLM almeno un'altra volta per la critica
+        #
+        # strategy='iterative': risposta, poi critica e revisione fino a max_iter volte
+        # strategy='parallel': n_candidates risposte in parallelo (da 2 a 5), poi una sola critica
+        # Con un pre_critic la critica del modello viene saltata se la bozza supera i controlli locali
+
+        if strategy not in ('iterative', 'parallel'):
+            raise ValueError(f"Unknown reflection strategy: {strategy!r}")
 
         self.memory.add_message(
             role="user",
@@ -157,45 +246,144 @@ class Agent:
 
         max_iter = max_iter if max_iter >= 1 else 1
         max_iter = max_iter if max_iter <= 3 else 3
-        max_iter = max_iter if self_reflection else 0.5
-        loops = 2 * max_iter
-
-        for i in range(loops):
-            ai_message = self._get_completion(
-                messages=self.memory.get_messages()
-            )
-
+        max_iter = max_iter if self_reflection else 0
+
+        workspace = self.memory.branch() if self_reflection and self.scratchpad else self.memory
+        draft = None
+        if self_reflection and strategy == 'parallel':
+            n_candidates = min(max(n_candidates, 2), 5)
+            response, exit_reason = self._best_of_n(workspace, n_candidates, verbose)
+        else:
+            response, exit_reason, draft = self._reflect(workspace, max_iter, verbose, early_exit)
+
+        # La risposta finale va in memoria, tranne quando è la bozza già salvata lì (scratchpad=False
+        # e nessuna revisione): la stessa risposta due volte raddoppierebbe i suoi token nei prompt
+        if self_reflection and (workspace is not self.memory or response != draft):
             self.memory.add_message(
                 role="assistant",
-                content=ai_message.content,
+                content=response,
             )
-            """"if verbose:
-                self._log_last_message()"""
+            if verbose:
+                self._log_last_message()
+
+        self.stats.answers += 1
+        self.stats.record_exit(exit_reason)
+        return response
+
+    def _reflect(self, memory, max_iter: int, verbose: bool, early_exit: bool):
+        """Ciclo iterativo: restituisce (risposta finale, motivo di uscita, bozza iniziale)."""
+        # Risposta iniziale
+        response = draft = self._get_completion(
+            messages=memory.get_messages()
+        ).content
+        memory.add_message(
+            role="assistant",
+            content=response,
+        )
+        if verbose:
+            self._log_last_message(memory)
+
+        exit_reason = "no_reflection" if max_iter == 0 else "max_iter"
+        for i in range(max_iter):
+            critique_prompt = self.critique_prompt
+            if self.pre_critic is not None:
+                issues = self.pre_critic.review(response)
+                if not issues:
+                    self.stats.record_decision("heuristic_accept")
+                    exit_reason = "pre_critic"
+                    break
+                # La bozza non supera i controlli: decide il critico, sapendo cosa non va
+                self.stats.record_decision("heuristic_escalate")
+                critique_prompt += "\nAutomatic checks found these problems: " + "; ".join(issues) + "."
+            self.stats.record_decision("critic")
+
+            memory.add_message(
+                role="user",
+                content=critique_prompt
+            )
+            # La critica contiene già la risposta rivista: non serve un'altra chiamata per ottenerla
+            critique_text = self._get_critique(
+                messages=memory.get_messages()
+            ).content
+            memory.add_message(
+                role="assistant",
+                content=critique_text,
+            )
+            if verbose:
+                self._log_last_message(memory)
+
+            critique = parse_critique(critique_text)
+            if critique is None:
+                exit_reason = "unparseable"
+                break
+            if not critique.needs_revision:
+                if early_exit:
+                    exit_reason = "no_revisions"
+                    break
+                continue
+
+            previous, response = response, critique.updated_response
+            if early_exit and similarity(previous, response) >= self.convergence_threshold:
+                exit_reason = "converged"
+                break
+
+        return response, exit_reason, draft
+
+    def _best_of_n(self, memory, n_candidates: int, verbose: bool):
+        """Best-of-N: candidati in parallelo e un solo giudizio; restituisce (risposta, motivo di uscita)."""
+        messages = list(memory.get_messages())
+        futures = [
+            _candidate_executor.submit(self._create, messages, self.model, self.candidate_temperature)
+            for _ in range(n_candidates)
+        ]
+        candidates = [future.result().content or "" for future in futures]
+
+        memory.add_message(
+            role="user",
+            content=self._candidates_prompt(candidates)
+        )
+        if verbose:
+            self._log_last_message(memory)
+
+        verdict_text = self._get_critique(
+            messages=memory.get_messages()
+        ).content
+        memory.add_message(
+            role="assistant",
+            content=verdict_text,
+        )
+        if verbose:
+            self._log_last_message(memory)
 
-            if i < loops - 1:
-                self.memory.add_message(
-                    role="user",
-                    content=self.critique_prompt
-                )
-                """"if verbose:
-                    self._log_last_message()"""
+        verdict = parse_verdict(verdict_text, len(candidates))
+        if verdict is None:
+            return candidates[0], "unparseable"
+        return verdict.choose(candidates), "best_of_n"
 
-                ai_message = self._get_completion(
-                    messages=self.memory.get_messages()
-                )
+    def _candidates_prompt(self, candidates: List[str]) -> str:
+        blocks = [f"### Candidate {i}\n{candidate}" for i, candidate in enumerate(candidates, start=1)]
+        return self.best_of_n_prompt + "\n" + "\n\n".join(blocks)
 
     def _get_completion(self, messages: List[Dict]) -> ChatCompletionMessage:
+        return self._create(messages, self.model, self.temperature)
+
+    def _get_critique(self, messages: List[Dict]) -> ChatCompletionMessage:
+        return self._create(messages, self.critic_model, self.critic_temperature)
+
+    def _create(self, messages: List[Dict], model: str, temperature: float) -> ChatCompletionMessage:
         response = self.client.chat.completions.create(
-            model=self.model,
-            temperature=self.temperature,
+            model=model,
+            temperature=temperature,
             messages=messages
         )
+        self.stats.record_call(model, response.usage.prompt_tokens if response.usage else 0)
 
         return response.choices[0].message
 
-    def _log_last_message(self):
-        print(f"### {self.memory.last_message()['role']} message ###\n".upper())
-        print(f"{self.memory.last_message()['content']} \n")
+    def _log_last_message(self, memory=None):
+        message = (memory or self.memory).last_message()
+        print(f"### {message['role']} message ###\n".upper())
+        print(f"{message['content']} \n")
         print("\n________________________________________________________________\n")
 
 if __name__ == '__main__':
@@ -253,4 +441,19 @@ if __name__ == '__main__':
     agente = Agent()
 
     agente.invoke("Ciao, come va?",True,2,True)
-    print(agente.memory.last_message())
\ No newline at end of file
+    print(agente.memory.last_message())
+
+    # Best-of-N: tre candidati generati in parallelo e una sola critica
+    agente.invoke("Spiegami cos'è un'API in due frasi", True, verbose=True, strategy='parallel', n_candidates=3)
+    print(f"Chiamate al modello: {agente.stats.llm_calls}, uscita: {agente.stats.exits}")
+
+    # Cascata: gpt-4o genera, gpt-4o-mini critica, e i controlli locali evitano le critiche inutili
+    agente_cascata = Agent(model="gpt-4o", critic_model="gpt-4o-mini", pre_critic=HeuristicPreCritic())
+    agente_cascata.invoke("Quali sono i vantaggi di un'API REST?", True, 2, True)
+    print(f"Chiamate per modello: {agente_cascata.stats.calls_by_model}, decisioni: {agente_cascata.stats.decisions}")
+
+    # Finestra di token: al modello arrivano il messaggio di sistema e i turni recenti entro 1000 token
+    agente_finestra = Agent(max_tokens=1000)
+    for domanda in ("Cos'è un'API?", "E un endpoint?", "Come si versiona un'API pubblica?"):
+        agente_finestra.invoke(domanda)
+    print(f"Messaggi inviati al modello: {len(agente_finestra.memory.get_messages())}")
\ No newline at end of file
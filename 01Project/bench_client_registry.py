@@ -0,0 +1,89 @@
+"""
+Benchmark: costruzione degli agenti e latenza della prima chiamata, con e senza il registro
+condiviso dei client (llm_clients.py).
+
+Usa il server locale openai_stub.py, quindi non servono chiavi né connessione a Internet:
+
+    python bench_client_registry.py --agents 200
+"""
+
+import argparse
+import importlib.util
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+from openai import OpenAI
+
+import llm_clients
+from openai_stub import OpenAIStub
+
+
+def load_lesson(filename: str):
+    """Importa uno script della lezione (i nomi con spazi non sono importabili direttamente)."""
+    path = Path(__file__).parent / filename
+    name = path.stem.replace(" ", "_")
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    # Registrato in sys.modules, così le sue funzioni si possono serializzare (es. verso un pool di processi)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def run(agents: int, factory, stub: OpenAIStub) -> dict:
+    connections_before = stub.connections
+    construction, first_call = [], []
+    created = []
+    for i in range(agents):
+        start = time.perf_counter()
+        agent = factory(i)
+        construction.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        agent.invoca("ping")
+        first_call.append(time.perf_counter() - start)
+        created.append(agent)
+
+    return {
+        "construction_ms": statistics.mean(construction) * 1000,
+        "first_call_ms": statistics.mean(first_call) * 1000,
+        "first_call_p95_ms": statistics.quantiles(first_call, n=20)[-1] * 1000,
+        "connections": stub.connections - connections_before,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--agents", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.0, help="latenza simulata del modello (s)")
+    args = parser.parse_args()
+
+    with OpenAIStub(latency=args.latency) as stub:
+        os.environ["OPENAI_BASE_URL"] = stub.base_url
+        os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+        lesson = load_lesson("E2 Agent Creation.py")
+
+        # Prima: ogni agente crea il proprio client OpenAI (e il proprio pool di connessioni)
+        def isolated_agent(i):
+            agent = lesson.Agente(ruolo=f"Ruolo {i}")
+            agent.client = OpenAI(base_url=stub.base_url)
+            return agent
+
+        before = run(args.agents, isolated_agent, stub)
+
+        # Dopo: client condiviso dal registro, con connessioni aperte in anticipo
+        llm_clients.prewarm(connections=4)
+        after = run(args.agents, lambda i: lesson.Agente(ruolo=f"Ruolo {i}"), stub)
+        llm_clients.close_all()
+
+    print(f"Agenti: {args.agents}, latenza simulata: {args.latency * 1000:.0f} ms")
+    print(f"{'':24}{'client per agente':>20}{'registro condiviso':>20}")
+    for key in ("construction_ms", "first_call_ms", "first_call_p95_ms", "connections"):
+        print(f"{key:24}{before[key]:>20.3f}{after[key]:>20.3f}")
+
+
+if __name__ == '__main__':
+    main()
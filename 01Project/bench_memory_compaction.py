@@ -0,0 +1,69 @@
+"""
+Benchmark: token di prompt inviati per turno in una sessione lunga, con la Memory di D1 Memory.py
+che conserva tutta la cronologia e con la compattazione a riassunto progressivo.
+
+Usa il server locale openai_stub.py, quindi non servono chiavi né connessione a Internet:
+
+    python bench_memory_compaction.py --turns 500
+"""
+
+import argparse
+import os
+
+from openai import OpenAI
+
+from bench_client_registry import load_lesson
+from memory_window import count_message_tokens
+from openai_stub import OpenAIStub
+
+ANSWER = ("Sure. Here is a detailed answer that covers the main points of your question, "
+          "with a short example and a couple of caveats you should keep in mind. ") * 2
+
+
+def run_session(lesson, stub: OpenAIStub, turns: int, memory) -> dict:
+    sent = []
+
+    def responder(body):
+        if body["messages"][0]["content"] == lesson.SUMMARY_PROMPT:
+            # Riassunto "finto" ma di dimensione limitata, come quello di un modello reale
+            return body["messages"][1]["content"][-1200:]
+        sent.append(sum(count_message_tokens(m) for m in body["messages"]))
+        return ANSWER
+
+    stub.responder = responder
+    memory.add_message(role="system", content="You're a helpful assistant")
+    for i in range(turns):
+        lesson.chat(user_message=f"Question {i}: tell me something about topic number {i}.", memory=memory)
+
+    checkpoints = [1, turns // 10, turns // 2, turns]
+    return {
+        "per_turn": {t: sent[t - 1] for t in checkpoints},
+        "total": sum(sent),
+        "archived": len(getattr(memory, "archive", [])),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=500)
+    parser.add_argument("--compact-after", type=int, default=1500, help="soglia di token per il riassunto")
+    args = parser.parse_args()
+
+    with OpenAIStub(latency=0.002) as stub:
+        os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+        lesson = load_lesson("D1 Memory.py")
+        lesson.client = OpenAI(base_url=stub.base_url)
+
+        full = run_session(lesson, stub, args.turns, lesson.Memory())
+        compacted = run_session(lesson, stub, args.turns, lesson.Memory(compact_after=args.compact_after))
+
+    print(f"Turni: {args.turns}, soglia di compattazione: {args.compact_after} token")
+    print(f"{'turno':>8}{'cronologia completa':>22}{'con compattazione':>22}")
+    for turn in full["per_turn"]:
+        print(f"{turn:>8}{full['per_turn'][turn]:>22}{compacted['per_turn'][turn]:>22}")
+    print(f"{'totale':>8}{full['total']:>22}{compacted['total']:>22}")
+    print(f"Messaggi archiviati dalla compattazione: {compacted['archived']}")
+
+
+if __name__ == '__main__':
+    main()
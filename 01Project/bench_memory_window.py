@@ -0,0 +1,171 @@
+"""
+Benchmark e verifica della finestra a budget di token (memory_window.py) con la Memory di
+D2 Function calling.py e con l'Agent di E3 Self reflection.py.
+
+Simula una sessione di `--turns` turni in cui un turno ogni `--tool-every` chiama da 1 a 3 tool.
+Dopo ogni messaggio aggiunto confronta get_messages(budget) con una finestra ricalcolata da zero
+(contando di nuovo i token di tutta la cronologia) e verifica che:
+- il messaggio di sistema sia sempre il primo;
+- ogni messaggio `tool` sia preceduto, nella finestra, dal messaggio assistente con la sua tool call,
+  e ogni tool call abbia il suo risultato (se il turno è concluso);
+- la finestra stia nel budget, salvo quando contiene solo l'ultima unità;
+- con un budget esplicito di 0 si ottenga solo il sistema e l'ultima unità, non il budget di default.
+Poi riporta il tempo totale delle due versioni e i token del prompt all'ultimo turno.
+
+Infine conversa per `--agent-turns` turni con Agent(max_tokens=...) di E3, usando il server locale
+openai_stub.py, e verifica che ogni prompt ricevuto dal server sia la finestra attesa; per la Memory
+di E3 verifica anche il budget esplicito di 0.
+
+    python bench_memory_window.py --turns 500 --budgets 500 2000 8000
+"""
+
+import argparse
+import os
+import time
+from typing import Dict, List
+
+from bench_client_registry import load_lesson
+from memory_window import count_message_tokens
+from openai_stub import OpenAIStub, tool_call
+
+CITIES = ["Rome", "London", "New York", "Paris", "Tokyo"]
+
+
+def session(turns: int, tool_every: int):
+    """Sequenza di messaggi (kwargs di Memory.add_message) di una sessione con tool call."""
+    yield {"role": "system", "content": "You're a helpful assistant"}
+    for i in range(turns):
+        yield {"role": "user", "content": f"Question {i}: what's the weather like for my trip number {i}?"}
+        if i % tool_every == 0:
+            calls = [tool_call("get_current_weather", {"location": CITIES[(i + k) % len(CITIES)]})
+                     for k in range(1 + i % 3)]
+            yield {"role": "assistant", "content": None, "tool_calls": calls}
+            for call in calls:
+                yield {"role": "tool", "content": f"Sunny, {20 + i % 10} degrees", "tool_call_id": call["id"]}
+        yield {"role": "assistant", "content": f"Here is the answer to question {i}, with a few details. " * 3}
+
+
+def reference_window(messages: List[Dict], max_tokens: int) -> List[Dict]:
+    """La stessa finestra di TokenWindow.select, ricalcolata da zero."""
+    head = 0
+    while head < len(messages) and messages[head]["role"] == "system":
+        head += 1
+    units = [i for i in range(head, len(messages)) if messages[i]["role"] != "tool" or i == head]
+    if not units:
+        return list(messages)
+    tokens = [count_message_tokens(m) for m in messages]
+    budget = max_tokens - sum(tokens[:head])
+    # L'unità più vecchia da cui la coda sta nel budget; l'ultima unità è sempre inclusa
+    start, used = units[-1], sum(tokens[units[-1]:])
+    for unit, next_unit in zip(reversed(units[:-1]), reversed(units[1:])):
+        used += sum(tokens[unit:next_unit])
+        if used > budget:
+            break
+        start = unit
+    return messages[:head] + messages[start:]
+
+
+def check_window(window: List[Dict], messages: List[Dict], max_tokens: int, turn_closed: bool) -> None:
+    assert window[0]["role"] == "system", "il messaggio di sistema deve restare in testa"
+    requested = set()
+    for message in window[1:]:
+        if message["role"] == "tool":
+            assert message["tool_call_id"] in requested, "risultato di tool senza la sua tool call"
+            requested.discard(message["tool_call_id"])
+        else:
+            assert not requested, "tool call senza risultato nella finestra"
+            requested = {call["id"] for call in message.get("tool_calls") or ()}
+    assert not (requested and turn_closed), "tool call senza risultato nella finestra"
+
+    tokens = sum(count_message_tokens(m) for m in window)
+    # Oltre il budget solo se la finestra è sistema + ultima unità (sempre inclusa)
+    last_unit = max(i for i, m in enumerate(messages) if m["role"] != "tool")
+    assert tokens <= max_tokens or window[1] == messages[last_unit], "finestra oltre il budget"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=500)
+    parser.add_argument("--tool-every", type=int, default=3, help="un turno con tool call ogni N")
+    parser.add_argument("--budgets", type=int, nargs="+", default=[500, 2000, 8000])
+    parser.add_argument("--agent-turns", type=int, default=50, help="turni con l'Agent di E3 (budget: il primo)")
+    args = parser.parse_args()
+
+    os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+    lesson = load_lesson("D2 Function calling.py")
+
+    messages = list(session(args.turns, args.tool_every))
+    print(f"Sessione: {args.turns} turni, {len(messages)} messaggi, "
+          f"{sum(count_message_tokens(m) for m in messages)} token")
+    print(f"{'budget':>8}{'finestra':>12}{'da zero':>12}{'token ultimo prompt':>22}{'messaggi':>10}")
+
+    for budget in args.budgets:
+        memory = lesson.Memory(max_tokens=budget)
+        windowed = recomputed = 0.0
+        for index, message in enumerate(messages):
+            memory.add_message(**message)
+            start = time.perf_counter()
+            window = memory.get_messages()
+            windowed += time.perf_counter() - start
+
+            start = time.perf_counter()
+            expected = reference_window(messages[:index + 1], budget)
+            recomputed += time.perf_counter() - start
+
+            assert window == expected, f"finestra diversa dal ricalcolo dopo il messaggio {index}"
+            # Turno chiuso se non stanno per arrivare altri risultati di tool
+            check_window(window, messages[:index + 1], budget,
+                         turn_closed=index + 1 == len(messages) or messages[index + 1]["role"] != "tool")
+
+        # Un budget esplicito di 0 non è "usa il default": restano sistema e ultima unità
+        assert memory.get_messages(0) == messages[:1] + messages[-1:]
+        assert memory.get_messages() == window
+
+        tokens = sum(count_message_tokens(m) for m in window)
+        print(f"{budget:>8}{windowed * 1000:>10.1f}ms{recomputed * 1000:>10.1f}ms{tokens:>22}{len(window):>10}")
+
+    full = lesson.Memory()
+    for message in messages:
+        full.add_message(**message)
+    assert full.get_messages() == messages
+    print(f"{'nessuno':>8}{'':>24}{sum(count_message_tokens(m) for m in messages):>22}{len(messages):>10}")
+
+    agent_window(args.agent_turns, args.budgets[0])
+
+
+def agent_window(turns: int, budget: int) -> None:
+    """Agent di E3 con un budget: i prompt inviati al modello sono la finestra della sua memoria."""
+    answer = "Here is a detailed answer, with a short example and a couple of caveats. " * 3
+    sent = []
+
+    def responder(body):
+        sent.append(body["messages"])
+        return answer
+
+    with OpenAIStub() as stub:
+        os.environ["OPENAI_BASE_URL"] = stub.base_url
+        lesson = load_lesson("E3 Self reflection.py")
+        agent = lesson.Agent(max_tokens=budget)
+        stub.responder = responder
+        history = agent.memory.get_messages()[:1]
+        for turn in range(turns):
+            question = f"Question {turn}: tell me something about topic number {turn}."
+            history.append({"role": "user", "content": question})
+            agent.invoke(question)
+            assert sent[-1] == reference_window(history, budget), f"prompt fuori finestra al turno {turn}"
+            history.append({"role": "assistant", "content": answer})
+
+    # Un budget esplicito di 0 anche per la Memory di E3
+    memory = lesson.Memory(max_tokens=budget)
+    for message in history:
+        memory.add_message(**message)
+    assert memory.get_messages(0) == [history[0], history[-1]]
+    assert memory.get_messages() == reference_window(history, budget)
+
+    tokens = [sum(count_message_tokens(m) for m in messages) for messages in sent]
+    print(f"Agent di E3 con max_tokens={budget}: {turns} turni, token di prompt primo/ultimo/massimo "
+          f"{tokens[0]}/{tokens[-1]}/{max(tokens)}, cronologia {sum(count_message_tokens(m) for m in history)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Benchmark: latenza end-to-end di chat_with_tools_loop (D2 Function calling.py) quando il modello
+chiede più tool nello stesso turno, eseguendoli uno alla volta o in parallelo.
+
+I tool sono resi artificialmente lenti (uno sincrono e uno async) e il modello è il server locale
+openai_stub.py, quindi non servono chiavi né rete:
+
+    python bench_parallel_tools.py --cities 3 --tool-latency 0.3
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+from bench_client_registry import load_lesson
+from openai_stub import OpenAIStub, tool_call
+
+CITIES = ["Rome", "London", "New York", "Paris", "Tokyo", "Madrid", "Berlin", "Oslo"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cities", type=int, default=3, help="tool call richieste nello stesso turno")
+    parser.add_argument("--tool-latency", type=float, default=0.3, help="durata di ogni tool (s)")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="latenza simulata del modello (s)")
+    args = parser.parse_args()
+    cities = CITIES[:args.cities]
+
+    def responder(body):
+        # Primo giro: il modello chiede il meteo di tutte le città (più una potenza, via tool async)
+        if body["messages"][-1]["role"] == "user":
+            calls = [tool_call("get_current_weather", {"location": city}) for city in cities]
+            calls.append(tool_call("power", {"base": 2, "exponent": -5}))
+            return {"content": None, "tool_calls": calls}
+        return "Here is the weather you asked for."
+
+    with OpenAIStub(latency=args.llm_latency, responder=responder) as stub:
+        os.environ["OPENAI_BASE_URL"] = stub.base_url
+        os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+        lesson = load_lesson("D2 Function calling.py")
+
+        weather, power = lesson.get_current_weather, lesson.power
+
+        def slow_weather(location: str) -> str:
+            time.sleep(args.tool_latency)
+            return weather(location)
+
+        async def slow_power(base: float, exponent: float) -> float:
+            await asyncio.sleep(args.tool_latency)
+            return power(base, exponent)
+
+        lesson.available_tools.update(get_current_weather=slow_weather, power=slow_power)
+        # Senza cache dei risultati, altrimenti il secondo giro non eseguirebbe i tool
+        lesson.tool_cache.policies.clear()
+        lesson.print = lambda *a, **k: None  # silenzia i log dei tool durante la misura
+
+        results = {}
+        for label, concurrency in (("sequenziale", 1), ("parallelo", len(cities) + 1)):
+            memory = lesson.Memory()
+            memory.add_message(role="system", content="You're a helpful assistant")
+            start = time.perf_counter()
+            lesson.chat_with_tools_loop("What's the weather in my cities?", memory, lesson.tools,
+                                        max_concurrency=concurrency)
+            results[label] = time.perf_counter() - start
+            tool_ids = [m["tool_call_id"] for m in memory.get_messages() if m["role"] == "tool"]
+            requested = [c["id"] for c in memory.get_messages()[2]["tool_calls"]]
+            assert tool_ids == requested, "i risultati devono seguire l'ordine delle tool call"
+
+    print(f"{len(cities) + 1} tool call da {args.tool_latency * 1000:.0f} ms, "
+          f"modello {args.llm_latency * 1000:.0f} ms per chiamata")
+    for label, elapsed in results.items():
+        print(f"  {label:12} {elapsed * 1000:8.1f} ms")
+    print(f"  speed-up: {results['sequenziale'] / results['parallelo']:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""
+Benchmark: cascata di modelli nella riflessione di Agent (E3 Self reflection.py).
+
+Tre configurazioni sulle stesse domande:
+- un solo modello che genera e critica
+- generatore forte e critico economico
+- come sopra, più il pre-critico locale (HeuristicPreCritic) che accetta le bozze buone senza critica
+
+Il modello è il server locale openai_stub.py; il responder simula latenze diverse per modello e bozze
+a volte difettose (troppo corte o ripetitive), che la critica corregge:
+
+    python bench_reflection_cascade.py --questions 40 --strong-latency 0.3 --cheap-latency 0.08
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import time
+import zlib
+
+from bench_client_registry import load_lesson
+from openai_stub import OpenAIStub
+
+STRONG, CHEAP = "gpt-4o", "gpt-4o-mini"
+WORDS = ("versioning", "the", "api", "clients", "should", "pin", "a", "major", "version", "and",
+         "deprecate", "old", "endpoints", "with", "clear", "timelines", "headers", "changelog")
+
+
+def good_answer(question: str) -> str:
+    rng = random.Random(question)
+    return " ".join(rng.choice(WORDS) for _ in range(45)) + "."
+
+
+def draft(question: str) -> str:
+    kind = zlib.crc32(question.encode()) % 10
+    if kind < 2:
+        return "Use versions."
+    if kind < 4:
+        return "Version your API carefully. " * 12
+    return good_answer(question)
+
+
+class CascadeModel:
+    """Responder per OpenAIStub: bozze a volte difettose, critiche che le correggono, latenza per modello."""
+
+    def __init__(self, critique_prompt: str, latencies: dict):
+        self.critique_prompt = critique_prompt
+        self.latencies = latencies
+
+    def __call__(self, body):
+        time.sleep(self.latencies.get(body["model"], 0))
+        messages = body["messages"]
+        question = next(m["content"] for m in reversed(messages)
+                        if m["role"] == "user" and not m["content"].startswith(self.critique_prompt))
+        current = draft(question)
+        if not messages[-1]["content"].startswith(self.critique_prompt):
+            return current
+        if current == good_answer(question):
+            return json.dumps({"original_response": current, "revisions_needed": "None",
+                               "updated_response": current})
+        return json.dumps({"original_response": current, "revisions_needed": "Expand and remove repetitions.",
+                           "updated_response": good_answer(question)})
+
+
+def run(lesson, questions, **agent_kwargs) -> dict:
+    agent = lesson.Agent(model=STRONG, **agent_kwargs)
+    latencies, good = [], 0
+    for question in questions:
+        agent.memory = lesson.Memory()
+        start = time.perf_counter()
+        answer = agent.invoke(question, self_reflection=True, max_iter=2)
+        latencies.append(time.perf_counter() - start)
+        good += answer == good_answer(question)
+    return {
+        "latency_ms": statistics.mean(latencies) * 1000,
+        "quality": good / len(questions),
+        "calls": dict(sorted(agent.stats.calls_by_model.items())),
+        "decisions": dict(sorted(agent.stats.decisions.items())),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=40)
+    parser.add_argument("--strong-latency", type=float, default=0.3, help="latenza del generatore (s)")
+    parser.add_argument("--cheap-latency", type=float, default=0.08, help="latenza del critico economico (s)")
+    args = parser.parse_args()
+    questions = [f"Question {i}: how should I version a public API?" for i in range(args.questions)]
+
+    os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+    with OpenAIStub() as stub:
+        os.environ["OPENAI_BASE_URL"] = stub.base_url
+        lesson = load_lesson("E3 Self reflection.py")
+        stub.responder = CascadeModel(lesson.SELF_CRITIQUE_PROMPT,
+                                      {STRONG: args.strong_latency, CHEAP: args.cheap_latency})
+        results = {
+            "un solo modello": run(lesson, questions),
+            "critico economico": run(lesson, questions, critic_model=CHEAP),
+            "+ pre-critico locale": run(lesson, questions, critic_model=CHEAP,
+                                        pre_critic=lesson.HeuristicPreCritic()),
+        }
+
+    print(f"{args.questions} domande, generatore {args.strong_latency * 1000:.0f} ms, "
+          f"critico {args.cheap_latency * 1000:.0f} ms")
+    for label, r in results.items():
+        print(f"  {label:22} latenza {r['latency_ms']:7.1f} ms   qualità {r['quality']:.2f}   "
+              f"chiamate {r['calls']}   decisioni {r['decisions']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+Benchmark: crescita dei token di prompt turno dopo turno in una conversazione riflessiva con Agent
+(E3 Self reflection.py), con i passaggi intermedi salvati in memoria (scratchpad=False) oppure
+isolati in uno scratchpad da cui si salva solo la risposta finale (scratchpad=True).
+
+Usa il server locale openai_stub.py con il modello finto di bench_self_reflection.py; i token di
+prompt sono quelli riportati in `usage` dallo stub:
+
+    python bench_reflection_memory.py --turns 10 --max-iter 3
+"""
+
+import argparse
+import os
+
+from bench_client_registry import load_lesson
+from bench_self_reflection import FakeReflectiveModel
+from memory_window import count_message_tokens
+from openai_stub import OpenAIStub
+
+
+def run(lesson, turns: int, max_iter: int, scratchpad: bool) -> list:
+    agent = lesson.Agent(scratchpad=scratchpad)
+    rows = []
+    for turn in range(turns):
+        before_calls, before_tokens = agent.stats.llm_calls, agent.stats.prompt_tokens
+        memory_size = len(agent.memory.get_messages())
+        answer = agent.invoke(f"Question {turn}: how should I version a public API?", self_reflection=True,
+                              max_iter=max_iter)
+
+        messages = agent.memory.get_messages()
+        if scratchpad:
+            # In memoria restano solo la domanda e la risposta finale
+            assert len(messages) == memory_size + 2
+        else:
+            # Bozza, critiche e risposta finale: la risposta finale compare una sola volta, anche
+            # quando la critica non chiede revisioni ed è uguale alla bozza
+            replies = [m["content"] for m in messages[memory_size:] if m["role"] == "assistant"]
+            assert replies.count(answer) == 1, "risposta finale ripetuta in memoria"
+        rows.append({
+            "prompt_tokens": agent.stats.prompt_tokens - before_tokens,
+            "calls": agent.stats.llm_calls - before_calls,
+            "memory_tokens": sum(count_message_tokens(m) for m in messages),
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--max-iter", type=int, default=3)
+    args = parser.parse_args()
+
+    os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+    with OpenAIStub() as stub:
+        os.environ["OPENAI_BASE_URL"] = stub.base_url
+        lesson = load_lesson("E3 Self reflection.py")
+        stub.responder = FakeReflectiveModel(lesson.SELF_CRITIQUE_PROMPT)
+        shared = run(lesson, args.turns, args.max_iter, scratchpad=False)
+        isolated = run(lesson, args.turns, args.max_iter, scratchpad=True)
+
+    print(f"{args.turns} turni riflessivi, max_iter={args.max_iter}")
+    print(f"{'turno':>6}{'prompt (memoria)':>20}{'prompt (scratchpad)':>22}{'memoria':>10}{'scratchpad':>12}")
+    for turn, (a, b) in enumerate(zip(shared, isolated), start=1):
+        print(f"{turn:>6}{a['prompt_tokens']:>20}{b['prompt_tokens']:>22}{a['memory_tokens']:>10}{b['memory_tokens']:>12}")
+    total_a = sum(r["prompt_tokens"] for r in shared)
+    total_b = sum(r["prompt_tokens"] for r in isolated)
+    print(f"token di prompt totali: {total_a} contro {total_b} ({total_a / total_b:.2f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+"""
+Confronto latenza/qualità tra le strategie di riflessione di Agent.invoke (E3 Self reflection.py):
+- iterative: risposta, poi critica e revisione (max_iter da 1 a 3, con uscita anticipata)
+- parallel: N candidati generati in parallelo e un solo giudizio che li fonde
+
+Il modello è il server locale openai_stub.py con un responder "a fatti": ogni domanda ha un insieme
+di fatti da citare, una risposta ne copre una parte a caso, una revisione ne aggiunge qualcuno e il
+giudizio best-of-N unisce quelli dei candidati. La qualità è la frazione di fatti nella risposta finale:
+
+    python bench_reflection_strategies.py --questions 30 --llm-latency 0.2
+"""
+
+import argparse
+import itertools
+import json
+import os
+import random
+import re
+import statistics
+import time
+import zlib
+
+from bench_client_registry import load_lesson
+from openai_stub import OpenAIStub
+
+FACTS = ("authentication", "rate-limits", "pagination", "versioning", "idempotency", "timeouts",
+         "retries", "caching", "validation", "logging", "monitoring", "documentation", "encryption",
+         "compression", "webhooks", "sandbox")
+FILLER = ("the", "client", "should", "handle", "requests", "carefully", "and", "clearly", "with")
+FACT_RE = re.compile("|".join(re.escape(fact) for fact in FACTS))
+
+
+def question_facts(question: str, count: int = 8) -> list:
+    return random.Random(zlib.crc32(question.encode())).sample(FACTS, count)
+
+
+def write_answer(facts, rng: random.Random) -> str:
+    words = []
+    for fact in facts:
+        words.extend(rng.choice(FILLER) for _ in range(6))
+        words.append(fact)
+    return " ".join(words) + "."
+
+
+def quality(question: str, answer: str) -> float:
+    required = set(question_facts(question))
+    return len(required & set(FACT_RE.findall(answer))) / len(required)
+
+
+class FactModel:
+    """Responder per OpenAIStub: risposte, critiche e giudizi che coprono i fatti della domanda."""
+
+    def __init__(self, critique_prompt: str, best_of_n_prompt: str, coverage: float = 0.5, fixes: int = 2):
+        self.critique_prompt = critique_prompt
+        self.best_of_n_prompt = best_of_n_prompt
+        self.coverage = coverage  # probabilità che una risposta iniziale citi ogni fatto
+        self.fixes = fixes  # fatti mancanti aggiunti da una revisione
+        self._seeds = itertools.count()
+
+    def __call__(self, body):
+        rng = random.Random(next(self._seeds))
+        messages = body["messages"]
+        question = next(m["content"] for m in reversed(messages)
+                        if m["role"] == "user" and not m["content"].startswith(self.critique_prompt)
+                        and not m["content"].startswith(self.best_of_n_prompt))
+        required = question_facts(question)
+        last = messages[-1]["content"]
+
+        if last.startswith(self.best_of_n_prompt):
+            candidates = last[len(self.best_of_n_prompt):].split("### Candidate ")[1:]
+            found = [set(FACT_RE.findall(candidate)) for candidate in candidates]
+            merged = [fact for fact in required if any(fact in facts for facts in found)]
+            scores = [len(facts & set(required)) for facts in found]
+            return json.dumps({"scores": scores, "best_candidate": scores.index(max(scores)) + 1,
+                               "final_response": write_answer(merged, rng)})
+
+        if last.startswith(self.critique_prompt):
+            previous = self._current_answer(messages)
+            covered = [fact for fact in required if fact in set(FACT_RE.findall(previous))]
+            missing = [fact for fact in required if fact not in covered]
+            if not missing:
+                return json.dumps({"original_response": previous, "revisions_needed": "None",
+                                   "updated_response": previous})
+            added = set(rng.sample(missing, min(self.fixes, len(missing))))
+            facts = [fact for fact in required if fact in covered or fact in added]
+            return json.dumps({"original_response": previous,
+                               "revisions_needed": f"Mention {', '.join(sorted(added))}.",
+                               "updated_response": write_answer(facts, rng)})
+
+        return write_answer([fact for fact in required if rng.random() < self.coverage], rng)
+
+    def _current_answer(self, messages) -> str:
+        for message in reversed(messages[:-1]):
+            if message["role"] != "assistant":
+                continue
+            try:
+                return json.loads(message["content"])["updated_response"]
+            except (ValueError, KeyError, TypeError):
+                return message["content"]
+        return ""
+
+
+def run(lesson, questions, **invoke_kwargs) -> dict:
+    agent = lesson.Agent()
+    latencies, scores = [], []
+    for question in questions:
+        # Memoria nuova per ogni domanda: si misura la singola risposta riflessiva
+        agent.memory = lesson.Memory()
+        start = time.perf_counter()
+        answer = agent.invoke(question, self_reflection=True, **invoke_kwargs)
+        latencies.append(time.perf_counter() - start)
+        scores.append(quality(question, answer))
+    return {
+        "latency_ms": statistics.mean(latencies) * 1000,
+        "p95_ms": statistics.quantiles(latencies, n=20)[-1] * 1000,
+        "quality": statistics.mean(scores),
+        "calls": agent.stats.average_calls,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=30)
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="latenza simulata del modello (s)")
+    args = parser.parse_args()
+    questions = [f"Question {i}: what should a production API client take care of?" for i in range(args.questions)]
+
+    os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+    with OpenAIStub(latency=args.llm_latency) as stub:
+        os.environ["OPENAI_BASE_URL"] = stub.base_url
+        lesson = load_lesson("E3 Self reflection.py")
+        stub.responder = FactModel(lesson.SELF_CRITIQUE_PROMPT, lesson.BEST_OF_N_PROMPT)
+
+        configurations = {f"iterative max_iter={n}": {"strategy": "iterative", "max_iter": n} for n in (1, 2, 3)}
+        configurations.update({f"parallel N={n}": {"strategy": "parallel", "n_candidates": n} for n in (2, 3, 5)})
+        results = {label: run(lesson, questions, **kwargs) for label, kwargs in configurations.items()}
+
+    print(f"{args.questions} domande, modello {args.llm_latency * 1000:.0f} ms per chiamata")
+    print(f"{'':24}{'latenza ms':>12}{'p95 ms':>10}{'qualità':>10}{'chiamate':>10}")
+    for label, r in results.items():
+        print(f"{label:24}{r['latency_ms']:>12.1f}{r['p95_ms']:>10.1f}{r['quality']:>10.2f}{r['calls']:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
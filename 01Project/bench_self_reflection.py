@@ -0,0 +1,112 @@
+"""
+Benchmark: chiamate al modello e latenza per risposta riflessiva di Agent.invoke (E3 Self reflection.py),
+con il ciclo completo (early_exit=False) e con l'uscita anticipata (nessuna revisione o convergenza).
+
+Il modello è il server locale openai_stub.py con un responder che simula la critica: ogni domanda
+richiede da 0 a 3 revisioni reali, e a volte l'ultima è solo un ritocco (risposta convergente):
+
+    python bench_self_reflection.py --questions 40 --max-iter 3
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import time
+import zlib
+
+from bench_client_registry import load_lesson
+from openai_stub import OpenAIStub
+
+WORDS = ("api", "endpoint", "request", "response", "token", "client", "server", "latency", "cache",
+         "retry", "timeout", "payload", "schema", "session", "stream", "model", "prompt", "context")
+
+
+def _text(question: str, version: int) -> str:
+    rng = random.Random(f"{question}/{version}")
+    return f"Answer to '{question}': " + " ".join(rng.choice(WORDS) for _ in range(40)) + "."
+
+
+class FakeReflectiveModel:
+    """
+    Responder per OpenAIStub che si comporta come un modello che si autocritica.
+
+    Per ogni domanda (dal crc32 del testo) sceglie quante revisioni reali servono e se l'ultima è
+    solo un ritocco; le risposte alla critica sono JSON nel formato di SELF_CRITIQUE_PROMPT.
+    """
+
+    def __init__(self, critique_prompt: str):
+        self.critique_prompt = critique_prompt
+
+    def profile(self, question: str):
+        seed = zlib.crc32(question.encode())
+        return seed % 4, seed % 3 == 0  # (revisioni reali, ultima revisione è un ritocco)
+
+    def version(self, question: str, k: int) -> str:
+        revisions, touch_up = self.profile(question)
+        if touch_up and k == revisions and k > 0:
+            return _text(question, k - 1).rstrip(".") + ", in short."
+        return _text(question, min(k, revisions))
+
+    def __call__(self, body):
+        messages = body["messages"]
+        question_index = max(i for i, m in enumerate(messages)
+                             if m["role"] == "user" and not m["content"].startswith(self.critique_prompt))
+        question = messages[question_index]["content"]
+        critiques = sum(1 for m in messages[question_index:] if m["content"].startswith(self.critique_prompt))
+        if not messages[-1]["content"].startswith(self.critique_prompt):
+            return self.version(question, 0)
+
+        revisions, _ = self.profile(question)
+        previous = self.version(question, critiques - 1)
+        if critiques > revisions:
+            critique = {"original_response": previous, "revisions_needed": "None", "updated_response": previous}
+        else:
+            critique = {"original_response": previous,
+                        "revisions_needed": "Make the answer clearer and more precise.",
+                        "updated_response": self.version(question, critiques)}
+        return "```json\n" + json.dumps(critique, indent=2) + "\n```"
+
+
+def run(lesson, questions, max_iter: int, early_exit: bool) -> dict:
+    agent = lesson.Agent()
+    latencies = []
+    for question in questions:
+        start = time.perf_counter()
+        agent.invoke(question, self_reflection=True, max_iter=max_iter, early_exit=early_exit)
+        latencies.append(time.perf_counter() - start)
+    return {
+        "avg_calls": agent.stats.average_calls,
+        "avg_latency_ms": statistics.mean(latencies) * 1000,
+        "exits": dict(sorted(agent.stats.exits.items())),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=40)
+    parser.add_argument("--max-iter", type=int, default=3)
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="latenza simulata del modello (s)")
+    args = parser.parse_args()
+    questions = [f"Question {i}: how do I design a reliable API client?" for i in range(args.questions)]
+
+    os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+    with OpenAIStub(latency=args.llm_latency) as stub:
+        os.environ["OPENAI_BASE_URL"] = stub.base_url
+        lesson = load_lesson("E3 Self reflection.py")
+        stub.responder = FakeReflectiveModel(lesson.SELF_CRITIQUE_PROMPT)
+
+        results = {
+            "ciclo completo": run(lesson, questions, args.max_iter, early_exit=False),
+            "uscita anticipata": run(lesson, questions, args.max_iter, early_exit=True),
+        }
+
+    print(f"{args.questions} domande, max_iter={args.max_iter}, modello {args.llm_latency * 1000:.0f} ms per chiamata")
+    for label, result in results.items():
+        print(f"  {label:18} chiamate/risposta {result['avg_calls']:5.2f}   "
+              f"latenza media {result['avg_latency_ms']:7.1f} ms   uscite {result['exits']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Benchmark: tempo di ricaricamento di una sessione persistente (session_store.py) con 10k messaggi,
+confrontato con la latenza della prima chiamata al modello (simulata dal server openai_stub.py).
+
+    python bench_session_store.py --messages 10000 --llm-latency 0.3
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from openai import OpenAI
+
+from bench_client_registry import load_lesson
+from openai_stub import OpenAIStub
+from session_store import JSONLSessionStore, SQLiteSessionStore
+
+
+def timed(fn, repeat: int = 5) -> float:
+    """Mediana in millisecondi di `repeat` esecuzioni."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=10_000)
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="latenza simulata del modello (s)")
+    args = parser.parse_args()
+
+    os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+    lesson = load_lesson("D1 Memory.py")
+
+    with tempfile.TemporaryDirectory() as directory:
+        stores = {
+            "jsonl": JSONLSessionStore(os.path.join(directory, "jsonl")),
+            "sqlite": SQLiteSessionStore(os.path.join(directory, "sessions.sqlite")),
+        }
+        for name, store in stores.items():
+            memory = lesson.Memory(store=store, session_id="bench")
+            memory.add_message(role="system", content="You're a helpful assistant")
+            start = time.perf_counter()
+            for i in range(args.messages - 1):
+                memory.add_message(role="user" if i % 2 == 0 else "assistant",
+                                   content=f"Message {i}: " + "lorem ipsum dolor sit amet " * 8)
+            append_us = (time.perf_counter() - start) / (args.messages - 1) * 1e6
+
+            def reload_last():
+                reloaded = lesson.Memory(store=store, session_id="bench")
+                return reloaded.get_messages()[-1]
+
+            def reload_all():
+                return list(lesson.Memory(store=store, session_id="bench").get_messages())
+
+            def reload_window():
+                return lesson.Memory(store=store, session_id="bench", max_tokens=2000).get_messages()
+
+            print(f"[{name}] append: {append_us:.1f} µs/messaggio")
+            print(f"[{name}] ricarica + ultimo messaggio: {timed(reload_last):.2f} ms")
+            print(f"[{name}] ricarica + finestra da 2000 token: {timed(reload_window):.2f} ms")
+            print(f"[{name}] ricarica + decodifica completa: {timed(reload_all):.2f} ms")
+            store.close()
+
+    with OpenAIStub(latency=args.llm_latency) as stub:
+        lesson.client = OpenAI(base_url=stub.base_url)
+        first_call = timed(lambda: lesson.chat(user_message="ping"), repeat=3)
+    print(f"Prima chiamata al modello (latenza simulata {args.llm_latency * 1000:.0f} ms): {first_call:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+Benchmark: chat_with_tools_loop (risposta completa, poi tool) contro astream_chat_with_tools_loop
+(tool avviati appena i loro argomenti sono completi) in D2 Function calling.py.
+
+Il modello è il server locale openai_stub.py, che invia un delta ogni `--token-delay` secondi
+(testo, poi le tool call con gli argomenti spezzati in frammenti, come fa il provider reale):
+
+    python bench_streaming_tools.py --cities 3 --token-delay 0.02 --tool-latency 0.2
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+import llm_clients
+from bench_client_registry import load_lesson
+from openai_stub import OpenAIStub, tool_call
+
+CITIES = ["Rome", "London", "New York", "Paris", "Tokyo", "Madrid", "Berlin", "Oslo"]
+FINAL_ANSWER = ("Here is the weather for the cities you asked about: Rome is sunny, London is cloudy "
+                "and New York is rainy. Let me know if you need anything else for your trip!")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cities", type=int, default=3)
+    parser.add_argument("--token-delay", type=float, default=0.02, help="intervallo tra i delta (s)")
+    parser.add_argument("--tool-latency", type=float, default=0.2, help="durata di ogni tool (s)")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="latenza prima del primo delta (s)")
+    args = parser.parse_args()
+    cities = CITIES[:args.cities]
+
+    def responder(body):
+        if body["messages"][-1]["role"] == "user":
+            return {
+                "content": "Let me check the weather for each city.",
+                "tool_calls": [tool_call("get_current_weather", {"location": city}) for city in cities],
+            }
+        return FINAL_ANSWER
+
+    with OpenAIStub(latency=args.llm_latency, token_delay=args.token_delay, responder=responder) as stub:
+        os.environ["OPENAI_BASE_URL"] = stub.base_url
+        os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+        lesson = load_lesson("D2 Function calling.py")
+        lesson.print = lambda *a, **k: None
+        lesson.tool_cache.policies.clear()
+
+        tool_starts = []
+        weather = lesson.get_current_weather
+
+        def slow_weather(location: str) -> str:
+            tool_starts.append(time.perf_counter())
+            time.sleep(args.tool_latency)
+            return weather(location)
+
+        lesson.available_tools["get_current_weather"] = slow_weather
+
+        def new_memory():
+            memory = lesson.Memory()
+            memory.add_message(role="system", content="You're a helpful assistant")
+            return memory
+
+        # Senza streaming
+        tool_starts.clear()
+        start = time.perf_counter()
+        lesson.chat_with_tools_loop("What's the weather in my cities?", new_memory(), lesson.tools)
+        end = time.perf_counter()
+        blocking = {"first_tool": tool_starts[0] - start, "final_answer": end - start}
+
+        # In streaming, con dispatch anticipato dei tool
+        async def streaming():
+            tool_starts.clear()
+            memory = new_memory()
+            start = time.perf_counter()
+            first_final_token = None
+            async for _ in lesson.astream_chat_with_tools_loop("What's the weather in my cities?",
+                                                               memory, lesson.tools):
+                if len(tool_starts) == len(cities) and first_final_token is None:
+                    first_final_token = time.perf_counter()
+            end = time.perf_counter()
+            await llm_clients.aclose_all()
+            tool_ids = [m["tool_call_id"] for m in memory.get_messages() if m["role"] == "tool"]
+            requested = [c["id"] for c in memory.get_messages()[2]["tool_calls"]]
+            assert tool_ids == requested, "i risultati devono seguire l'ordine delle tool call"
+            return {"first_tool": tool_starts[0] - start, "final_answer": end - start,
+                    "final_first_token": first_final_token - start}
+
+        streamed = asyncio.run(streaming())
+
+    print(f"{len(cities)} tool call, delta ogni {args.token_delay * 1000:.0f} ms, "
+          f"tool da {args.tool_latency * 1000:.0f} ms")
+    print(f"{'':28}{'senza streaming':>18}{'streaming':>14}")
+    print(f"{'time-to-first-tool (ms)':28}{blocking['first_tool'] * 1000:>18.1f}{streamed['first_tool'] * 1000:>14.1f}")
+    print(f"{'time-to-final-answer (ms)':28}{blocking['final_answer'] * 1000:>18.1f}"
+          f"{streamed['final_answer'] * 1000:>14.1f}")
+    print(f"{'primo token finale (ms)':28}{'-':>18}{streamed['final_first_token'] * 1000:>14.1f}")
+
+
+if __name__ == '__main__':
+    main()
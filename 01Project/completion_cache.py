@@ -0,0 +1,243 @@
+"""
+Cache delle risposte del modello per le chiamate deterministiche (temperature=0).
+
+Con temperatura zero lo stesso prompt produce (di fatto) la stessa risposta: non ha senso pagarla e
+aspettarla due volte. La cache ha due livelli:
+- memoria: LRU con limite di elementi, di byte e scadenza (TTL)
+- disco: database SQLite condivisibile tra più processi worker
+
+La chiave è un hash stabile di (model, messages, tools, temperature, ...): due richieste con gli
+stessi parametri producono sempre la stessa chiave, indipendentemente dall'ordine delle chiavi JSON.
+
+Uso tipico:
+
+    cache = CompletionCache(path="completions.sqlite")
+    client = cache.wrap(OpenAI())
+    client.chat.completions.create(model="gpt-4o-mini", temperature=0.0, messages=[...])
+    print(cache.stats())
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from openai.types.chat import ChatCompletion
+
+# Parametri che riguardano il trasporto e non il contenuto della risposta
+_TRANSPORT_KWARGS = {"timeout", "extra_headers", "extra_query", "extra_body", "user"}
+
+
+def _to_jsonable(value: Any) -> Any:
+    """Converte oggetti pydantic (es. ChatCompletionMessage) in strutture JSON."""
+    if hasattr(value, "model_dump"):
+        return value.model_dump(exclude_none=True)
+    raise TypeError(f"Tipo non serializzabile nella chiave di cache: {type(value).__name__}")
+
+
+def cache_key(**request) -> str:
+    """Hash stabile dei parametri della richiesta (model, messages, tools, temperature, ...)."""
+    payload = {k: v for k, v in request.items() if k not in _TRANSPORT_KWARGS and v is not None}
+    if "temperature" in payload:
+        # 0 e 0.0 sono la stessa richiesta, ma json.dumps li scriverebbe in modo diverso
+        payload["temperature"] = float(payload["temperature"])
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False,
+                           default=_to_jsonable)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def is_deterministic(**request) -> bool:
+    """Solo le richieste a temperatura zero, non in streaming e con una sola scelta sono cacheabili."""
+    return (request.get("temperature") == 0
+            and not request.get("stream")
+            and request.get("n", 1) == 1)
+
+
+class LRUCache:
+    """Cache in memoria con eviction LRU per numero di elementi e byte totali, più TTL."""
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 64 * 1024 * 1024, ttl: Optional[float] = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._data: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, created = item
+            if self.ttl is not None and time.time() - created > self.ttl:
+                self._remove(key)
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, created: Optional[float] = None) -> None:
+        size = len(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (value, created or time.time())
+            self._bytes += size
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._data)))
+                self.evictions += 1
+
+    def _remove(self, key: str) -> None:
+        value, _ = self._data.pop(key)
+        self._bytes -= len(value)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SQLiteCache:
+    """Livello su disco: una tabella chiave/valore in SQLite (modalità WAL, sicura tra processi)."""
+
+    def __init__(self, path: str, ttl: Optional[float] = None, max_rows: Optional[int] = None):
+        self.path = path
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS completions ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS completions_created ON completions(created)")
+
+    def get(self, key: str) -> Optional[Tuple[str, float]]:
+        with self._lock:
+            row = self._conn.execute("SELECT value, created FROM completions WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if self.ttl is not None and time.time() - row[1] > self.ttl:
+                self._conn.execute("DELETE FROM completions WHERE key = ?", (key,))
+                return None
+            return row
+
+    def set(self, key: str, value: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO completions (key, value, created) VALUES (?, ?, ?)",
+                (key, value, time.time()),
+            )
+            if self.max_rows is not None:
+                self._conn.execute(
+                    "DELETE FROM completions WHERE key IN ("
+                    " SELECT key FROM completions ORDER BY created DESC LIMIT -1 OFFSET ?)",
+                    (self.max_rows,),
+                )
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+class CompletionCache:
+    """
+    Cache a due livelli (memoria + disco opzionale) per `chat.completions.create`.
+    - max_entries / max_bytes: limiti del livello in memoria
+    - ttl: scadenza in secondi delle risposte (None = nessuna scadenza)
+    - path: file SQLite del livello su disco (None = solo memoria)
+    """
+
+    def __init__(self,
+                 max_entries: int = 1024,
+                 max_bytes: int = 64 * 1024 * 1024,
+                 ttl: Optional[float] = None,
+                 path: Optional[str] = None,
+                 max_rows: Optional[int] = None):
+        self.memory = LRUCache(max_entries=max_entries, max_bytes=max_bytes, ttl=ttl)
+        self.disk = SQLiteCache(path, ttl=ttl, max_rows=max_rows) if path else None
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+
+    def create(self, client, **request) -> ChatCompletion:
+        """Equivalente a client.chat.completions.create(**request), ma passa prima dalla cache."""
+        if not is_deterministic(**request):
+            self._count("bypassed")
+            return client.chat.completions.create(**request)
+
+        key = cache_key(**request)
+        cached = self.memory.get(key)
+        if cached is not None:
+            self._count("memory_hits")
+            return ChatCompletion.model_validate_json(cached)
+
+        if self.disk is not None:
+            row = self.disk.get(key)
+            if row is not None:
+                self._count("disk_hits")
+                self.memory.set(key, row[0], created=row[1])
+                return ChatCompletion.model_validate_json(row[0])
+
+        self._count("misses")
+        response = client.chat.completions.create(**request)
+        value = response.model_dump_json()
+        self.memory.set(key, value)
+        if self.disk is not None:
+            self.disk.set(key, value)
+        return response
+
+    def wrap(self, client) -> "CachedClient":
+        """Restituisce un client che si usa come quello originale, ma con la cache davanti."""
+        return CachedClient(client, self)
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def stats(self) -> Dict[str, Any]:
+        """Contatori di hit/miss, utili per stimare chiamate (e costi) risparmiati."""
+        hits = self.memory_hits + self.disk_hits
+        lookups = hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "memory_entries": len(self.memory),
+            "memory_evictions": self.memory.evictions,
+        }
+
+
+class _CachedCompletions:
+    def __init__(self, client, cache: CompletionCache):
+        self._client = client
+        self._cache = cache
+
+    def create(self, **request) -> ChatCompletion:
+        return self._cache.create(self._client, **request)
+
+
+class _CachedChat:
+    def __init__(self, client, cache: CompletionCache):
+        self.completions = _CachedCompletions(client, cache)
+
+
+class CachedClient:
+    """Involucro di un client OpenAI: `chat.completions.create` usa la cache, il resto è invariato."""
+
+    def __init__(self, client, cache: CompletionCache):
+        self._client = client
+        self.cache = cache
+        self.chat = _CachedChat(client, cache)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
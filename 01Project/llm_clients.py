@@ -0,0 +1,156 @@
+"""
+Registro condiviso dei client OpenAI.
+
+Creare un `OpenAI()` per ogni agente significa avere un pool di connessioni HTTP (e un handshake TLS)
+per ogni istanza. Con centinaia di agenti nello stesso processo conviene invece condividere un solo
+client per ogni combinazione di base URL e credenziali: le connessioni restano aperte (keep-alive)
+e vengono riutilizzate da tutti gli agenti.
+
+Uso tipico:
+
+    configure_pool(max_connections=200, max_keepalive_connections=50)
+    prewarm(connections=10)
+    client = get_client()
+
+I client asincroni (get_async_client) sono uno per event loop: le connessioni di un httpx.AsyncClient
+appartengono al loop in cui sono state aperte e non si possono riusare da un altro loop (ogni
+asyncio.run ne crea uno nuovo). Vanno chiusi con `await aclose_all()` prima che il loop finisca.
+"""
+
+import asyncio
+import hashlib
+import os
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import httpx
+from openai import AsyncOpenAI, OpenAI
+
+DEFAULT_BASE_URL = "https://api.openai.com/v1"
+
+
+@dataclass(frozen=True)
+class PoolLimits:
+    """Limiti del pool di connessioni HTTP condiviso."""
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 30.0
+    timeout: float = 60.0
+
+    def to_httpx(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+
+
+_lock = threading.Lock()
+_limits = PoolLimits()
+_clients: Dict[Tuple[str, str, Optional[str]], OpenAI] = {}
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Tuple[str, str, Optional[str]], AsyncOpenAI]]" = \
+    weakref.WeakKeyDictionary()
+
+
+def _resolve(base_url: Optional[str], api_key: Optional[str]) -> Tuple[str, str]:
+    base_url = (base_url or os.getenv("OPENAI_BASE_URL") or DEFAULT_BASE_URL).rstrip("/")
+    api_key = api_key or os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise ValueError("OPENAI_API_KEY non impostata: impossibile creare il client")
+    return base_url, api_key
+
+
+def _key(base_url: str, api_key: str, organization: Optional[str]) -> Tuple[str, str, Optional[str]]:
+    # La chiave API non viene conservata in chiaro nel dizionario, solo il suo hash
+    return base_url, hashlib.sha256(api_key.encode()).hexdigest(), organization
+
+
+def configure_pool(**limits) -> PoolLimits:
+    """
+    Imposta i limiti del pool per i client creati da questo momento in poi.
+    Accetta gli stessi campi di PoolLimits (max_connections, max_keepalive_connections, ...).
+    """
+    global _limits
+    with _lock:
+        _limits = PoolLimits(**{**_limits.__dict__, **limits})
+        return _limits
+
+
+def get_client(base_url: Optional[str] = None,
+               api_key: Optional[str] = None,
+               organization: Optional[str] = None) -> OpenAI:
+    """Restituisce il client condiviso per (base_url, credenziali), creandolo alla prima richiesta."""
+    base_url, api_key = _resolve(base_url, api_key)
+    key = _key(base_url, api_key, organization)
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            client = OpenAI(
+                api_key=api_key,
+                base_url=base_url,
+                organization=organization,
+                http_client=httpx.Client(limits=_limits.to_httpx(), timeout=_limits.timeout),
+            )
+            _clients[key] = client
+        return client
+
+
+def get_async_client(base_url: Optional[str] = None,
+                     api_key: Optional[str] = None,
+                     organization: Optional[str] = None) -> AsyncOpenAI:
+    """Come get_client, ma restituisce il client asincrono condiviso dell'event loop in esecuzione."""
+    loop = asyncio.get_running_loop()  # RuntimeError fuori da una coroutine
+    base_url, api_key = _resolve(base_url, api_key)
+    key = _key(base_url, api_key, organization)
+    with _lock:
+        clients = _async_clients.setdefault(loop, {})
+        client = clients.get(key)
+        if client is None:
+            client = AsyncOpenAI(
+                api_key=api_key,
+                base_url=base_url,
+                organization=organization,
+                http_client=httpx.AsyncClient(limits=_limits.to_httpx(), timeout=_limits.timeout),
+            )
+            clients[key] = client
+        return client
+
+
+def prewarm(connections: int = 1,
+            base_url: Optional[str] = None,
+            api_key: Optional[str] = None,
+            organization: Optional[str] = None) -> OpenAI:
+    """
+    Apre in anticipo `connections` connessioni keep-alive verso il provider, così la prima
+    chiamata di ogni agente non paga DNS, TCP e TLS. Le richieste (GET /models) partono in
+    parallelo, altrimenti riuserebbero tutte la stessa connessione.
+    """
+    client = get_client(base_url, api_key, organization)
+    connections = max(1, min(connections, _limits.max_keepalive_connections))
+    with ThreadPoolExecutor(max_workers=connections) as pool:
+        list(pool.map(lambda _: client.models.list(), range(connections)))
+    return client
+
+
+async def aclose_all() -> None:
+    """Chiude i client asincroni dell'event loop in esecuzione e li toglie dal registro."""
+    with _lock:
+        clients = list(_async_clients.pop(asyncio.get_running_loop(), {}).values())
+    for client in clients:
+        await client.close()
+
+
+def close_all() -> None:
+    """
+    Chiude tutti i client sincroni registrati e svuota il registro. I client asincroni si chiudono
+    con `await aclose_all()` dal loop che li usa; qui vengono solo tolti quelli dei loop già chiusi.
+    """
+    with _lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
+        for loop in [loop for loop in _async_clients if loop.is_closed()]:
+            del _async_clients[loop]
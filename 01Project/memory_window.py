@@ -0,0 +1,92 @@
+"""
+Finestra scorrevole a budget di token per le classi Memory.
+
+La cronologia completa cresce a ogni turno, e con lei dimensione del prompt, latenza e costo.
+TokenWindow tiene, in parallelo alla lista dei messaggi, il numero di token di ciascun messaggio
+(calcolato una sola volta, quando il messaggio viene aggiunto) e restituisce il messaggio di sistema
+più i turni più recenti che stanno nel budget.
+
+Un messaggio assistente con `tool_calls` e i messaggi `tool` che seguono formano un'unica unità:
+la finestra li include o li esclude insieme, perché l'API rifiuta risultati di tool senza la
+chiamata corrispondente.
+"""
+
+import json
+from typing import Dict, List
+
+# 02Langchain/few_shot_budget.py ne ha una copia (le due cartelle sono indipendenti): tenerle allineate
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("o200k_base")
+except Exception:  # tiktoken non installato o encoding non disponibile offline
+    _encoding = None
+
+# Token aggiunti dal formato chat per ogni messaggio (ruolo, separatori)
+MESSAGE_OVERHEAD = 4
+
+
+def count_text_tokens(text: str) -> int:
+    """Conta i token di un testo con tiktoken, o li stima (~4 caratteri per token) se non disponibile."""
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return max(1, len(text) // 4)
+
+
+def count_message_tokens(message: Dict) -> int:
+    """Token di un messaggio chat: contenuto, eventuali tool_calls e overhead del formato."""
+    tokens = MESSAGE_OVERHEAD + count_text_tokens(message.get("content") or "")
+    if message.get("tool_calls"):
+        tokens += count_text_tokens(json.dumps(message["tool_calls"]))
+    return tokens
+
+
+class TokenWindow:
+    """
+    Indice dei token di una lista di messaggi, aggiornato a ogni append.
+    - _prefix[i]: token totali dei messaggi [0, i)
+    - _units: indici dove inizia un'unità (ogni messaggio che non è un risultato di tool)
+    - _starts: per ogni budget già richiesto, l'unità da cui parte la finestra; dato che i messaggi
+      vengono solo aggiunti, il punto di partenza può solo avanzare (costo O(1) ammortizzato)
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        self._prefix: List[int] = [0]
+        self._units: List[int] = []
+        self._head = 0
+        self._starts: Dict[int, int] = {}
+
+    def append(self, message: Dict) -> None:
+        index = len(self._prefix) - 1
+        self._prefix.append(self._prefix[-1] + count_message_tokens(message))
+        if message.get("role") == "system" and index == self._head:
+            # I messaggi di sistema iniziali restano sempre nella finestra
+            self._head += 1
+        elif message.get("role") != "tool" or not self._units:
+            self._units.append(index)
+
+    @property
+    def total_tokens(self) -> int:
+        return self._prefix[-1]
+
+    def tokens_between(self, start: int, end: int) -> int:
+        return self._prefix[end] - self._prefix[start]
+
+    def select(self, messages: List[Dict], max_tokens: int) -> List[Dict]:
+        """Messaggi di sistema iniziali + le unità più recenti che stanno in `max_tokens`."""
+        end = len(self._prefix) - 1
+        if not self._units:
+            return list(messages[:end])
+
+        budget = max_tokens - self.tokens_between(0, self._head)
+        unit = self._starts.get(max_tokens, 0)
+        # L'ultima unità (di solito il messaggio utente corrente) viene sempre inclusa
+        while unit < len(self._units) - 1 and self.tokens_between(self._units[unit], end) > budget:
+            unit += 1
+        self._starts[max_tokens] = unit
+
+        return messages[:self._head] + messages[self._units[unit]:end]
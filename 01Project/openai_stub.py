@@ -0,0 +1,321 @@
+"""
+Server locale compatibile con l'API OpenAI (chat completions), pensato per i benchmark.
+
+Non usa dipendenze esterne: è costruito su http.server della libreria standard e risponde a
+- GET  /v1/models
+- POST /v1/chat/completions (anche con stream=True, in formato Server-Sent Events)
+
+La risposta è decisa da un `responder`, una funzione che riceve il body JSON della richiesta e
+restituisce il testo dell'assistente, oppure un dizionario messaggio con `tool_calls` (vedi
+`tool_call`). Di default il server fa l'eco dell'ultimo messaggio utente.
+
+Con `prefix_cache=True` simula il prompt caching del provider: i messaggi iniziali già visti in una
+richiesta precedente contano come `usage.prompt_tokens_details.cached_tokens` (da 1024 token in su,
+a blocchi di 128) e non pagano `prefill_delay`.
+
+Con `truncate_after=N` le risposte in streaming si interrompono dopo N delta, senza finish_reason
+né [DONE], come una connessione caduta a metà generazione. Con `reset_after=N` invece la connessione
+viene chiusa con un RST dopo N delta: il client riceve un errore di trasporto (es. httpx.ReadError).
+
+Come un provider reale, il server smette di generare appena il client chiude la connessione durante
+uno stream: l'istante viene registrato in `disconnects` (time.perf_counter del processo).
+"""
+
+import hashlib
+import json
+import select
+import socket
+import struct
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Union
+
+
+def echo_responder(body: Dict) -> str:
+    """Restituisce l'ultimo messaggio utente preceduto da 'Echo:'."""
+    for message in reversed(body.get("messages", [])):
+        if message.get("role") == "user":
+            return f"Echo: {message.get('content')}"
+    return "Echo"
+
+
+def tool_call(name: str, arguments: Dict, call_id: Optional[str] = None) -> Dict:
+    """Costruisce una tool call nel formato dell'API, da restituire dentro `tool_calls` di un responder."""
+    return {
+        "id": call_id or f"call_{uuid.uuid4().hex[:12]}",
+        "type": "function",
+        "function": {"name": name, "arguments": json.dumps(arguments)},
+    }
+
+
+def _deltas(message: Dict) -> List[Dict]:
+    """Divide un messaggio nei delta che un provider reale invierebbe in streaming."""
+    deltas = []
+    words = (message.get("content") or "").split(" ")
+    if message.get("content"):
+        deltas = [{"content": word if i == 0 else f" {word}"} for i, word in enumerate(words)]
+    for index, call in enumerate(message.get("tool_calls") or []):
+        deltas.append({"tool_calls": [{
+            "index": index, "id": call["id"], "type": "function",
+            "function": {"name": call["function"]["name"], "arguments": ""},
+        }]})
+        arguments = call["function"]["arguments"]
+        for start in range(0, len(arguments), 8):
+            deltas.append({"tool_calls": [{"index": index, "function": {"arguments": arguments[start:start + 8]}}]})
+    return deltas
+
+
+def _count_tokens(text: str) -> int:
+    """Stima grezza dei token (circa 4 caratteri per token), sufficiente per i benchmark."""
+    return max(1, len(text) // 4) if text else 0
+
+
+def _prefix_hashes(messages: List[Dict]) -> List[str]:
+    """Hash cumulativi: l'i-esimo identifica i primi i+1 messaggi, byte per byte."""
+    digest = hashlib.sha256()
+    hashes = []
+    for message in messages:
+        digest.update(json.dumps(message, sort_keys=True).encode())
+        hashes.append(digest.copy().hexdigest())
+    return hashes
+
+
+class _StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Coda di accept ampia: i benchmark aprono centinaia di connessioni nello stesso istante
+    request_queue_size = 1024
+
+    def __init__(self, address, handler, stub: "OpenAIStub"):
+        super().__init__(address, handler)
+        self.stub = stub
+
+    def process_request(self, request, client_address):
+        # Ogni chiamata qui corrisponde a una nuova connessione TCP accettata
+        with self.stub._lock:
+            self.stub.connections += 1
+        super().process_request(request, client_address)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Senza TCP_NODELAY le connessioni keep-alive pagano ~40 ms di delayed ACK per richiesta
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json({"object": "list", "data": [{"id": "gpt-4o-mini", "object": "model"}]})
+        else:
+            self._send_json({"error": {"message": "Not found"}}, status=404)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        stub: OpenAIStub = self.server.stub
+        with stub._lock:
+            stub.requests += 1
+
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json({"error": {"message": "Not found"}}, status=404)
+            return
+
+        messages = body.get("messages", [])
+        prompt_tokens = sum(_count_tokens(str(m.get("content") or "")) for m in messages)
+        cached_tokens = stub._cached_tokens(messages)
+        delay = stub.latency + stub.prefill_delay * (prompt_tokens - cached_tokens)
+        if delay:
+            time.sleep(delay)
+
+        try:
+            reply = stub.responder(body)
+        except Exception as e:
+            # Permette di simulare errori del provider sollevando un'eccezione nel responder
+            self._send_json({"error": {"message": str(e), "type": "server_error"}}, status=500)
+            return
+        message = reply if isinstance(reply, dict) else {"content": reply}
+        message = {"role": "assistant", "content": None, **message}
+        content = message["content"] or ""
+        finish_reason = "tool_calls" if message.get("tool_calls") else "stop"
+
+        deltas = _deltas(message)
+        if body.get("stream"):
+            self._stream_completion(body, deltas, finish_reason)
+        else:
+            # Senza streaming la risposta arriva solo quando l'intera generazione è finita
+            if stub.token_delay:
+                time.sleep(stub.token_delay * len(deltas))
+            self._send_json({
+                "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model", "gpt-4o-mini"),
+                "choices": [{
+                    "index": 0,
+                    "message": message,
+                    "finish_reason": finish_reason,
+                }],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": _count_tokens(content),
+                    "total_tokens": prompt_tokens + _count_tokens(content),
+                    "prompt_tokens_details": {"cached_tokens": cached_tokens},
+                },
+            })
+
+    def _stream_completion(self, body: Dict, deltas: List[Dict], finish_reason: str):
+        stub: OpenAIStub = self.server.stub
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+
+        def chunk(delta: Dict, finish_reason: Optional[str] = None) -> bytes:
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": body.get("model", "gpt-4o-mini"),
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            return f"data: {json.dumps(payload)}\n\n".encode()
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        self.wfile.write(chunk({"role": "assistant", "content": ""}))
+        for sent, delta in enumerate(deltas):
+            if stub.truncate_after is not None and sent >= stub.truncate_after:
+                self.wfile.flush()
+                return
+            if stub.reset_after is not None and sent >= stub.reset_after:
+                self.wfile.flush()
+                # SO_LINGER a zero: close() manda un RST invece della chiusura regolare
+                self.connection.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+                self.connection.close()
+                return
+            if stub.token_delay and self._client_gone(stub.token_delay):
+                with stub._lock:
+                    stub.disconnects.append(time.perf_counter())
+                return
+            self.wfile.write(chunk(delta))
+            self.wfile.flush()
+        self.wfile.write(chunk({}, finish_reason=finish_reason))
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    def _client_gone(self, timeout: float) -> bool:
+        """Aspetta `timeout` secondi; True se nel frattempo il client ha chiuso la connessione."""
+        readable, _, _ = select.select([self.connection], [], [], timeout)
+        if not readable:
+            return False
+        try:
+            # Il client non invia altro dopo la richiesta: leggibile = EOF o reset
+            return not self.connection.recv(1, socket.MSG_PEEK)
+        except OSError:
+            return True
+
+    def _send_json(self, payload: Dict, status: int = 200):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class OpenAIStub:
+    """
+    Server OpenAI-compatibile eseguito in un thread di background.
+    - latency: ritardo (secondi) prima di ogni risposta, simula il tempo di generazione
+    - token_delay: ritardo (secondi) tra un delta e l'altro; senza streaming la risposta arriva dopo
+      il tempo totale di generazione (token_delay * numero di delta)
+    - responder: funzione body -> testo dell'assistente (o messaggio con tool_calls)
+    - prefix_cache: simula il prompt caching (vedi sopra); prefill_delay è il costo in secondi di
+      ogni token di prompt non in cache
+    - truncate_after: numero di delta dopo cui gli stream si interrompono (None = mai)
+    - reset_after: numero di delta dopo cui la connessione viene chiusa con un RST (None = mai)
+    """
+
+    MIN_CACHED_TOKENS = 1024
+    CACHE_BLOCK_TOKENS = 128
+
+    def __init__(self,
+                 latency: float = 0.0,
+                 token_delay: float = 0.0,
+                 responder: Callable[[Dict], Union[str, Dict]] = echo_responder,
+                 host: str = "127.0.0.1",
+                 port: int = 0,
+                 prefix_cache: bool = False,
+                 prefill_delay: float = 0.0,
+                 max_cached_prefixes: int = 10_000,
+                 truncate_after: Optional[int] = None,
+                 reset_after: Optional[int] = None):
+        self.latency = latency
+        self.token_delay = token_delay
+        self.responder = responder
+        self.prefix_cache = prefix_cache
+        self.prefill_delay = prefill_delay
+        self.max_cached_prefixes = max_cached_prefixes
+        self.truncate_after = truncate_after
+        self.reset_after = reset_after
+        self.disconnects: List[float] = []
+        self.connections = 0
+        self.requests = 0
+        self._prefixes: "OrderedDict[str, None]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._server = _StubServer((host, port), _Handler, self)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def _cached_tokens(self, messages: List[Dict]) -> int:
+        """Token del prefisso più lungo già visto, poi registra tutti i prefissi della richiesta."""
+        if not self.prefix_cache:
+            return 0
+        cached, total = 0, 0
+        with self._lock:
+            for message, key in zip(messages, _prefix_hashes(messages)):
+                total += _count_tokens(str(message.get("content") or ""))
+                if key in self._prefixes:
+                    self._prefixes.move_to_end(key)
+                    cached = total
+                else:
+                    self._prefixes[key] = None
+            while len(self._prefixes) > self.max_cached_prefixes:
+                self._prefixes.popitem(last=False)
+        if cached < self.MIN_CACHED_TOKENS:
+            return 0
+        return cached - cached % self.CACHE_BLOCK_TOKENS
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "OpenAIStub":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "OpenAIStub":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+if __name__ == '__main__':
+    with OpenAIStub(latency=0.05) as stub:
+        print(f"Stub OpenAI in ascolto su {stub.base_url} (CTRL+C per uscire)")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
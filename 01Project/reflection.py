@@ -0,0 +1,190 @@
+"""
+Strumenti per il ciclo di autoriflessione di E3 Self reflection.py.
+
+La critica del modello è un JSON (original_response, revisions_needed, updated_response): qui viene
+letta in modo tollerante (blocchi ```json, testo attorno all'oggetto) e usata per decidere quando
+fermarsi:
+- la critica dice che non servono revisioni
+- la risposta aggiornata è quasi identica alla precedente (similarità >= soglia)
+
+Così la riflessione costa 1 + numero di critiche chiamate, e di solito molte meno del massimo.
+
+In alternativa (best-of-N) si generano N candidati in parallelo e un solo giudizio JSON (scores,
+best_candidate, final_response) li valuta e li fonde: circa due round-trip qualunque sia N.
+
+HeuristicPreCritic è un primo livello locale (lunghezza, JSON valido, ripetizioni): se la bozza
+passa i controlli la critica del modello viene saltata, altrimenti i problemi trovati vengono
+passati alla critica come suggerimento.
+"""
+
+import json
+import threading
+from dataclasses import dataclass, field
+from difflib import SequenceMatcher
+from typing import Dict, List, Optional
+
+# Valori di revisions_needed che significano "nessuna revisione"
+NO_REVISIONS = {"", "no", "none", "n/a", "na", "nothing", "false", "null", "no revisions",
+                "none needed", "not needed", "nessuna"}
+NO_REVISIONS_PREFIXES = ("no revision", "no change", "none ", "nessuna revisione", "nessuna modifica")
+
+
+@dataclass
+class Critique:
+    original_response: str = ""
+    revisions_needed: str = ""
+    updated_response: str = ""
+
+    @property
+    def needs_revision(self) -> bool:
+        text = self.revisions_needed.strip().strip(".!").lower()
+        if text in NO_REVISIONS or text.startswith(NO_REVISIONS_PREFIXES):
+            return False
+        return bool(self.updated_response.strip())
+
+
+def _as_text(value) -> str:
+    if value is None or value is False:
+        return ""
+    if value is True:
+        return "yes"
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False) if value else ""
+    return str(value)
+
+
+def _json_object(text: Optional[str]) -> Optional[Dict]:
+    """Il primo oggetto JSON nel testo, ignorando blocchi ```json e testo attorno."""
+    if not text:
+        return None
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end <= start:
+        return None
+    try:
+        data = json.loads(text[start:end + 1])
+    except json.JSONDecodeError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def parse_critique(text: Optional[str]) -> Optional[Critique]:
+    """Estrae la critica JSON dalla risposta del modello; None se non c'è un oggetto valido."""
+    data = _json_object(text)
+    if data is None:
+        return None
+    return Critique(original_response=_as_text(data.get("original_response")),
+                    revisions_needed=_as_text(data.get("revisions_needed")),
+                    updated_response=_as_text(data.get("updated_response")))
+
+
+@dataclass
+class Verdict:
+    """Giudizio sui candidati best-of-N; `best_candidate` parte da 1, come nel prompt."""
+    scores: List[float]
+    best_candidate: int
+    final_response: str
+
+    def choose(self, candidates: List[str]) -> str:
+        """La risposta fusa dal critico, altrimenti il candidato migliore."""
+        if self.final_response.strip():
+            return self.final_response
+        return candidates[min(max(self.best_candidate, 1), len(candidates)) - 1]
+
+
+def parse_verdict(text: Optional[str], candidates: int) -> Optional[Verdict]:
+    """Estrae il giudizio JSON sui candidati; None se non c'è un oggetto valido."""
+    data = _json_object(text)
+    if data is None:
+        return None
+    scores = []
+    for score in data.get("scores") or []:
+        try:
+            scores.append(float(score))
+        except (TypeError, ValueError):
+            scores.append(0.0)
+    try:
+        best = int(data.get("best_candidate"))
+    except (TypeError, ValueError):
+        # Senza indicazione esplicita vale il punteggio più alto
+        best = scores.index(max(scores)) + 1 if scores else 1
+    return Verdict(scores=scores[:candidates], best_candidate=best,
+                   final_response=_as_text(data.get("final_response")))
+
+
+def similarity(a: str, b: str) -> float:
+    """Similarità tra 0 e 1 (difflib); i limiti superiori economici evitano il confronto completo."""
+    if a == b:
+        return 1.0
+    matcher = SequenceMatcher(None, a, b, autojunk=False)
+    if matcher.real_quick_ratio() == 0 or matcher.quick_ratio() == 0:
+        return 0.0
+    return matcher.ratio()
+
+
+@dataclass
+class HeuristicPreCritic:
+    """
+    Controlli locali sulla bozza, senza chiamare il modello:
+    - lunghezza tra min_chars e max_chars
+    - JSON valido, se la bozza è (o contiene in un blocco ```json) un oggetto JSON
+    - quota di trigrammi di parole ripetuti non oltre max_repetition
+    """
+    min_chars: int = 20
+    max_chars: int = 4000
+    max_repetition: float = 0.2
+
+    def review(self, draft: Optional[str]) -> List[str]:
+        """Problemi trovati nella bozza; una lista vuota significa bozza accettata."""
+        text = (draft or "").strip()
+        issues = []
+        if len(text) < self.min_chars:
+            issues.append(f"the response is too short ({len(text)} characters)")
+        elif len(text) > self.max_chars:
+            issues.append(f"the response is too long ({len(text)} characters)")
+
+        if text.startswith(("{", "[")) or "```json" in text:
+            body = text.split("```json", 1)[1].split("```", 1)[0] if "```json" in text else text
+            try:
+                json.loads(body)
+            except json.JSONDecodeError as e:
+                issues.append(f"the JSON is not valid ({e.msg} at position {e.pos})")
+
+        words = text.lower().split()
+        trigrams = list(zip(words, words[1:], words[2:]))
+        if trigrams:
+            repetition = 1 - len(set(trigrams)) / len(trigrams)
+            if repetition > self.max_repetition:
+                issues.append(f"the response repeats itself ({repetition:.0%} repeated word sequences)")
+        return issues
+
+
+@dataclass
+class ReflectionStats:
+    """
+    Contatori dell'agente: risposte date, chiamate al modello (anche per modello), token di prompt,
+    motivo di uscita dal ciclo e livello che ha deciso su ogni bozza (vedi Agent._reflect).
+    """
+    answers: int = 0
+    llm_calls: int = 0
+    prompt_tokens: int = 0
+    calls_by_model: Dict[str, int] = field(default_factory=dict)
+    exits: Dict[str, int] = field(default_factory=dict)
+    decisions: Dict[str, int] = field(default_factory=dict)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def record_call(self, model: str, prompt_tokens: int = 0) -> None:
+        # I candidati best-of-N vengono generati da più thread
+        with self._lock:
+            self.llm_calls += 1
+            self.prompt_tokens += prompt_tokens
+            self.calls_by_model[model] = self.calls_by_model.get(model, 0) + 1
+
+    def record_decision(self, tier: str) -> None:
+        self.decisions[tier] = self.decisions.get(tier, 0) + 1
+
+    def record_exit(self, reason: str) -> None:
+        self.exits[reason] = self.exits.get(reason, 0) + 1
+
+    @property
+    def average_calls(self) -> float:
+        return self.llm_calls / self.answers if self.answers else 0.0
@@ -0,0 +1,245 @@
+"""
+Archivio persistente delle sessioni per le classi Memory.
+
+Ogni `add_message` diventa una singola scrittura in coda (append-only) nel log della sessione, quindi
+un riavvio del processo non perde le conversazioni e una sessione può essere ripresa da un altro
+worker che legge lo stesso archivio.
+
+Due backend con la stessa interfaccia (append / load / delete / save_summary / load_summary):
+- JSONLSessionStore: un file .jsonl per sessione, una riga JSON per messaggio; il caricamento mappa
+  il file in memoria (mmap) e decodifica i messaggi solo quando vengono letti
+- SQLiteSessionStore: una tabella (session_id, seq, body) in un database SQLite condiviso
+
+Il riassunto della compattazione (Memory con compact_after) non riscrive il log: save_summary salva
+il testo del riassunto e quanti messaggi del log sostituisce, load_summary lo restituisce al
+ricaricamento della sessione.
+"""
+
+import json
+import mmap
+import os
+import re
+import sqlite3
+import threading
+from collections.abc import Sequence
+from typing import Dict, List, Optional, Tuple
+
+
+class LazyMessages(Sequence):
+    """
+    Lista di messaggi ricostruita in modo pigro da un log: all'apertura si calcolano solo gli
+    offset delle righe, il JSON di un messaggio viene decodificato al primo accesso.
+    I messaggi aggiunti dopo il caricamento stanno in una normale lista in coda.
+    """
+
+    def __init__(self, raw: Sequence, decode=json.loads):
+        self._raw = raw
+        self._decode = decode
+        self._decoded: Dict[int, Dict] = {}
+        self._tail: List[Dict] = []
+
+    def __len__(self) -> int:
+        return len(self._raw) + len(self._tail)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("message index out of range")
+        if index >= len(self._raw):
+            return self._tail[index - len(self._raw)]
+        message = self._decoded.get(index)
+        if message is None:
+            message = self._decode(self._raw[index])
+            self._decoded[index] = message
+        return message
+
+    def __iter__(self):
+        for index in range(len(self._raw)):
+            message = self._decoded.get(index)
+            if message is None:
+                message = self._decoded[index] = self._decode(self._raw[index])
+            yield message
+        yield from self._tail
+
+    def append(self, message: Dict) -> None:
+        self._tail.append(message)
+
+    def __add__(self, other) -> List[Dict]:
+        return list(self) + list(other)
+
+    def close(self) -> None:
+        """Rilascia il file mappato; i messaggi non ancora decodificati non sono più leggibili."""
+        close = getattr(self._raw, "close", None)
+        if close is not None:
+            close()
+
+    def __repr__(self) -> str:
+        return f"LazyMessages({len(self)} messages, {len(self._decoded)} decoded)"
+
+
+class _MappedLines(Sequence):
+    """Righe di un file mappato in memoria, indicizzate dagli offset di inizio riga."""
+
+    def __init__(self, path: str):
+        self._offsets: List[int] = []
+        self._mm: Optional[mmap.mmap] = None
+        if os.path.getsize(path) == 0:
+            return
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        size = len(self._mm)
+        start = 0
+        while start < size:
+            end = self._mm.find(b"\n", start)
+            if end == -1:
+                # Ultima riga troncata (es. crash durante la scrittura): viene ignorata
+                break
+            self._offsets.append(start)
+            start = end + 1
+        self._offsets.append(start)
+
+    def __len__(self) -> int:
+        return max(0, len(self._offsets) - 1)
+
+    def __getitem__(self, index: int) -> bytes:
+        return self._mm[self._offsets[index]:self._offsets[index + 1] - 1]
+
+    def close(self) -> None:
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+
+
+class JSONLSessionStore:
+    """
+    Un file `<session_id>.jsonl` per sessione nella cartella `directory`.
+    - fsync: se True ogni scrittura viene forzata su disco (più lento, ma sopravvive a un crash del sistema)
+    """
+
+    def __init__(self, directory: str, fsync: bool = False):
+        self.directory = directory
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._files = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, session_id: str) -> str:
+        if not re.fullmatch(r"[\w.-]+", session_id):
+            raise ValueError(f"session_id non valido: {session_id!r}")
+        return os.path.join(self.directory, f"{session_id}.jsonl")
+
+    def _summary_path(self, session_id: str) -> str:
+        return self._path(session_id)[:-len(".jsonl")] + ".summary.json"
+
+    def append(self, session_id: str, message: Dict) -> None:
+        line = json.dumps(message, ensure_ascii=False, separators=(",", ":")) + "\n"
+        with self._lock:
+            f = self._files.get(session_id)
+            if f is None:
+                f = self._files[session_id] = open(self._path(session_id), "ab")
+            f.write(line.encode())
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+
+    def load(self, session_id: str) -> LazyMessages:
+        path = self._path(session_id)
+        if not os.path.exists(path):
+            return LazyMessages([])
+        return LazyMessages(_MappedLines(path))
+
+    def save_summary(self, session_id: str, summary: str, folded: int) -> None:
+        """Riassunto dei primi `folded` messaggi del log (dopo quelli di sistema iniziali)."""
+        path = self._summary_path(session_id)
+        with self._lock:
+            # Scrittura atomica: un crash lascia il riassunto precedente, mai uno troncato
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump({"summary": summary, "folded": folded}, f, ensure_ascii=False)
+                if self.fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(path + ".tmp", path)
+
+    def load_summary(self, session_id: str) -> Optional[Tuple[str, int]]:
+        path = self._summary_path(session_id)
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            record = json.load(f)
+        return record["summary"], record["folded"]
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            f = self._files.pop(session_id, None)
+            if f is not None:
+                f.close()
+            for path in (self._path(session_id), self._summary_path(session_id)):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def close(self) -> None:
+        with self._lock:
+            for f in self._files.values():
+                f.close()
+            self._files.clear()
+
+
+class SQLiteSessionStore:
+    """Tutte le sessioni in un database SQLite (modalità WAL, condivisibile tra processi)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS messages ("
+            " session_id TEXT NOT NULL, seq INTEGER NOT NULL, body TEXT NOT NULL,"
+            " PRIMARY KEY (session_id, seq))"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS summaries ("
+            " session_id TEXT PRIMARY KEY, summary TEXT NOT NULL, folded INTEGER NOT NULL)"
+        )
+
+    def append(self, session_id: str, message: Dict) -> None:
+        body = json.dumps(message, ensure_ascii=False, separators=(",", ":"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO messages (session_id, seq, body) VALUES ("
+                " ?, (SELECT COALESCE(MAX(seq), -1) + 1 FROM messages WHERE session_id = ?), ?)",
+                (session_id, session_id, body),
+            )
+
+    def load(self, session_id: str) -> LazyMessages:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT body FROM messages WHERE session_id = ? ORDER BY seq", (session_id,)
+            ).fetchall()
+        return LazyMessages([row[0] for row in rows])
+
+    def save_summary(self, session_id: str, summary: str, folded: int) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO summaries (session_id, summary, folded) VALUES (?, ?, ?)",
+                (session_id, summary, folded),
+            )
+
+    def load_summary(self, session_id: str) -> Optional[Tuple[str, int]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT summary, folded FROM summaries WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        return (row[0], row[1]) if row is not None else None
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            self._conn.execute("DELETE FROM summaries WHERE session_id = ?", (session_id,))
+
+    def close(self) -> None:
+        self._conn.close()
@@ -0,0 +1,117 @@
+"""
+Memoizzazione dei risultati dei tool con una politica dichiarativa per ogni tool.
+
+- tool puri (es. `power`): lo stesso input dà sempre lo stesso output, il risultato vale per sempre
+- tool legati al tempo (es. `get_current_weather`): il risultato vale per `ttl` secondi
+- tool non cacheabili (effetti collaterali, dati sempre nuovi): vengono eseguiti ogni volta
+
+La chiave è il nome del tool più gli argomenti in JSON canonico (chiavi ordinate, separatori compatti),
+quindi lo stesso oggetto JSON scritto in modo diverso dal modello finisce nella stessa voce. 2 e 2.0
+restano chiavi diverse: `power(10, 400)` restituisce un intero esatto, `power(10.0, 400)` solleva
+OverflowError, e 2 ** 10 è 1024 mentre 2.0 ** 10 è 1024.0.
+La cache è condivisa tra sessioni, limitata in memoria (LRU) e tiene i tassi di hit per tool.
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+
+@dataclass(frozen=True)
+class CachePolicy:
+    """Politica di cache di un tool: `ttl` in secondi, None = nessuna scadenza."""
+    cacheable: bool = True
+    ttl: Optional[float] = None
+
+    @classmethod
+    def forever(cls) -> "CachePolicy":
+        return cls(cacheable=True, ttl=None)
+
+    @classmethod
+    def expire_after(cls, seconds: float) -> "CachePolicy":
+        return cls(cacheable=True, ttl=seconds)
+
+    @classmethod
+    def never(cls) -> "CachePolicy":
+        return cls(cacheable=False)
+
+
+def canonical_args(tool_args: Dict) -> str:
+    """JSON canonico degli argomenti: chiavi ordinate e separatori compatti (interi e float restano distinti)."""
+    return json.dumps(tool_args, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+
+class ToolResultCache:
+    """
+    - policies: politica per nome del tool; i tool non elencati usano `default_policy`
+    - max_entries / max_bytes: limiti della cache (eviction LRU)
+    """
+
+    def __init__(self,
+                 policies: Dict[str, CachePolicy],
+                 default_policy: CachePolicy = CachePolicy.never(),
+                 max_entries: int = 10_000,
+                 max_bytes: int = 16 * 1024 * 1024):
+        self.policies = dict(policies)
+        self.default_policy = default_policy
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._data: "OrderedDict[Tuple[str, str], Tuple[Any, float, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._hits: Dict[str, int] = {}
+        self._misses: Dict[str, int] = {}
+
+    def policy(self, tool_name: str) -> CachePolicy:
+        return self.policies.get(tool_name, self.default_policy)
+
+    def get(self, tool_name: str, tool_args: Dict) -> Tuple[bool, Any]:
+        """Restituisce (True, risultato) se c'è un risultato valido in cache, altrimenti (False, None)."""
+        policy = self.policy(tool_name)
+        if not policy.cacheable:
+            return False, None
+        key = (tool_name, canonical_args(tool_args))
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and policy.ttl is not None and time.monotonic() - item[1] > policy.ttl:
+                self._remove(key)
+                item = None
+            if item is None:
+                self._misses[tool_name] = self._misses.get(tool_name, 0) + 1
+                return False, None
+            self._data.move_to_end(key)
+            self._hits[tool_name] = self._hits.get(tool_name, 0) + 1
+            return True, item[0]
+
+    def put(self, tool_name: str, tool_args: Dict, result: Any) -> None:
+        """Salva il risultato se la politica del tool lo consente."""
+        if not self.policy(tool_name).cacheable:
+            return
+        key = (tool_name, canonical_args(tool_args))
+        size = len(key[1]) + len(str(result))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (result, time.monotonic(), size)
+            self._bytes += size
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._data)))
+
+    def _remove(self, key: Tuple[str, str]) -> None:
+        _, _, size = self._data.pop(key)
+        self._bytes -= size
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Hit, miss e hit rate per ogni tool cacheabile che è stato richiesto."""
+        with self._lock:
+            names = set(self._hits) | set(self._misses)
+            result = {}
+            for name in sorted(names):
+                hits, misses = self._hits.get(name, 0), self._misses.get(name, 0)
+                result[name] = {"hits": hits, "misses": misses, "hit_rate": hits / (hits + misses)}
+            return result
@@ -0,0 +1,195 @@
+"""
+Esecutore isolato per i tool chiamati dal modello.
+
+Un tool non deve poter bloccare il loop dell'agente: `power(10, 10_000_000)` calcolato nel thread
+della richiesta ferma tutta la conversazione. Qui ogni tool:
+- gira in un pool di thread, oppure in un pool di processi se dichiarato CPU-bound
+- ha un timeout di wall-clock; dopo un timeout il pool di processi viene sostituito e quello vecchio
+  terminato appena le altre chiamate che stava eseguendo sono finite (o scadute a loro volta)
+- ha un limite sulla dimensione del risultato, controllato nel worker stesso
+
+Timeout, crash ed eccezioni diventano un ToolError, il cui `to_json()` è pensato per essere
+restituito al modello come contenuto del messaggio `tool`, invece di interrompere la conversazione.
+
+Nota: un thread non può essere interrotto dall'esterno. Allo scadere del timeout il risultato viene
+abbandonato ma il thread finisce il suo lavoro in background; per questo i tool pesanti vanno
+dichiarati CPU-bound.
+"""
+
+import asyncio
+import inspect
+import json
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Iterable, Optional, Set
+
+
+class ToolError(Exception):
+    """Errore di esecuzione di un tool: `kind` è timeout, crashed, result_too_large o tool_error."""
+
+    def __init__(self, kind: str, message: str):
+        super().__init__(kind, message)
+        self.kind = kind
+        self.message = message
+
+    def __str__(self) -> str:
+        return f"{self.kind}: {self.message}"
+
+    def to_json(self) -> str:
+        return json.dumps({"error": {"type": self.kind, "message": self.message}})
+
+
+def _to_text(result: Any, max_result_chars: int) -> str:
+    try:
+        text = result if isinstance(result, str) else str(result)
+    except ValueError as e:
+        # es. interi con troppe cifre: Python rifiuta di convertirli in stringa
+        raise ToolError("result_too_large", str(e))
+    if len(text) > max_result_chars:
+        raise ToolError("result_too_large",
+                        f"result has {len(text)} characters, the limit is {max_result_chars}")
+    return text
+
+
+def _execute(tool: Callable, tool_args: Dict, max_result_chars: int) -> str:
+    """Eseguita nel worker: chiama il tool e converte subito il risultato in testo (con il limite)."""
+    return _to_text(tool(**tool_args), max_result_chars)
+
+
+class ToolExecutor:
+    """
+    - cpu_bound: nomi dei tool da eseguire nel pool di processi
+    - timeout: timeout di default in secondi; `timeouts` permette valori diversi per tool
+    - max_result_chars: dimensione massima del risultato convertito in testo
+    """
+
+    def __init__(self,
+                 cpu_bound: Iterable[str] = (),
+                 timeout: float = 10.0,
+                 timeouts: Optional[Dict[str, float]] = None,
+                 max_result_chars: int = 8000,
+                 thread_workers: int = 8,
+                 process_workers: int = 2):
+        self.cpu_bound = set(cpu_bound)
+        self.timeout = timeout
+        self.timeouts = dict(timeouts or {})
+        self.max_result_chars = max_result_chars
+        self.process_workers = process_workers
+        self._threads = ThreadPoolExecutor(max_workers=thread_workers, thread_name_prefix="tool")
+        self._processes: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        # Chiamate in attesa su ogni pool di processi e pool ritirati dopo un timeout o un crash
+        self._callers: Dict[ProcessPoolExecutor, int] = {}
+        self._retired: Set[ProcessPoolExecutor] = set()
+
+    def _process_pool(self) -> ProcessPoolExecutor:
+        # Creato alla prima richiesta: avviare processi all'import sarebbe uno spreco
+        with self._lock:
+            if self._processes is None:
+                self._processes = ProcessPoolExecutor(max_workers=self.process_workers)
+            return self._processes
+
+    def _retire_process_pool(self, pool: ProcessPoolExecutor) -> None:
+        """Le nuove chiamate vanno in un pool nuovo; quello vecchio serve ancora le chiamate in corso."""
+        with self._lock:
+            if self._processes is pool:
+                self._processes = None
+            if pool in self._retired:
+                return
+            self._retired.add(pool)
+            idle = not self._callers.get(pool)
+        if idle:
+            self._terminate(pool)
+
+    def _release(self, pool) -> None:
+        if pool is None or pool is self._threads:
+            return
+        with self._lock:
+            self._callers[pool] -= 1
+            if self._callers[pool]:
+                return
+            del self._callers[pool]
+            retired = pool in self._retired
+        if retired:
+            # Nessuno aspetta più un risultato da questo pool: si può terminare il worker bloccato
+            self._terminate(pool)
+
+    def _terminate(self, pool: ProcessPoolExecutor) -> None:
+        with self._lock:
+            self._retired.discard(pool)
+        # Un task in corso non si può annullare: si terminano direttamente i processi del pool
+        for process in list((getattr(pool, "_processes", None) or {}).values()):
+            process.terminate()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _submit(self, tool_name: str, tool: Callable, tool_args: Dict):
+        if tool_name not in self.cpu_bound:
+            return self._threads, self._threads.submit(_execute, tool, tool_args, self.max_result_chars)
+        pool = self._process_pool()
+        with self._lock:
+            self._callers[pool] = self._callers.get(pool, 0) + 1
+        try:
+            return pool, pool.submit(_execute, tool, tool_args, self.max_result_chars)
+        except BaseException:
+            self._release(pool)
+            raise
+
+    def _error(self, tool_name: str, pool, e: BaseException, timeout: float) -> ToolError:
+        if isinstance(e, ToolError):
+            return e
+        if isinstance(e, (FutureTimeoutError, asyncio.TimeoutError)):
+            if pool is not None and pool is not self._threads:
+                self._retire_process_pool(pool)
+            return ToolError("timeout", f"{tool_name} did not finish within {timeout} seconds")
+        if isinstance(e, BrokenProcessPool):
+            self._retire_process_pool(pool)
+            return ToolError("crashed", f"the worker running {tool_name} terminated abruptly")
+        return ToolError("tool_error", f"{type(e).__name__}: {e}")
+
+    def run(self, tool_name: str, tool: Callable, tool_args: Dict) -> str:
+        """Esegue il tool e ne restituisce il risultato come testo, oppure solleva ToolError."""
+        timeout = self.timeouts.get(tool_name, self.timeout)
+        if inspect.iscoroutinefunction(tool):
+            # asyncio.run crea un loop nuovo: dentro un loop in esecuzione il tool va atteso con run_async
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                return asyncio.run(self.run_async(tool_name, tool, tool_args))
+            raise RuntimeError(f"il tool async {tool_name} non può essere eseguito con run() da un event loop "
+                               f"in esecuzione: usare `await executor.run_async(...)`")
+        pool = None
+        try:
+            pool, future = self._submit(tool_name, tool, tool_args)
+            try:
+                return future.result(timeout=timeout)
+            finally:
+                future.cancel()
+        except Exception as e:
+            raise self._error(tool_name, pool, e, timeout) from e
+        finally:
+            self._release(pool)
+
+    async def run_async(self, tool_name: str, tool: Callable, tool_args: Dict) -> str:
+        """Come run, ma senza bloccare l'event loop; i tool async vengono attesi direttamente."""
+        timeout = self.timeouts.get(tool_name, self.timeout)
+        pool = None
+        try:
+            if inspect.iscoroutinefunction(tool):
+                result = await asyncio.wait_for(tool(**tool_args), timeout)
+                return _to_text(result, self.max_result_chars)
+            pool, future = self._submit(tool_name, tool, tool_args)
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except Exception as e:
+            raise self._error(tool_name, pool, e, timeout) from e
+        finally:
+            self._release(pool)
+
+    def shutdown(self) -> None:
+        self._threads.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            pools = {*self._callers, *self._retired, *([self._processes] if self._processes else [])}
+            self._processes = None
+        for pool in pools:
+            self._terminate(pool)
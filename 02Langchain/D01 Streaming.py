@@ -1,10 +1,18 @@
 import asyncio
 import os
-from typing import List
+import string
+import httpx
+import openai
+from typing import AsyncIterator, List, Optional
 from langchain_openai import ChatOpenAI
 from langchain_core.messages import HumanMessage, SystemMessage, AIMessage, AIMessageChunk
 from langchain_core.prompts import PromptTemplate, FewShotPromptTemplate, ChatPromptTemplate, FewShotChatMessagePromptTemplate
 from dotenv import load_dotenv
+from few_shot_budget import MessageTokenCounter, TokenBudgetExampleSelector, count_message_tokens
+from stream_accumulator import StreamAccumulator
+from stream_checkpoint import OverlapStitcher, StreamCheckpoint
+import stream_cancel
+from stream_cancel import CancellationToken
 
 load_dotenv()
 
@@ -12,6 +20,9 @@ llm = ChatOpenAI(
     model_name="gpt-4o-mini",
     temperature=0.0,
     openai_api_key=os.getenv("OPENAI_API_KEY"),
+    # Alla cancellazione di uno stream la connessione viene chiusa subito (vedi stream_cancel.py)
+    http_client=stream_cancel.cancellable_http_client(),
+    http_async_client=stream_cancel.cancellable_async_http_client(),
 )
 
 class ChatBot:
@@ -20,40 +31,64 @@ class ChatBot:
                  instructions:str,
                  examples: List[dict],
                  model:str="gpt-4o-mini", 
-                 temperature:float=0.0):
+                 temperature:float=0.0,
+                 max_prompt_tokens: Optional[int] = None,
+                 context_limit: int = 128_000,
+                 llm: Optional[ChatOpenAI] = None):
         
-        self.llm = ChatOpenAI(
+        # Un modello già configurato (es. dal SessionRuntime, con il pool HTTP condiviso) ha la precedenza
+        self.llm = llm or ChatOpenAI(
             model=model,
             temperature=temperature,
+            http_client=stream_cancel.cancellable_http_client(),
+            http_async_client=stream_cancel.cancellable_async_http_client(),
         )
         
-        system_prompt = SystemMessage(instructions)
+        self.system_prompt = SystemMessage(instructions)
         example_prompt = ChatPromptTemplate.from_messages(
             [
                 ("human", "{input}"),
                 ("ai", "{output}"),
             ]
         )
-        prompt_template = FewShotChatMessagePromptTemplate(
+        # Gli esempi entrano finché stanno nel budget di token: meno esempi man mano che la conversazione cresce
+        self.few_shot = FewShotChatMessagePromptTemplate(
             example_prompt=example_prompt,
-            examples=examples,
+            example_selector=TokenBudgetExampleSelector(
+                examples,
+                max_prompt_tokens=max_prompt_tokens,
+                context_limit=context_limit,
+            ),
+            input_variables=["input"],
         )
 
-        self.messages = prompt_template.invoke({}).to_messages()
-
-    async def invoke(self, user_message:str)->AIMessage:
+        # Memory: solo la conversazione, istruzioni ed esempi vengono aggiunti a ogni chiamata
+        self.messages = []
+        self._system_tokens = count_message_tokens(self.system_prompt)
+        self._history_tokens = MessageTokenCounter()
+
+    def prompt(self) -> List:
+        """Istruzioni + esempi che stanno nel budget + conversazione."""
+        prompt_tokens = self._system_tokens + self._history_tokens.total(self.messages)
+        few_shot = self.few_shot.invoke({
+            "input": self.messages[-1].content if self.messages else "",
+            "prompt_tokens": prompt_tokens,
+        }).to_messages()
+        return [self.system_prompt, *few_shot, *self.messages]
+
+    async def invoke(self, user_message:str, token: Optional[CancellationToken] = None)->AIMessage:
         self.messages.append(HumanMessage(user_message))
-        events = []
-        chunks = []
+        # Testo e metriche aggiornati chunk per chunk, senza trattenere eventi o chunk
+        accumulator = StreamAccumulator()
+        token = token or CancellationToken()
         
         # Replacing invoke()
-        async for event in llm.astream_events(self.messages, version="v2"):
-            events.append(event)
+        async for event in stream_cancel.astream_events(self.llm, self.prompt(), token):
             if event["event"] == "on_chat_model_start":
                 print("Streaming...")
             if event["event"] == "on_chat_model_stream":
                 chunk = event['data']['chunk']
-                chunks.append(chunk)
+                accumulator.feed(chunk)
                 print(chunk.content, end="", flush=True)
                 if chunk.content.strip() in string.punctuation:
                     print("\n")
@@ -62,31 +97,95 @@ class ChatBot:
                 ai_message =  AIMessage(event["data"]["output"].content)
                 self.messages.append(ai_message)
 
-def play(message: str, memory: List):
-    memory.append(HumanMessage(content=message))
-    chunks = []
+        if token.cancelled:
+            # Nessun on_chat_model_end: in memoria resta la risposta parziale
+            self.messages.append(accumulator.message())
+        self.last_stream_stats = accumulator.stats()
+        return self.messages[-1]
+
+    async def astream(self, user_message: str, token: Optional[CancellationToken] = None) -> AsyncIterator[str]:
+        """Come invoke, ma restituisce i pezzi di testo invece di stamparli (usato da stream_runtime.py)."""
+        self.messages.append(HumanMessage(user_message))
+        accumulator = StreamAccumulator()
+        try:
+            async for chunk in stream_cancel.astream(self.llm, self.prompt(), token or CancellationToken()):
+                delta = accumulator.feed(chunk)
+                if delta:
+                    yield delta
+        finally:
+            # Anche se lo stream si interrompe, la memoria resta una sequenza domanda/risposta
+            self.messages.append(accumulator.message())
+            self.last_stream_stats = accumulator.stats()
+
+def _stream_to_console(prompt, stitcher: Optional[OverlapStitcher] = None,
+                       token: Optional[CancellationToken] = None):
+    """
+    Stampa lo stream; restituisce l'accumulatore, il finish_reason (None se interrotto) e l'eventuale
+    errore di rete che ha interrotto lo stream, così il chiamante salva comunque il testo parziale.
+    """
+    accumulator = StreamAccumulator()
+    finish_reason = None
+    error = None
+    token = token or CancellationToken()
     try:
-        for chunk in llm.stream(message):
-            chunks.append(chunk)
-            print(chunk.content, end='|', flush=True)
+        for chunk in stream_cancel.stream(llm, prompt, token):
+            finish_reason = chunk.response_metadata.get("finish_reason") or finish_reason
+            # Durante una ripresa la parte che ripete il testo già salvato viene scartata
+            delta = accumulator.feed(stitcher.feed(chunk.content) if stitcher else chunk)
+            print(delta, end='|', flush=True)
             
-            if(len(chunks) % 12 == 0):
+            if delta and accumulator.token_count % 12 == 0:
                 print("\n")
     except KeyboardInterrupt:
+        # Chiude subito la connessione: il provider smette di generare
+        token.cancel("interrupted")
+    except (httpx.TransportError, openai.APIConnectionError) as e:
+        # Connessione caduta o timeout di lettura a metà stream: la risposta è incompleta
+        error, finish_reason = e, None
+        print(f"\n=== Stream interrotto: {type(e).__name__} ===")
+    if token.cancelled:
         print("\n=== Stream interrotto dall'utente ===")
-    result = "".join([chunk.content for chunk in chunks])
-    memory.append(AIMessage(content=result))
-
-def resume(memory: List):
+    if stitcher:
+        accumulator.feed(stitcher.flush())
+    return accumulator, finish_reason, error
+
+def play(message: str, memory: List, token: Optional[CancellationToken] = None) -> dict:
+    prompt = [HumanMessage(content=message)]
+    memory.extend(prompt)
+    accumulator, finish_reason, error = _stream_to_console(prompt, token=token)
+    # Checkpoint: testo parziale, offset in token e finish_reason restano nella memoria per resume()
+    memory.append(StreamCheckpoint.record(prompt, accumulator, finish_reason).to_message())
+    if error is not None:
+        # Il checkpoint è già in memoria: resume() riparte dal testo ricevuto prima dell'errore
+        raise error
+    # TTFT, latenza tra token (p50/p95/p99), token al secondo e conteggi
+    return accumulator.stats()
+
+def resume(memory: List, token: Optional[CancellationToken] = None) -> Optional[dict]:
+    """
+    Riprende l'ultima risposta dal suo checkpoint: stesso prompt di play + testo parziale come
+    prefisso dell'assistente, senza un nuovo turno né il resto della memoria. La continuazione viene
+    unita alla risposta in memoria togliendo la parte ripetuta. Se la risposta era completa il
+    modello non viene chiamato.
+    """
     print("\n=== Resuming from last interaction ===")
-    play(message="If your last message is not complete, continue after last word. If it is complete, just output __END__", memory=memory)
-
-async def stream_events_async():
-    """Funzione asincrona per gestire gli eventi di streaming"""
+    checkpoint = StreamCheckpoint.from_memory(memory)
+    if checkpoint is None or checkpoint.complete:
+        print("__END__")
+        return None
+    accumulator, finish_reason, error = _stream_to_console(checkpoint.continuation(), OverlapStitcher(checkpoint.text), token)
+    memory[-1] = checkpoint.resumed(accumulator, finish_reason).to_message()
+    if error is not None:
+        raise error
+    return accumulator.stats()
+
+async def stream_events_async(token: Optional[CancellationToken] = None):
+    """Funzione asincrona per gestire gli eventi di streaming (token.cancel() chiude lo stream)"""
     print("=== Streaming Events ===")
     
     events = []
-    async for event in llm.astream_events("hello", version="v1"):  # Cambiato v2 -> v1
+    async for event in stream_cancel.astream_events(llm, "hello", token or CancellationToken(),
+                                                    version="v1"):  # Cambiato v2 -> v1
         if event["event"] == "on_chat_model_start":
             print("Streaming...")
         if event["event"] == "on_chat_model_stream":
@@ -141,17 +240,15 @@ if __name__ == '__main__':
     print("=== Processing information ===")
 
     memory = []
-    chunks = []
-    wrd_count = 0
+    accumulator = StreamAccumulator()
 
     for chunk in llm.stream(message):
-        chunks.append(chunk)
-        words = "".join([chunk.content for chunk in chunks])
-        wrd_count = len(words.split())
+        delta = accumulator.feed(chunk)
         print(chunk.content, end='|', flush=True)
-        print(f" Cumulative word count: {wrd_count}", end="\n")
-        if len(chunks) % 12 == 0:
+        print(f" Cumulative word count: {accumulator.word_count}", end="\n")
+        if delta and accumulator.token_count % 12 == 0:
             print("\n")
+    print(accumulator.stats())
     
 
     print("=== Streaming Events ===")
@@ -1,6 +1,8 @@
 import os
 from langchain_openai import ChatOpenAI
 from langchain_core.output_parsers import StrOutputParser
+from langchain_core.exceptions import OutputParserException
+from langchain_classic.output_parsers import OutputFixingParser
 from pydantic import BaseModel, Field
 from langchain_community.output_parsers import PydanticOutputParser
 from langchain.chains.openai_functions import convert_to_openai_function
@@ -8,6 +10,8 @@ from typing_extensions import Annotated
 from dotenv import load_dotenv
 from typing_extensions import Annotated, TypedDict
 from pydantic import BaseModel, Field 
+from output_repair import LocalRepairOutputParser
+from stream_structured import stream_structured
 
 load_dotenv()
 
@@ -69,6 +73,10 @@ if __name__ == '__main__':
     response = llm_with_structure.invoke("Tell me about the actor Tom Hanks and list some of his movies.")
     print(response)
 
+    # In streaming: un Performer parziale (già validato) per ogni film appena la sua stringa è completa
+    for partial in stream_structured(llm, Performer, "Tell me about the actor Tom Hanks and list some of his movies."):
+        print(partial.name, partial.film_names[-1] if partial.film_names else None)
+
     # Restituisce il JSON grezzo
     print(response.json())
 
@@ -84,3 +92,9 @@ if __name__ == '__main__':
     new_parser = OutputFixingParser.from_llm(llm, parser)
     print(new_parser.parse(misformatted_json))
 
+    # Riparazione locale davanti a OutputFixingParser: gli errori di sintassi non costano una chiamata al modello
+    repairing_parser = LocalRepairOutputParser.from_llm(llm, parser)
+    print(repairing_parser.parse(misformatted_json))
+    print(repairing_parser.parse("```json\n{\"name\": \"Tom Hanks\", \"film_names\": [\"Big\",],}\n```"))
+    print(f"Chiamate LLM evitate: {repairing_parser.stats.avoided_llm_calls}")
+
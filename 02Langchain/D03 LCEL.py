@@ -4,6 +4,7 @@ from langchain_core.prompts import PromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.runnables import RunnableSequence, RunnableLambda, RunnableParallel
 from langchain_core.tracers.context import collect_runs
+from stream_cancel import CancellationToken, cancellable_http_client, stream
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -11,7 +12,9 @@ load_dotenv()
 llm = ChatOpenAI(
     model_name="gpt-3.5-turbo",
     temperature=0.0,
-    openai_api_key=os.getenv("OPENAI_API_KEY")
+    openai_api_key=os.getenv("OPENAI_API_KEY"),
+    # Con stream(..., token) la cancellazione chiude subito la connessione
+    http_client=cancellable_http_client(),
 )
 
 def double(x: int) -> int:
@@ -72,8 +75,13 @@ if __name__ == '__main__':
 
     print(chain.invoke({"topic": "dogs"}))
 
-    for chunk in chain.stream({"topic": "birds"}):
-        print(chunk, end="", flush=True)
+    token = CancellationToken()
+    try:
+        for chunk in stream(chain, {"topic": "birds"}, token):
+            print(chunk, end="", flush=True)
+    except KeyboardInterrupt:
+        token.cancel("interrupted")
+        print(f"\n=== Stream interrotto, parziale: {token.partial!r} ===")
     
     print(chain.batch(
         [
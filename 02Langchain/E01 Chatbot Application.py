@@ -31,11 +31,17 @@ Your chatbot must:
 """
 
 import os
-from typing import List
+import time
+from typing import List, Optional
 from langchain_openai import ChatOpenAI
 from langchain_core.messages import HumanMessage, SystemMessage, AIMessage
 from langchain_core.prompts import PromptTemplate, FewShotPromptTemplate, ChatPromptTemplate, FewShotChatMessagePromptTemplate
+from langchain_core.example_selectors import BaseExampleSelector
 from dotenv import load_dotenv
+from session_manager import SessionManager
+from prompt_prefix import get_prefix
+from example_selector import VectorExampleSelector
+from few_shot_budget import MessageTokenCounter, TokenBudgetExampleSelector, count_message_tokens
 
 load_dotenv()
 
@@ -51,7 +57,10 @@ class ChatBot:
                  instructions: str,
                  examples: List[dict],
                  model:str="gpt-4o-mini",
-                 temperature:float=0.0):
+                 temperature:float=0.0,
+                 example_selector: Optional[BaseExampleSelector] = None,
+                 max_prompt_tokens: Optional[int] = None,
+                 context_limit: int = 128_000):
         self.name = name
         self.llm = ChatOpenAI(
             model_name=model,
@@ -59,25 +68,44 @@ class ChatBot:
             openai_api_key=os.getenv("OPENAI_API_KEY"),
         )
 
-        example_prompt = ChatPromptTemplate.from_messages(
-            [
-                ("system",instructions),
-                ("human","{input}"),
-                ("ai","{output}"),
-            ]
-        )
-
-        prompt_template = FewShotChatMessagePromptTemplate(
-            example_prompt=example_prompt,
-            examples=examples,
-        )
-
-        #Memory
-        self.messages = prompt_template.invoke({}).to_messages()
+        # Prefisso statico (istruzioni + esempi few-shot) condiviso da tutte le sessioni dello stesso bot:
+        # ogni richiesta inizia con gli stessi byte e il provider può riusare la sua cache del prompt.
+        # Con un example_selector gli esempi cambiano a ogni chiamata: nel prefisso restano le sole istruzioni
+        if example_selector is not None or max_prompt_tokens is not None:
+            # Esempi scelti per rilevanza finché stanno nel budget: meno esempi man mano che la conversazione cresce
+            example_selector = TokenBudgetExampleSelector(
+                examples,
+                ranker=example_selector,
+                max_prompt_tokens=max_prompt_tokens,
+                context_limit=context_limit,
+            )
+        self.example_selector = example_selector
+        self.prefix = get_prefix(instructions, examples if example_selector is None else [])
+        self.few_shot = None
+        if example_selector is not None:
+            self.few_shot = FewShotChatMessagePromptTemplate(
+                example_prompt=ChatPromptTemplate.from_messages([("human", "{input}"), ("ai", "{output}")]),
+                example_selector=example_selector,
+                input_variables=["input"],
+            )
+        self._prefix_tokens = sum(count_message_tokens(m) for m in self.prefix.messages)
+        self._history_tokens = MessageTokenCounter()
+
+        #Memory: solo la conversazione, il prefisso viene aggiunto a ogni chiamata
+        self.messages = []
 
     def invoke(self, user_user_message: str) -> AIMessage:
         self.messages.append(HumanMessage(user_user_message))
-        ai_message = self.llm.invoke(self.messages)
+        tail = self.messages
+        if self.few_shot is not None:
+            # Solo gli esempi più simili alla domanda, tra le istruzioni e la conversazione
+            prompt_tokens = self._prefix_tokens + self._history_tokens.total(self.messages)
+            tail = self.few_shot.invoke({"input": user_user_message, "prompt_tokens": prompt_tokens}).to_messages()
+            tail += self.messages
+        start = time.perf_counter()
+        ai_message = self.llm.invoke(self.prefix.render(tail),
+                                     prompt_cache_key=self.prefix.fingerprint)
+        self.prefix.usage.record(ai_message, time.perf_counter() - start)
         self.messages.append(ai_message)
         return ai_message
 
@@ -126,4 +154,30 @@ if __name__ == '__main__':
     print(chatbot.invoke("Hi there! Can you tell me a fun fact about programming?").content)
     print("\n" + "="*50 + "\n")
     print(chatbot.messages)
+    # Token di prompt letti dalla cache del provider (usage.prompt_tokens_details.cached_tokens)
+    print(chatbot.prefix.usage.stats())
+
+    # Con molti esempi: indice vettoriale salvato su disco, a ogni chiamata i 2 esempi più simili
+    selective_bot = ChatBot(
+        name="TechHelper",
+        instructions=instructions,
+        examples=examples,
+        example_selector=VectorExampleSelector(examples, k=2, path="examples_index.npz"),
+    )
+    print(selective_bot.few_shot.invoke({"input": "What is JavaScript used for?", "prompt_tokens": 0}).to_messages())
+    print(selective_bot.invoke("What is JavaScript used for?").content)
+
+    # Budget di token: al massimo 600 token di prompt, gli esempi riempiono lo spazio lasciato dalla conversazione
+    budget_bot = ChatBot(name="TechHelper", instructions=instructions, examples=examples, max_prompt_tokens=600)
+    print(budget_bot.invoke("What is Python?").content)
+
+    # Molte conversazioni in parallelo: il SessionManager sposta su disco le sessioni inattive
+    manager = SessionManager(
+        factory=lambda: ChatBot(name="TechHelper", instructions=instructions, examples=examples),
+        directory="sessions",
+        max_resident_bytes=64 * 1024 * 1024,
+    )
+    print(manager.invoke("user-1", "What is Python?").content)
+    print(manager.invoke("user-2", "Can you help me with JavaScript?").content)
+    print(manager.stats())
 
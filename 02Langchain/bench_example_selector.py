@@ -0,0 +1,92 @@
+"""
+Benchmark di VectorExampleSelector (example_selector.py) con molti esempi few-shot:
+costruzione dell'indice, salvataggio/caricamento da disco e latenza di selezione (ricerca vettoriale
+NumPy contro un ciclo Python sugli stessi vettori), più la dimensione del prompt risultante.
+
+Non servono chiavi né rete (HashingEmbedder):
+
+    python bench_example_selector.py --examples 10000 --k 4
+"""
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from example_selector import VectorExampleSelector
+
+TOPICS = ("python", "javascript", "html", "css", "sql", "docker", "git", "linux", "rust", "java",
+          "kubernetes", "react", "pandas", "numpy", "http", "json", "regex", "testing", "async", "cloud")
+VERBS = ("explain", "debug", "install", "optimize", "compare", "learn", "deploy", "configure", "test", "document")
+
+
+def make_examples(count: int, rng: random.Random):
+    examples = []
+    for i in range(count):
+        topic, other, verb = rng.choice(TOPICS), rng.choice(TOPICS), rng.choice(VERBS)
+        examples.append({
+            "input": f"How do I {verb} {topic} together with {other}? (case {i})",
+            "output": f"To {verb} {topic} with {other}, start from the official documentation and build a small example.",
+        })
+    return examples
+
+
+def percentile(values, q):
+    return statistics.quantiles(values, n=100)[q - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--examples", type=int, default=10_000)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--queries", type=int, default=500)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    examples = make_examples(args.examples, rng)
+    queries = [f"Can you help me {rng.choice(VERBS)} {rng.choice(TOPICS)}?" for _ in range(args.queries)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "examples_index.npz")
+        start = time.perf_counter()
+        selector = VectorExampleSelector(examples, k=args.k, path=path)
+        build = time.perf_counter() - start
+
+        start = time.perf_counter()
+        selector = VectorExampleSelector(examples, k=args.k, path=path)
+        load = time.perf_counter() - start
+        index_bytes = os.path.getsize(path)
+
+    vectorised = []
+    for query in queries:
+        start = time.perf_counter()
+        selector.select_examples({"input": query})
+        vectorised.append(time.perf_counter() - start)
+
+    # Stessa ricerca con un ciclo Python riga per riga, su un sottoinsieme delle query
+    rows = selector._matrix[:len(examples)].tolist()
+    looped = []
+    for query in queries[:20]:
+        start = time.perf_counter()
+        vector = selector.embedder([query])[0].tolist()
+        scores = [sum(a * b for a, b in zip(row, vector)) for row in rows]
+        sorted(range(len(scores)), key=scores.__getitem__, reverse=True)[:args.k]
+        looped.append(time.perf_counter() - start)
+
+    all_chars = sum(len(e["input"]) + len(e["output"]) for e in examples)
+    top_chars = statistics.mean(sum(len(e["input"]) + len(e["output"]) for e in selector.select_examples({"input": q}))
+                                for q in queries[:50])
+
+    print(f"{args.examples} esempi, k={args.k}, {selector.embedder.name}")
+    print(f"  costruzione indice       {build * 1000:9.1f} ms")
+    print(f"  caricamento da disco     {load * 1000:9.1f} ms  ({index_bytes / 1024 / 1024:.1f} MB)")
+    print(f"  selezione NumPy          p50 {percentile(vectorised, 50) * 1000:7.3f} ms   "
+          f"p95 {percentile(vectorised, 95) * 1000:7.3f} ms")
+    print(f"  selezione ciclo Python   p50 {statistics.median(looped) * 1000:7.1f} ms")
+    print(f"  esempi nel prompt        ~{all_chars // 4} token con tutti, ~{top_chars / 4:.0f} token con top-{args.k}")
+
+
+if __name__ == '__main__':
+    main()
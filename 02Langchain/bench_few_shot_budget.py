@@ -0,0 +1,90 @@
+"""
+Benchmark: dimensione del prompt e latenza per turno del ChatBot di "E01 Chatbot Application.py"
+con tutti gli esempi few-shot in ogni chiamata, oppure con gli esempi entro un budget di token
+(TokenBudgetExampleSelector in few_shot_budget.py, ordinati per rilevanza da VectorExampleSelector).
+
+Il modello è il server locale di 01Project/openai_stub.py senza prompt caching: ogni token di
+prompt costa `--prefill-us` microsecondi, come il prefill di un modello reale:
+
+    python bench_few_shot_budget.py --examples 300 --turns 15 --max-prompt-tokens 3000
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import few_shot_budget
+from bench_prompt_prefix import OpenAIStub, load_e01
+from example_selector import VectorExampleSelector
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "01Project"))
+import memory_window  # noqa: E402
+
+TOPICS = ("python", "javascript", "sql", "docker", "git", "linux", "rust", "react", "testing", "cloud")
+
+
+def make_examples(count: int):
+    return [{
+        "input": f"How do I get started with {TOPICS[i % len(TOPICS)]}? (variant {i})",
+        "output": f"Start with the basics of {TOPICS[i % len(TOPICS)]}: " + "read the docs, build a project. " * 8,
+    } for i in range(count)]
+
+
+def run(bot, turns: int, answer_words: int, stub: OpenAIStub):
+    rows = []
+    for turn in range(turns):
+        start = time.perf_counter()
+        bot.invoke(f"Turn {turn}: how do I get started with {TOPICS[turn % len(TOPICS)]}? " + "details " * answer_words)
+        rows.append({"latency": time.perf_counter() - start, "prompt_tokens": stub.last_prompt_tokens})
+    return rows
+
+
+def check_token_counting():
+    """few_shot_budget replica il conteggio di 01Project/memory_window.py: i due devono coincidere."""
+    assert few_shot_budget.MESSAGE_OVERHEAD == memory_window.MESSAGE_OVERHEAD
+    for example in make_examples(20):
+        for text in ("", example["input"], example["output"]):
+            assert few_shot_budget.count_text_tokens(text) == memory_window.count_text_tokens(text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--examples", type=int, default=300)
+    parser.add_argument("--turns", type=int, default=15)
+    parser.add_argument("--max-prompt-tokens", type=int, default=3000)
+    parser.add_argument("--message-words", type=int, default=60, help="parole aggiunte a ogni messaggio utente")
+    parser.add_argument("--prefill-us", type=float, default=20.0, help="costo di un token di prompt (µs)")
+    args = parser.parse_args()
+    check_token_counting()
+    examples = make_examples(args.examples)
+    instructions = "You are a friendly and helpful virtual assistant for programming questions."
+
+    def responder(body):
+        stub.last_prompt_tokens = sum(len(str(m.get("content") or "")) // 4 for m in body["messages"])
+        return "Here is a detailed answer. " * 20
+
+    os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+    with OpenAIStub(responder=responder, prefill_delay=args.prefill_us / 1e6) as stub:
+        os.environ["OPENAI_BASE_URL"] = stub.base_url
+        lesson = load_e01()
+        full = run(lesson.ChatBot("TechHelper", instructions, examples), args.turns, args.message_words, stub)
+        budget_bot = lesson.ChatBot("TechHelper", instructions, examples,
+                                    example_selector=VectorExampleSelector(examples, k=len(examples)),
+                                    max_prompt_tokens=args.max_prompt_tokens)
+        budgeted = run(budget_bot, args.turns, args.message_words, stub)
+
+    print(f"{args.examples} esempi, budget {args.max_prompt_tokens} token, {args.prefill_us:.0f} µs per token")
+    print(f"{'turno':>6}{'token (tutti)':>15}{'token (budget)':>16}")
+    for turn, (a, b) in enumerate(zip(full, budgeted), start=1):
+        print(f"{turn:>6}{a['prompt_tokens']:>15}{b['prompt_tokens']:>16}")
+    for label, rows in (("tutti gli esempi", full), ("budget", budgeted)):
+        latencies = sorted(r["latency"] for r in rows)
+        print(f"  {label:18} latenza p50 {statistics.median(latencies) * 1000:7.1f} ms   "
+              f"max {latencies[-1] * 1000:7.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
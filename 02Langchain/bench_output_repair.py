@@ -0,0 +1,105 @@
+"""
+Benchmark: chiamate LLM e latenza per correggere output JSON malformati con OutputFixingParser da
+solo oppure con LocalRepairOutputParser (output_repair.py) davanti.
+
+Le risposte sono generate localmente a partire da oggetti validi, con gli errori tipici dei modelli
+(apici singoli, virgole finali, blocchi ```json, letterali Python, risposte troncate, testo intorno)
+e una parte non riparabile (chiavi senza apici). Il modello che corregge è il server locale di
+01Project/openai_stub.py, con `--llm-latency` secondi per chiamata:
+
+    python bench_output_repair.py --samples 200 --llm-latency 0.4
+"""
+
+import argparse
+import json
+import random
+import statistics
+import time
+from typing import Annotated, Optional
+
+from langchain_classic.output_parsers import OutputFixingParser
+from langchain_core.output_parsers import PydanticOutputParser
+from langchain_openai import ChatOpenAI
+from pydantic import BaseModel, Field
+
+from bench_prompt_prefix import OpenAIStub
+from output_repair import LocalRepairOutputParser
+
+
+class Performer(BaseModel):
+    # Come Performer in "D02 Schemas and output parsers.py", con un booleano per i letterali Python
+    name: Annotated[str, Field(description="Name of the performer")]
+    film_names: Annotated[list[str], Field(description="List of film names the performer has acted in")]
+    oscar_winner: Annotated[Optional[bool], Field(default=None, description="Has won an Oscar")]
+
+
+FILMS = ["Forrest Gump", "Cast Away", "Big", "Philadelphia", "Apollo 13", "Toy Story", "The Terminal"]
+
+
+def make_sample(rng: random.Random, kind: str) -> str:
+    value = {"name": rng.choice(["Tom Hanks", "Meryl Streep", "Denzel Washington"]),
+             "film_names": rng.sample(FILMS, 3),
+             "oscar_winner": rng.choice([True, False, None])}
+    text = json.dumps(value)
+    if kind == "valido":
+        return text
+    if kind == "apici singoli":
+        return repr(value)  # dict Python: apici singoli e True/False/None
+    if kind == "virgole finali":
+        return text.replace("]", ",]").replace("}", ",}")
+    if kind == "blocco ```json":
+        return f"```json\n{json.dumps(value, indent=2)}\n```"
+    if kind == "letterali Python":
+        return text.replace("true", "True").replace("false", "False").replace("null", "None")
+    if kind == "troncato":
+        return text[:text.index("oscar_winner") - 3]
+    if kind == "testo intorno":
+        return f"Sure! Here is the JSON you asked for:\n{text}\nLet me know if you need anything else."
+    # non riparabile localmente: chiavi senza apici
+    return text.replace('"name"', "name").replace('"film_names"', "film_names")
+
+
+KINDS = ["valido", "apici singoli", "virgole finali", "blocco ```json", "letterali Python", "troncato",
+         "testo intorno", "chiavi senza apici"]
+
+
+def run(parser, samples):
+    latencies = []
+    for text in samples:
+        start = time.perf_counter()
+        parser.parse(text)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", type=int, default=200)
+    parser.add_argument("--llm-latency", type=float, default=0.4, help="durata di una chiamata di correzione (s)")
+    args = parser.parse_args()
+    rng = random.Random(0)
+    samples = [make_sample(rng, KINDS[i % len(KINDS)]) for i in range(args.samples)]
+    fixed = json.dumps({"name": "Tom Hanks", "film_names": FILMS[:3], "oscar_winner": True})
+
+    with OpenAIStub(latency=args.llm_latency, responder=lambda body: fixed) as stub:
+        llm = ChatOpenAI(model="gpt-4o-mini", base_url=stub.base_url, api_key="sk-bench")
+        pydantic_parser = PydanticOutputParser(pydantic_object=Performer)
+
+        rows = []
+        for label, output_parser in (("OutputFixingParser", OutputFixingParser.from_llm(llm, pydantic_parser)),
+                                     ("riparazione locale", LocalRepairOutputParser.from_llm(llm, pydantic_parser))):
+            before = stub.requests
+            latencies = sorted(run(output_parser, samples))
+            rows.append((label, stub.requests - before, latencies, getattr(output_parser, "stats", None)))
+
+    print(f"{args.samples} risposte ({len(KINDS)} tipi, 1 su {len(KINDS)} non riparabile localmente), "
+          f"correzione LLM {args.llm_latency * 1000:.0f} ms")
+    print(f"{'':20}{'chiamate LLM':>14}{'totale s':>10}{'p50 ms':>9}{'p95 ms':>9}")
+    for label, calls, latencies, _ in rows:
+        print(f"{label:20}{calls:>14}{sum(latencies):>10.2f}{statistics.median(latencies) * 1000:>9.2f}"
+              f"{statistics.quantiles(latencies, n=20)[-1] * 1000:>9.1f}")
+    print(f"statistiche: {rows[-1][3].as_dict()}")
+
+
+if __name__ == '__main__':
+    main()
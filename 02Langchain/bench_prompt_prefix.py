@@ -0,0 +1,114 @@
+"""
+Benchmark: token di prompt, token letti dalla cache del provider e latenza del ChatBot di
+"E01 Chatbot Application.py", con il vecchio layout (istruzioni ripetute dentro ogni esempio
+few-shot, messaggi ricreati per sessione) e con il prefisso stabile condiviso (prompt_prefix.py).
+
+Il modello è il server locale di 01Project/openai_stub.py con il prompt caching simulato: i token
+non in cache costano `--prefill-us` microsecondi ciascuno:
+
+    python bench_prompt_prefix.py --sessions 20 --turns 4 --policy-words 1500
+"""
+
+import argparse
+import importlib.util
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+from langchain_core.messages import HumanMessage
+from langchain_core.prompts import ChatPromptTemplate, FewShotChatMessagePromptTemplate
+from langchain_openai import ChatOpenAI
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "01Project"))
+from openai_stub import OpenAIStub  # noqa: E402
+
+from prompt_prefix import CacheUsage  # noqa: E402
+
+EXAMPLES = [
+    {"input": "Hello! How are you today?", "output": "Hello there! I'm here and ready to help you with any technology question."},
+    {"input": "What is Python?", "output": "Python is a high-level, interpreted programming language known for its readability."},
+    {"input": "Can you help me with JavaScript?", "output": "Absolutely! JavaScript is the language of the web, tell me what you need."},
+    {"input": "What's the difference between HTML and CSS?", "output": "HTML defines the structure of a page, CSS defines how it looks."},
+    {"input": "Thank you for your help!", "output": "You're welcome! Come back anytime you have questions. Happy coding!"},
+]
+
+
+def load_e01():
+    path = Path(__file__).parent / "E01 Chatbot Application.py"
+    spec = importlib.util.spec_from_file_location("E01_Chatbot_Application", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class LegacyChatBot:
+    """Il layout precedente: ("system", instructions) dentro example_prompt, ripetuto per ogni esempio."""
+
+    def __init__(self, instructions: str, examples, usage: CacheUsage):
+        self.llm = ChatOpenAI(model_name="gpt-4o-mini", temperature=0.0)
+        example_prompt = ChatPromptTemplate.from_messages(
+            [("system", instructions), ("human", "{input}"), ("ai", "{output}")]
+        )
+        prompt_template = FewShotChatMessagePromptTemplate(example_prompt=example_prompt, examples=examples)
+        self.messages = prompt_template.invoke({}).to_messages()
+        self.usage = usage
+
+    def invoke(self, user_message: str):
+        self.messages.append(HumanMessage(user_message))
+        start = time.perf_counter()
+        ai_message = self.llm.invoke(self.messages)
+        self.usage.record(ai_message, time.perf_counter() - start)
+        self.messages.append(ai_message)
+        return ai_message
+
+
+def run(factory, sessions: int, turns: int) -> list:
+    bots = [factory() for _ in range(sessions)]
+    latencies = []
+    # Turni intercalati tra le sessioni, come in un server con molti utenti
+    for turn in range(turns):
+        for i, bot in enumerate(bots):
+            start = time.perf_counter()
+            bot.invoke(f"Session {i}, question {turn}: what should I learn next?")
+            latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=4)
+    parser.add_argument("--policy-words", type=int, default=1500, help="lunghezza delle istruzioni del bot")
+    parser.add_argument("--prefill-us", type=float, default=20.0, help="costo di un token di prompt non in cache (µs)")
+    args = parser.parse_args()
+    instructions = ("You are a friendly and helpful virtual assistant. Company policy: "
+                    + " ".join(f"rule-{i % 97}" for i in range(args.policy_words)))
+
+    os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+    results = {}
+    for label in ("layout precedente", "prefisso stabile"):
+        # Un server nuovo per ogni layout, così la cache simulata parte vuota
+        with OpenAIStub(prefix_cache=True, prefill_delay=args.prefill_us / 1e6) as stub:
+            os.environ["OPENAI_BASE_URL"] = stub.base_url
+            if label == "layout precedente":
+                usage = CacheUsage()
+                latencies = run(lambda: LegacyChatBot(instructions, EXAMPLES, usage), args.sessions, args.turns)
+            else:
+                lesson = load_e01()
+                latencies = run(lambda: lesson.ChatBot("TechHelper", instructions, EXAMPLES),
+                                args.sessions, args.turns)
+                usage = lesson.get_prefix(instructions, EXAMPLES).usage
+        results[label] = {**usage.stats(), "latency_ms": statistics.mean(latencies) * 1000}
+
+    print(f"{args.sessions} sessioni x {args.turns} turni, istruzioni di {args.policy_words} parole, "
+          f"{args.prefill_us:.0f} µs per token non in cache")
+    print(f"{'':22}{'prompt/chiamata':>16}{'in cache':>10}{'latenza ms':>12}{'hit ms':>9}{'miss ms':>9}")
+    for label, r in results.items():
+        print(f"{label:22}{r['prompt_tokens'] / r['calls']:>16.0f}{r['cached_ratio']:>10.0%}"
+              f"{r['latency_ms']:>12.1f}{r['hit_latency_ms']:>9.1f}{r['miss_latency_ms']:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
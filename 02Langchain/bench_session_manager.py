@@ -0,0 +1,64 @@
+"""
+Benchmark del SessionManager: molte sessioni ChatBot servite da un pool di thread con un tetto di
+memoria, per stimare RSS, frequenza degli sfratti e latenza dei fault-in su un host.
+
+Il modello è un FakeListChatModel di LangChain, quindi non servono chiavi né rete:
+
+    python bench_session_manager.py --sessions 20000 --turns 5 --ceiling-mb 64
+"""
+
+import argparse
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.language_models import FakeListChatModel
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from session_manager import SessionManager
+
+ANSWER = "Sure! Here is a friendly and informative answer about programming. " * 4
+
+
+class FakeChatBot:
+    """Stessa interfaccia del ChatBot di E01 (messages + invoke), ma con un modello finto."""
+
+    def __init__(self):
+        self.llm = FakeListChatModel(responses=[ANSWER])
+        self.messages = [SystemMessage("You are a friendly and helpful virtual assistant.")]
+
+    def invoke(self, user_message: str):
+        self.messages.append(HumanMessage(user_message))
+        ai_message = self.llm.invoke(self.messages)
+        self.messages.append(ai_message)
+        return ai_message
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=20_000)
+    parser.add_argument("--turns", type=int, default=5, help="messaggi per sessione")
+    parser.add_argument("--ceiling-mb", type=int, default=64)
+    parser.add_argument("--threads", type=int, default=32)
+    args = parser.parse_args()
+
+    requests = [f"session-{i}" for i in range(args.sessions)] * args.turns
+    random.Random(42).shuffle(requests)
+
+    with tempfile.TemporaryDirectory() as directory:
+        manager = SessionManager(FakeChatBot, directory, max_resident_bytes=args.ceiling_mb * 1024 * 1024)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.threads) as pool:
+            list(pool.map(lambda session_id: manager.invoke(session_id, "Tell me a fun fact"), requests))
+        elapsed = time.perf_counter() - start
+        stats = manager.stats()
+
+    print(f"{len(requests)} messaggi su {args.sessions} sessioni in {elapsed:.1f} s "
+          f"({len(requests) / elapsed:.0f} msg/s)")
+    for key, value in stats.items():
+        print(f"  {key}: {value:.3f}" if isinstance(value, float) else f"  {key}: {value}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Benchmark: costo per chunk e memoria trattenuta durante lo streaming, tenendo la lista dei chunk e
+ricalcolando testo e parole a ogni chunk (come in "D01 Streaming.py" prima) oppure con
+StreamAccumulator (stream_accumulator.py).
+
+I chunk sono AIMessageChunk generati localmente, quindi non servono chiavi né rete:
+
+    python bench_stream_accumulator.py --chunks 4000
+"""
+
+import argparse
+import random
+import time
+import tracemalloc
+
+from langchain_core.messages import AIMessageChunk
+
+from stream_accumulator import StreamAccumulator
+
+WORDS = ("the", "quick", "brown", "fox", "jumps", "over", "lazy", "dog", "Fédération", "Internationale")
+
+
+def make_chunks(count: int):
+    rng = random.Random(0)
+    chunks = []
+    for _ in range(count):
+        word = rng.choice(WORDS)
+        # Come i token reali: a volte una parola intera con lo spazio, a volte un pezzo di parola
+        if len(word) > 5 and rng.random() < 0.5:
+            chunks.extend([AIMessageChunk(content=" " + word[:4]), AIMessageChunk(content=word[4:])])
+        else:
+            chunks.append(AIMessageChunk(content=" " + word))
+    return chunks[:count]
+
+
+def chunk_list(chunks):
+    kept = []
+    words = 0
+    for chunk in chunks:
+        kept.append(chunk)
+        words = len("".join(c.content for c in kept).split())
+    return "".join(c.content for c in kept), words, kept
+
+
+def accumulator(chunks):
+    acc = StreamAccumulator()
+    for chunk in chunks:
+        acc.feed(chunk)
+    return acc.text, acc.word_count, acc
+
+
+def measure(fn, chunks):
+    # I chunk vengono creati dentro la misura e liberati se non trattenuti, come in uno stream reale
+    tracemalloc.start()
+    start = time.perf_counter()
+    text, words, kept = fn(iter(make_chunks(len(chunks))))
+    elapsed = time.perf_counter() - start
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return {"us_per_chunk": elapsed / len(chunks) * 1e6, "retained_kb": retained / 1024, "text": text, "words": words}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=4000)
+    args = parser.parse_args()
+    chunks = make_chunks(args.chunks)
+
+    before = measure(chunk_list, chunks)
+    after = measure(accumulator, chunks)
+    assert before["text"] == after["text"] and before["words"] == after["words"]
+
+    print(f"{args.chunks} chunk, {after['words']} parole")
+    for label, r in (("lista di chunk", before), ("StreamAccumulator", after)):
+        print(f"  {label:18} {r['us_per_chunk']:9.1f} µs/chunk   memoria trattenuta {r['retained_kb']:8.1f} KB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""
+Benchmark: quanto tempo passa tra la richiesta di cancellazione di uno stream e la chiusura della
+connessione vista dal server (01Project/openai_stub.py, che smette di generare appena il client
+chiude).
+
+Il modello manda un token ogni `--token-delay` secondi; la cancellazione arriva da un altro thread
+(o da un altro task) a metà attesa tra due token, per ogni percorso di streaming:
+- llm.stream con un flag controllato tra i chunk (come il ciclo di `play` prima)
+- stream / astream / astream_events di stream_cancel.py con un CancellationToken, su ChatOpenAI
+  e su una catena LCEL (prompt | llm | StrOutputParser)
+
+    python bench_stream_cancel.py --token-delay 0.5 --cancel-after 1.25
+"""
+
+import argparse
+import asyncio
+import threading
+import time
+
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_openai import ChatOpenAI
+
+from bench_prompt_prefix import OpenAIStub
+from stream_cancel import (CancellationToken, astream, astream_events, cancellable_async_http_client,
+                           cancellable_http_client, stream)
+
+
+def pooled_connections(client) -> int:
+    return len(client._transport._pool.connections)
+
+
+def timed(cancel, fired: list):
+    """La cancellazione, con l'istante in cui avviene davvero."""
+    def fire():
+        fired.append(time.perf_counter())
+        cancel()
+    return fire
+
+
+def flag_loop(llm, prompt, cancel_after, fired):
+    # Prima: il consumatore può solo smettere di leggere quando arriva il prossimo chunk
+    requested = threading.Event()
+    threading.Timer(cancel_after, timed(requested.set, fired)).start()
+    text = ""
+    for chunk in llm.stream(prompt):
+        text += chunk.content
+        if requested.is_set():
+            break
+    return text
+
+
+def sync_token(runnable, input, cancel_after, fired):
+    token = CancellationToken()
+    threading.Timer(cancel_after, timed(token.cancel, fired)).start()
+    for _ in stream(runnable, input, token):
+        pass
+    return token.partial.content if hasattr(token.partial, "content") else token.partial
+
+
+def async_token(wrapper, runnable, input, cancel_after, fired):
+    async def run():
+        token = CancellationToken()
+        asyncio.get_running_loop().call_later(cancel_after, timed(token.cancel, fired))
+        async for _ in wrapper(runnable, input, token):
+            pass
+        return token.partial.content
+
+    return asyncio.run(run())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--token-delay", type=float, default=0.5)
+    parser.add_argument("--cancel-after", type=float, default=1.25, help="secondi prima della cancellazione")
+    parser.add_argument("--tokens", type=int, default=200)
+    args = parser.parse_args()
+    answer = " ".join(f"tok{i}" for i in range(args.tokens))
+
+    with OpenAIStub(token_delay=args.token_delay, responder=lambda body: answer) as stub:
+        http_client = cancellable_http_client()
+        http_async_client = cancellable_async_http_client()
+        llm = ChatOpenAI(model="gpt-4o-mini", base_url=stub.base_url, api_key="sk-bench",
+                         http_client=http_client, http_async_client=http_async_client)
+        chain = ChatPromptTemplate.from_template("Tell me a joke about {topic}.") | llm | StrOutputParser()
+        prompt = "What does FIFA stand for?"
+
+        cases = [
+            ("llm.stream + flag", lambda fired: flag_loop(llm, prompt, args.cancel_after, fired)),
+            ("stream(llm)", lambda fired: sync_token(llm, prompt, args.cancel_after, fired)),
+            ("stream(catena LCEL)", lambda fired: sync_token(chain, {"topic": "birds"}, args.cancel_after, fired)),
+            ("astream(llm)", lambda fired: async_token(astream, llm, prompt, args.cancel_after, fired)),
+            ("astream_events(llm)",
+             lambda fired: async_token(astream_events, llm, prompt, args.cancel_after, fired)),
+        ]
+        print(f"un token ogni {args.token_delay * 1000:.0f} ms, cancellazione dopo {args.cancel_after * 1000:.0f} ms")
+        print(f"{'':22}{'chiusura vista dal server':>27}{'parziale (caratteri)':>22}{'connessioni nel pool':>22}")
+        for label, run in cases:
+            before = len(stub.disconnects)
+            fired = []
+            partial = run(fired)
+            # Il server se ne accorge in un altro thread: un attimo di margine per la registrazione
+            deadline = time.perf_counter() + 2 * args.token_delay + 1
+            while len(stub.disconnects) == before and time.perf_counter() < deadline:
+                time.sleep(0.001)
+            closed = stub.disconnects[-1] - fired[0] if len(stub.disconnects) > before else None
+            pool = pooled_connections(http_client) + pooled_connections(http_async_client)
+            latency = f"{closed * 1000:.1f} ms" if closed is not None else "mai"
+            print(f"{label:22}{latency:>27}{len(partial):>22}{pool:>22}")
+
+
+if __name__ == '__main__':
+    main()
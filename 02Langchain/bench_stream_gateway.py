@@ -0,0 +1,162 @@
+"""
+Benchmark del gateway SSE/WebSocket (stream_gateway.py) con un modello finto in streaming:
+`--streams` conversazioni contemporanee (metà SSE, metà WebSocket) per ogni cadenza di
+aggregazione dei chunk in frame. Per ogni cadenza riporta chunk e frame inviati, chunk per frame,
+chunk/s totali, CPU per chunk (gateway e client nello stesso processo) e TTFT p50 visto dal client.
+
+Alla fine verifica lo spegnimento ordinato: con stream lunghi in corso, runner.cleanup() chiama
+drain(), che aspetta `--drain-timeout` secondi e poi cancella gli stream rimasti.
+
+    python bench_stream_gateway.py --streams 200 --tokens 200 --token-delay 0.005 --cadences 0 0.02 0.05
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+from typing import Any, AsyncIterator, List, Optional
+
+import aiohttp
+from aiohttp import web
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from bench_stream_runtime import EXAMPLES, load_d01
+from stream_gateway import StreamGateway
+from stream_runtime import SessionRuntime
+
+
+class FakeStreamingChatModel(BaseChatModel):
+    """Risponde sempre `answer`, una parola ogni `token_delay` secondi."""
+
+    answer: str
+    token_delay: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-streaming"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(self.answer))])
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        for i, word in enumerate(self.answer.split(" ")):
+            if self.token_delay:
+                await asyncio.sleep(self.token_delay)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word if i == 0 else " " + word))
+
+
+async def sse_client(http: aiohttp.ClientSession, url: str, session_id: str, results: list):
+    start = time.perf_counter()
+    ttft: Optional[float] = None
+    frames = 0
+    async with http.post(f"{url}/sessions/{session_id}/sse", json={"message": "Hello robot!"}) as response:
+        async for line in response.content:
+            if line.startswith(b"event: delta"):
+                frames += 1
+                ttft = ttft or time.perf_counter() - start
+            elif line.startswith(b"event: end"):
+                break
+    results.append((ttft, frames))
+
+
+async def ws_client(http: aiohttp.ClientSession, url: str, session_id: str, results: list):
+    start = time.perf_counter()
+    ttft: Optional[float] = None
+    frames = 0
+    async with http.ws_connect(f"{url}/sessions/{session_id}/ws") as ws:
+        await ws.send_str("Hello robot!")
+        async for msg in ws:
+            data = json.loads(msg.data)
+            if data["type"] == "delta":
+                frames += 1
+                ttft = ttft or time.perf_counter() - start
+            else:
+                break
+    results.append((ttft, frames))
+
+
+async def start_gateway(lesson, args, cadence: float, token_delay: float, drain_timeout: float = 10.0):
+    model = FakeStreamingChatModel(answer=" ".join(f"beep{i}" for i in range(args.tokens)), token_delay=token_delay)
+    # Il ChatOpenAI creato dal runtime per la configurazione non viene usato: il bot usa il modello finto
+    runtime = SessionRuntime(lambda llm: lesson.ChatBot("Beep", "You are a robot.", EXAMPLES, llm=model))
+    gateway = StreamGateway(runtime, cadence=cadence, drain_timeout=drain_timeout)
+    runner = web.AppRunner(gateway.app())
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    return gateway, runner, f"http://127.0.0.1:{port}"
+
+
+def run_clients(http, url, streams: int, results: List) -> List[asyncio.Task]:
+    return [asyncio.create_task((sse_client if i % 2 else ws_client)(http, url, f"s{i}", results))
+            for i in range(streams)]
+
+
+async def throughput(lesson, args, cadence: float) -> dict:
+    gateway, runner, url = await start_gateway(lesson, args, cadence, args.token_delay)
+    results: List[Any] = []
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0)) as http:
+        wall, cpu = time.perf_counter(), time.process_time()
+        await asyncio.gather(*run_clients(http, url, args.streams, results))
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    stats = gateway.stats()
+    await runner.cleanup()
+    ttfts = [t for t, _ in results if t is not None]
+    return {
+        "chunks": stats["chunks"],
+        "frames": stats["frames"],
+        "chunks_per_second": stats["chunks"] / wall,
+        "cpu_us_per_chunk": cpu / max(1, stats["chunks"]) * 1e6,
+        "ttft_p50": statistics.median(ttfts) if ttfts else float("nan"),
+    }
+
+
+async def drain(lesson, args) -> dict:
+    # Stream lunghi: alcuni finiscono entro drain_timeout, gli altri vengono cancellati
+    gateway, runner, url = await start_gateway(lesson, args, 0.05, args.token_delay * 20, args.drain_timeout)
+    results: List[Any] = []
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0)) as http:
+        clients = run_clients(http, url, args.streams, results)
+        while gateway.stats()["active_streams"] < args.streams:
+            await asyncio.sleep(0.01)
+        active = gateway.stats()["active_streams"]
+        start = time.perf_counter()
+        await runner.cleanup()
+        shutdown = time.perf_counter() - start
+        outcomes = await asyncio.gather(*clients, return_exceptions=True)
+    errors = sum(1 for outcome in outcomes if isinstance(outcome, Exception))
+    return {"active": active, "cancelled": gateway.counters["cancelled"], "shutdown": shutdown, "errors": errors}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--streams", type=int, default=200)
+    parser.add_argument("--tokens", type=int, default=200, help="token per risposta")
+    parser.add_argument("--token-delay", type=float, default=0.005, help="intervallo tra i token (s)")
+    parser.add_argument("--cadences", type=float, nargs="+", default=[0.0, 0.02, 0.05])
+    parser.add_argument("--drain-timeout", type=float, default=0.5)
+    args = parser.parse_args()
+    os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+    lesson = load_d01()
+
+    print(f"{args.streams} stream (metà SSE, metà WebSocket), {args.tokens} token ogni "
+          f"{args.token_delay * 1000:.0f} ms")
+    print(f"{'cadenza':>9}{'chunk':>9}{'frame':>9}{'chunk/frame':>13}{'chunk/s':>10}{'CPU µs/chunk':>14}{'TTFT p50':>10}")
+    for cadence in args.cadences:
+        r = asyncio.run(throughput(lesson, args, cadence))
+        print(f"{cadence * 1000:>7.0f}ms{r['chunks']:>9}{r['frames']:>9}{r['chunks'] / max(1, r['frames']):>13.1f}"
+              f"{r['chunks_per_second']:>10.0f}{r['cpu_us_per_chunk']:>14.1f}{r['ttft_p50'] * 1000:>8.1f}ms")
+
+    r = asyncio.run(drain(lesson, args))
+    print(f"spegnimento: {r['active']} stream in corso, {r['cancelled']} cancellati dopo "
+          f"{args.drain_timeout * 1000:.0f} ms di drain, gateway chiuso in {r['shutdown'] * 1000:.0f} ms, "
+          f"{r['errors']} client con risposta troncata")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+"""
+Benchmark: token per ripresa di una risposta interrotta in "D01 Streaming.py".
+
+Lo stream di `play` si interrompe dopo `--cut` token, in due modi: chiuso senza finish_reason
+(truncate_after del server di 01Project/openai_stub.py) oppure con la connessione caduta (reset_after:
+RST, play solleva l'errore di rete dopo aver salvato il checkpoint). Poi la risposta viene ripresa in
+tre modi:
+- resume precedente: un nuovo turno "continue after last word" mandato con play, senza contesto
+- turno "continua" con tutta la memoria (storia + domanda + parziale + istruzione)
+- resume con checkpoint: domanda + parziale come prefisso dell'assistente, sovrapposizione tolta
+
+Il modello simulato ricomincia la risposta da capo quando riceve un nuovo turno e continua
+(ripetendo le ultime `--overlap` parole) quando l'ultimo messaggio è dell'assistente:
+
+    python bench_stream_resume.py --answer-words 300 --cut 120 --history-turns 6
+"""
+
+import argparse
+import contextlib
+import io
+import os
+
+import openai
+from langchain_core.messages import AIMessage, HumanMessage
+
+from bench_prompt_prefix import OpenAIStub
+from bench_stream_runtime import load_d01
+
+CONTINUE = "If your last message is not complete, continue after last word. If it is complete, just output __END__"
+QUESTION = "What does FIFA stand for?"
+
+
+def count_tokens(text: str) -> int:
+    return len(text) // 4
+
+
+def make_history(turns: int):
+    history = []
+    for turn in range(turns):
+        history.append(HumanMessage(f"Question {turn}: tell me about football tournament number {turn}."))
+        history.append(AIMessage("The tournament was played in summer and the final was a close match. " * 6))
+    return history
+
+
+def old_resume(lesson, memory):
+    # Il resume di prima: un nuovo turno con l'istruzione, mandato con play
+    lesson.play(message=CONTINUE, memory=memory)
+
+
+def continue_turn(lesson, memory):
+    # Un turno "continua" che funziona davvero: tutta la memoria + l'istruzione
+    text = "".join(chunk.content for chunk in lesson.llm.stream([*memory, HumanMessage(CONTINUE)]))
+    memory[-1] = AIMessage(memory[-1].content + text)
+
+
+def checkpoint_resume(lesson, memory):
+    lesson.resume(memory)
+
+
+def interrupted_play(lesson, stub, memory, interruption: str, cut: int) -> bool:
+    """play interrotto dopo `cut` delta; True se play ha sollevato l'errore di rete."""
+    setattr(stub, interruption, cut)
+    try:
+        lesson.play(QUESTION, memory)
+        return False
+    except openai.APIConnectionError:
+        return True
+    finally:
+        setattr(stub, interruption, None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--answer-words", type=int, default=300)
+    parser.add_argument("--cut", type=int, default=120, help="token ricevuti prima dell'interruzione")
+    parser.add_argument("--overlap", type=int, default=3, help="parole ripetute dal modello quando continua")
+    parser.add_argument("--history-turns", type=int, default=6)
+    args = parser.parse_args()
+    words = [f"word{i}" for i in range(args.answer_words)]
+    answer = " ".join(words)
+    calls = []
+
+    def responder(body):
+        messages = body["messages"]
+        last = messages[-1]
+        if last["role"] == "assistant":
+            done = len(last["content"].split())
+            reply = " " + " ".join(words[max(0, done - args.overlap):])
+        else:
+            reply = answer
+        calls.append({
+            "prompt": sum(count_tokens(str(m.get("content") or "")) for m in messages),
+            "completion": count_tokens(reply),
+        })
+        return reply
+
+    os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+    with OpenAIStub(responder=responder) as stub:
+        os.environ["OPENAI_BASE_URL"] = stub.base_url
+        lesson = load_d01()
+
+        results = {}
+        for interruption in ("truncate_after", "reset_after"):
+            rows = results[interruption] = []
+            for label, strategy in (("resume precedente", old_resume),
+                                    ("turno 'continua'", continue_turn),
+                                    ("checkpoint", checkpoint_resume)):
+                memory = make_history(args.history_turns)
+                with contextlib.redirect_stdout(io.StringIO()):
+                    raised = interrupted_play(lesson, stub, memory, interruption, args.cut)
+                    saved = len(memory[-1].content.split())
+                    calls.clear()
+                    strategy(lesson, memory)
+                # Tutto quello che l'assistente ha scritto dopo la domanda interrotta
+                asked = max(i for i, m in enumerate(memory) if m.content == QUESTION)
+                text = "".join(m.content for m in memory[asked:] if isinstance(m, AIMessage))
+                rows.append({
+                    "label": label,
+                    "raised": raised,
+                    "saved": saved,
+                    "prompt": sum(c["prompt"] for c in calls),
+                    "completion": sum(c["completion"] for c in calls),
+                    "exact": text.strip() == answer,
+                    "extra_chars": len(text) - len(answer),
+                })
+
+    print(f"risposta di {args.answer_words} parole interrotta dopo {args.cut} token, "
+          f"{args.history_turns} turni di storia")
+    for interruption, title in (("truncate_after", "stream chiuso senza finish_reason"),
+                                ("reset_after", "connessione caduta (RST)")):
+        rows = results[interruption]
+        print(f"\n{title}: play ha sollevato l'errore: {'sì' if rows[0]['raised'] else 'no'}, "
+              f"parole salvate nel checkpoint: {rows[0]['saved']}")
+        print(f"{'':20}{'prompt':>8}{'output':>8}{'totale':>8}{'risposta esatta':>17}{'caratteri in più':>18}")
+        for r in rows:
+            print(f"{r['label']:20}{r['prompt']:>8}{r['completion']:>8}{r['prompt'] + r['completion']:>8}"
+                  f"{'sì' if r['exact'] else 'no':>17}{r['extra_chars']:>18}")
+        checkpoint = rows[-1]["prompt"] + rows[-1]["completion"]
+        for r in rows[:-1]:
+            print(f"token risparmiati rispetto a {r['label']}: {r['prompt'] + r['completion'] - checkpoint}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""
+Generatore di carico per SessionRuntime (stream_runtime.py): N conversazioni in streaming
+contemporanee su un solo event loop, con una parte di consumatori lenti, a livelli crescenti.
+
+Per ogni livello riporta stream completati, errori, TTFT p50/p95, durata, chunk al secondo in
+totale e memoria (RSS) per stream; la capacità è il livello più alto senza errori e con TTFT p95
+sotto `--ttft-slo`. Con il provider simulato il limite è la CPU del client: ogni chunk passa dal
+parsing dell'SDK openai e di LangChain (circa 1 ms per chunk), quindi i chunk/s totali
+restano costanti mentre il TTFT cresce con il numero di stream.
+Il modello è 01Project/openai_stub.py in un processo separato (così la sua memoria non conta):
+
+    python bench_stream_runtime.py --levels 50 100 200 400 800 --tokens 40 --token-delay 0.05
+"""
+
+import argparse
+import asyncio
+import importlib.util
+import multiprocessing
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "01Project"))
+
+from session_manager import resident_set_size  # noqa: E402
+from stream_runtime import SessionRuntime  # noqa: E402
+
+EXAMPLES = [{"input": "Hello!", "output": "BEEP. GREETINGS, HUMAN."},
+            {"input": "What is 2+2?", "output": "CALCULATING... RESULT: 4."}]
+
+
+def serve(port_queue, tokens: int, token_delay: float):
+    from openai_stub import OpenAIStub
+    answer = " ".join(f"beep{i}" for i in range(tokens))
+    with OpenAIStub(token_delay=token_delay, responder=lambda body: answer) as stub:
+        port_queue.put(stub.base_url)
+        while True:
+            time.sleep(3600)
+
+
+def load_d01():
+    path = Path(__file__).parent / "D01 Streaming.py"
+    spec = importlib.util.spec_from_file_location("D01_Streaming", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+async def conversation(runtime: SessionRuntime, session_id: str, slow: bool, slow_delay: float, results: list):
+    start = time.perf_counter()
+    ttft = None
+    try:
+        async for _ in runtime.send(session_id, "Hello robot, tell me something."):
+            if ttft is None:
+                ttft = time.perf_counter() - start
+            if slow:
+                await asyncio.sleep(slow_delay)  # consumatore lento: la coda della sessione si riempie
+        results.append(("ok", ttft))
+    except Exception as e:
+        results.append((type(e).__name__, ttft))
+
+
+async def level(lesson, streams: int, args) -> dict:
+    runtime = SessionRuntime(lambda llm: lesson.ChatBot("Beep", "You are a robot.", EXAMPLES, llm=llm),
+                             queue_size=args.queue_size)
+    for i in range(streams):
+        # Due configurazioni diverse: le sessioni con la stessa configurazione condividono il ChatOpenAI
+        runtime.open(f"s{i}", temperature=0.0 if i % 2 else 0.7)
+
+    rss_before = resident_set_size()
+    peak = {"streaming": 0, "rss": rss_before}
+
+    async def sample():
+        while True:
+            peak["streaming"] = max(peak["streaming"], runtime.stats()["streaming"])
+            peak["rss"] = max(peak["rss"], resident_set_size())
+            await asyncio.sleep(0.05)
+
+    sampler = asyncio.create_task(sample())
+    results = []
+    start = time.perf_counter()
+    await asyncio.gather(*(conversation(runtime, f"s{i}", i % 10 == 0, args.slow_delay, results)
+                           for i in range(streams)))
+    elapsed = time.perf_counter() - start
+    sampler.cancel()
+    models = runtime.stats()["models"]
+    await runtime.aclose()
+
+    ttfts = sorted(t for status, t in results if status == "ok" and t is not None)
+    errors = sum(1 for status, _ in results if status != "ok")
+    return {
+        "ok": len(results) - errors,
+        "errors": errors,
+        "peak_streaming": peak["streaming"],
+        "ttft_p50": statistics.median(ttfts) if ttfts else float("nan"),
+        "ttft_p95": statistics.quantiles(ttfts, n=20)[-1] if len(ttfts) > 1 else float("nan"),
+        "elapsed": elapsed,
+        "chunks_per_second": (len(results) - errors) * args.tokens / elapsed,
+        "kb_per_stream": (peak["rss"] - rss_before) / streams / 1024,
+        "models": models,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--levels", type=int, nargs="+", default=[50, 100, 200, 400, 800])
+    parser.add_argument("--tokens", type=int, default=40, help="token per risposta")
+    parser.add_argument("--token-delay", type=float, default=0.05, help="intervallo tra i token (s)")
+    parser.add_argument("--queue-size", type=int, default=16)
+    parser.add_argument("--slow-delay", type=float, default=0.05, help="pausa per token dei consumatori lenti (s)")
+    parser.add_argument("--ttft-slo", type=float, default=2.0, help="TTFT p95 massimo accettato (s)")
+    args = parser.parse_args()
+
+    port_queue = multiprocessing.Queue()
+    server = multiprocessing.Process(target=serve, args=(port_queue, args.tokens, args.token_delay), daemon=True)
+    server.start()
+    os.environ["OPENAI_BASE_URL"] = port_queue.get(timeout=30)
+    os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+    lesson = load_d01()
+
+    capacity = 0
+    print(f"{'stream':>7}{'ok':>7}{'errori':>8}{'picco':>7}{'TTFT p50':>10}{'TTFT p95':>10}"
+          f"{'durata s':>10}{'chunk/s':>9}{'KB/stream':>11}")
+    try:
+        for streams in args.levels:
+            r = asyncio.run(level(lesson, streams, args))
+            print(f"{streams:>7}{r['ok']:>7}{r['errors']:>8}{r['peak_streaming']:>7}{r['ttft_p50'] * 1000:>9.0f}m"
+                  f"{r['ttft_p95'] * 1000:>9.0f}m{r['elapsed']:>10.2f}{r['chunks_per_second']:>9.0f}"
+                  f"{r['kb_per_stream']:>11.1f}")
+            if r["errors"] == 0 and r["ttft_p95"] <= args.ttft_slo:
+                capacity = streams
+    finally:
+        server.terminate()
+    print(f"capacità stimata: {capacity} stream contemporanei (TTFT p95 <= {args.ttft_slo * 1000:.0f} ms, 0 errori)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""
+Benchmark dello structured output in streaming (stream_structured.py).
+
+1. CPU di parsing: lo stesso JSON di un Performer con `--films` film, diviso in chunk da
+   `--chunk-chars` caratteri, letto con parse_partial_json sul testo accumulato a ogni chunk (come
+   fanno i parser JSON di LangChain in streaming) e con IncrementalJSONParser.
+2. Latenza: `with_structured_output(Performer).invoke` contro stream_structured, con il server
+   locale di 01Project/openai_stub.py che invia la risposta a pezzi ogni `--token-delay` secondi;
+   riporta il tempo al primo film e all'oggetto completo, per i metodi function_calling e json_schema.
+
+    python bench_stream_structured.py --films 100 500 2000 --stream-films 100 --token-delay 0.005
+"""
+
+import argparse
+import json
+import time
+from typing import Annotated
+
+from langchain_core.utils.json import parse_partial_json
+from langchain_openai import ChatOpenAI
+from pydantic import BaseModel, Field
+
+from bench_prompt_prefix import OpenAIStub
+from openai_stub import tool_call
+from stream_structured import IncrementalJSONParser, StreamingStructuredParser, stream_structured
+
+
+class Performer(BaseModel):
+    # Come Performer in "D02 Schemas and output parsers.py"
+    name: Annotated[str, Field(description="Name of the performer")]
+    film_names: Annotated[list[str], Field(description="List of film names the performer has acted in")]
+
+
+def performer_json(films: int) -> str:
+    return json.dumps({"name": "Tom Hanks", "film_names": [f"Film \"{i}\" – part {i % 7}" for i in range(films)]},
+                      ensure_ascii=False)
+
+
+def chunked(text: str, size: int):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def parse_cpu(films: int, chunk_chars: int):
+    chunks = chunked(performer_json(films), chunk_chars)
+
+    start = time.process_time()
+    buffer = ""
+    for chunk in chunks:
+        buffer += chunk
+        parse_partial_json(buffer)
+    naive = time.process_time() - start
+
+    start = time.process_time()
+    parser = IncrementalJSONParser()
+    for chunk in chunks:
+        parser.feed(chunk)
+    parser.close()
+    incremental = time.process_time() - start
+
+    start = time.process_time()
+    structured = StreamingStructuredParser(Performer)
+    partials = sum(1 for chunk in chunks if structured.feed(chunk) is not None)
+    structured.result()
+    validated = time.process_time() - start
+    return len(chunks), naive, incremental, validated, partials
+
+
+def latency(llm, method: str, films: int):
+    # Una chiamata a vuoto: il primo stream con response_format importa moduli dell'SDK (secondi)
+    for _ in stream_structured(llm, Performer, "warm-up", method=method):
+        pass
+
+    start = time.perf_counter()
+    result = llm.with_structured_output(Performer, method=method).invoke("Tom Hanks filmography")
+    blocking = time.perf_counter() - start
+    assert len(result.film_names) == films
+
+    start = time.perf_counter()
+    first_film = None
+    partials = 0
+    for partial in stream_structured(llm, Performer, "Tom Hanks filmography", method=method):
+        partials += 1
+        if first_film is None and partial.film_names:
+            first_film = time.perf_counter() - start
+    streaming = time.perf_counter() - start
+    assert partial.film_names == result.film_names
+    return blocking, first_film, streaming, partials
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--films", type=int, nargs="+", default=[100, 500, 2000])
+    parser.add_argument("--chunk-chars", type=int, default=8, help="caratteri per chunk (come gli argomenti delle tool call)")
+    parser.add_argument("--stream-films", type=int, default=100, help="film nella risposta del server locale")
+    parser.add_argument("--token-delay", type=float, default=0.005, help="intervallo tra i chunk del server (s)")
+    args = parser.parse_args()
+
+    print(f"CPU di parsing, chunk da {args.chunk_chars} caratteri")
+    print(f"{'film':>6}{'KB':>8}{'chunk':>8}{'parse_partial_json':>20}{'incrementale':>14}{'+ validazione':>15}{'parziali':>10}")
+    for films in args.films:
+        size = len(performer_json(films)) / 1024
+        chunks, naive, incremental, validated, partials = parse_cpu(films, args.chunk_chars)
+        print(f"{films:>6}{size:>8.1f}{chunks:>8}{naive * 1000:>18.1f}ms{incremental * 1000:>12.1f}ms"
+              f"{validated * 1000:>13.1f}ms{partials:>10}")
+
+    answer = json.loads(performer_json(args.stream_films))
+
+    def responder(body):
+        if body.get("tools"):
+            return {"content": None, "tool_calls": [tool_call("Performer", answer)]}
+        return json.dumps(answer)
+
+    print(f"\nlatenza con {args.stream_films} film, un chunk ogni {args.token_delay * 1000:.0f} ms")
+    print(f"{'metodo':>17}{'invoke':>10}{'primo film':>12}{'stream completo':>17}{'parziali':>10}")
+    with OpenAIStub(token_delay=args.token_delay, responder=responder) as stub:
+        llm = ChatOpenAI(model="gpt-4o-mini", base_url=stub.base_url, api_key="sk-bench")
+        for method in ("function_calling", "json_schema"):
+            blocking, first_film, streaming, partials = latency(llm, method, args.stream_films)
+            print(f"{method:>17}{blocking * 1000:>8.0f}ms{first_film * 1000:>10.0f}ms{streaming * 1000:>15.0f}ms"
+                  f"{partials:>10}")
+
+
+if __name__ == '__main__':
+    main()
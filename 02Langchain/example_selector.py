@@ -0,0 +1,152 @@
+"""
+Selezione vettoriale degli esempi few-shot.
+
+Con centinaia di esempi non ha senso mandarli tutti a ogni chiamata: VectorExampleSelector calcola
+una volta gli embedding degli esempi in una matrice NumPy (righe normalizzate), la salva su disco e a
+ogni chiamata sceglie i k esempi più simili all'input con un solo prodotto matrice-vettore
+(similarità del coseno) e un argpartition.
+
+L'embedder è una qualunque funzione List[str] -> np.ndarray (n, dim); di default HashingEmbedder,
+che funziona offline e senza dipendenze oltre a NumPy. È compatibile con `example_selector` di
+FewShotPromptTemplate e FewShotChatMessagePromptTemplate.
+"""
+
+import hashlib
+import json
+import os
+import re
+import zlib
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+from langchain_core.example_selectors import BaseExampleSelector
+
+Embedder = Callable[[List[str]], np.ndarray]
+
+_WORD_RE = re.compile(r"\w+")
+
+
+class HashingEmbedder:
+    """
+    Embedding "hashing trick": parole e coppie di parole consecutive finiscono in `dim` colonne
+    tramite crc32 (stabile tra processi, a differenza di hash()), con segno per ridurre le collisioni.
+    """
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def _features(self, text: str) -> List[int]:
+        words = _WORD_RE.findall(text.lower())
+        tokens = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        return [zlib.crc32(token.encode()) for token in tokens]
+
+    def __call__(self, texts: List[str]) -> np.ndarray:
+        rows, hashes = [], []
+        for row, text in enumerate(texts):
+            features = self._features(text)
+            rows.extend([row] * len(features))
+            hashes.extend(features)
+        hashes = np.asarray(hashes, dtype=np.uint32)
+        signs = np.where(hashes & 0x80000000, -1.0, 1.0).astype(np.float32)
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        np.add.at(matrix, (np.asarray(rows, dtype=np.intp), hashes % self.dim), signs)
+        return matrix
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32, copy=False)
+
+
+class VectorExampleSelector(BaseExampleSelector):
+    """
+    - examples: dizionari degli esempi (es. {"input": ..., "output": ...})
+    - k: numero di esempi restituiti, dal più simile
+    - input_keys: chiavi dell'esempio (e delle variabili del prompt) usate per la similarità
+    - embedder: funzione di embedding; il suo attributo `name` finisce nell'impronta dell'indice
+    - path: file .npz dell'indice; se esiste e corrisponde agli esempi viene caricato invece di ricalcolato
+    """
+
+    def __init__(self,
+                 examples: Sequence[Dict[str, Any]],
+                 k: int = 4,
+                 input_keys: Sequence[str] = ("input",),
+                 embedder: Optional[Embedder] = None,
+                 path: Optional[str] = None):
+        self.k = k
+        self.input_keys = tuple(input_keys)
+        self.embedder = embedder or HashingEmbedder()
+        self.path = path
+        self.examples: List[Dict[str, Any]] = list(examples)
+
+        matrix = self._load(path) if path else None
+        if matrix is None:
+            matrix = self._embed(self.examples)
+            if path:
+                self.save(path, matrix)
+        # Buffer con capacità doppia: add_example non ricopia la matrice a ogni esempio
+        self._matrix = matrix
+        self._size = len(self.examples)
+
+    def _text(self, values: Dict[str, Any]) -> str:
+        return " ".join(str(values.get(key, "")) for key in self.input_keys)
+
+    def _embed(self, examples: Sequence[Dict[str, Any]]) -> np.ndarray:
+        if not examples:
+            return np.zeros((0, 0), dtype=np.float32)
+        return _normalize(np.asarray(self.embedder([self._text(e) for e in examples]), dtype=np.float32))
+
+    def _fingerprint(self) -> str:
+        payload = json.dumps([getattr(self.embedder, "name", repr(self.embedder)), self.input_keys, self.examples],
+                             sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _load(self, path: str) -> Optional[np.ndarray]:
+        if not os.path.exists(path):
+            return None
+        with np.load(path, allow_pickle=False) as data:
+            if str(data["fingerprint"]) != self._fingerprint():
+                return None  # esempi o embedder cambiati: l'indice va ricalcolato
+            return data["matrix"]
+
+    def save(self, path: Optional[str] = None, matrix: Optional[np.ndarray] = None) -> None:
+        """Salva l'indice (matrice + impronta degli esempi) in formato .npz."""
+        path = path or self.path
+        matrix = self._matrix[:self._size] if matrix is None else matrix
+        tmp = f"{path}.tmp.npz"
+        np.savez(tmp, matrix=matrix, fingerprint=np.array(self._fingerprint()))
+        os.replace(tmp, path)
+
+    def add_example(self, example: Dict[str, Any]) -> None:
+        vector = self._embed([example])[0]
+        if self._size == 0:
+            self._matrix = np.zeros((8, vector.shape[0]), dtype=np.float32)
+        elif self._size == self._matrix.shape[0]:
+            grown = np.zeros((self._size * 2, self._matrix.shape[1]), dtype=np.float32)
+            grown[:self._size] = self._matrix[:self._size]
+            self._matrix = grown
+        self._matrix[self._size] = vector
+        self.examples.append(example)
+        self._size += 1
+
+    def scores(self, input_variables: Dict[str, Any]) -> np.ndarray:
+        """Similarità del coseno tra l'input e ogni esempio."""
+        if self._size == 0:
+            return np.zeros(0, dtype=np.float32)
+        query = self._embed([input_variables])[0]
+        return self._matrix[:self._size] @ query
+
+    def select_examples(self, input_variables: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """I k esempi più simili all'input, dal più simile."""
+        scores = self.scores(input_variables)
+        k = min(self.k, len(scores))
+        if k == 0:
+            return []
+        if k < len(scores):
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [self.examples[i] for i in top]
@@ -0,0 +1,128 @@
+"""
+Esempi few-shot entro un budget di token.
+
+TokenBudgetExampleSelector è un example_selector per FewShotChatMessagePromptTemplate: ordina gli
+esempi per rilevanza (con un selettore come VectorExampleSelector, altrimenti nell'ordine dato) e
+li aggiunge in modo greedy finché stanno nel budget, cioè
+    min(max_prompt_tokens, context_limit - reserve_tokens) - token già usati dal prompt
+dove i token già usati (istruzioni + conversazione + messaggio corrente) arrivano nella variabile
+`prompt_tokens`. Più la conversazione cresce, meno esempi entrano; il primo turno non supera mai
+il tetto, invece di portarsi dietro tutti gli esempi.
+
+MessageTokenCounter tiene il totale dei token di una lista di messaggi in modo incrementale.
+"""
+
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.example_selectors import BaseExampleSelector
+from langchain_core.messages import BaseMessage
+
+# Stesso conteggio di 01Project/memory_window.py (encoding, overhead e stima senza tiktoken): le due
+# cartelle sono indipendenti, quindi va tenuto allineato a mano
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("o200k_base")
+except Exception:  # tiktoken non installato o encoding non disponibile offline
+    _encoding = None
+
+MESSAGE_OVERHEAD = 4
+
+
+def count_text_tokens(text: str) -> int:
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return max(1, len(text) // 4)
+
+
+def count_message_tokens(message: BaseMessage) -> int:
+    return MESSAGE_OVERHEAD + count_text_tokens(str(message.content))
+
+
+class MessageTokenCounter:
+    """Totale dei token di una lista di messaggi, contando solo quelli aggiunti dall'ultima chiamata."""
+
+    def __init__(self):
+        self._messages: Optional[List[BaseMessage]] = None
+        self._counted = 0
+        self._tokens = 0
+
+    def total(self, messages: List[BaseMessage]) -> int:
+        # Lista sostituita (es. sessione ricaricata dal disco) o accorciata: si ricomincia
+        if messages is not self._messages or len(messages) < self._counted:
+            self._messages, self._counted, self._tokens = messages, 0, 0
+        for message in messages[self._counted:]:
+            self._tokens += count_message_tokens(message)
+        self._counted = len(messages)
+        return self._tokens
+
+
+class TokenBudgetExampleSelector(BaseExampleSelector):
+    """
+    - examples: esempi {"input", "output"}; ignorati se `ranker` ha già i suoi
+    - ranker: selettore che ordina per rilevanza (con `scores()` come VectorExampleSelector, o un
+      qualunque BaseExampleSelector, di cui si usa l'ordine restituito)
+    - max_prompt_tokens: tetto all'intero prompt; context_limit - reserve_tokens è comunque il massimo
+    - max_examples: numero massimo di esempi
+    """
+
+    def __init__(self,
+                 examples: Sequence[Dict[str, Any]] = (),
+                 ranker: Optional[BaseExampleSelector] = None,
+                 max_prompt_tokens: Optional[int] = None,
+                 context_limit: int = 128_000,
+                 reserve_tokens: int = 1_024,
+                 max_examples: Optional[int] = None):
+        self.examples: List[Dict[str, Any]] = list(getattr(ranker, "examples", None) or examples)
+        self.ranker = ranker
+        self.max_prompt_tokens = max_prompt_tokens
+        self.context_limit = context_limit
+        self.reserve_tokens = reserve_tokens
+        self.max_examples = max_examples
+        self._costs: Dict[Tuple[str, str], int] = {}
+
+    def add_example(self, example: Dict[str, Any]) -> None:
+        if self.ranker is not None:
+            self.ranker.add_example(example)
+            self.examples = list(getattr(self.ranker, "examples", self.examples + [example]))
+        else:
+            self.examples.append(example)
+
+    def budget(self, prompt_tokens: int) -> int:
+        """Token disponibili per gli esempi, dati i token già usati dal resto del prompt."""
+        limit = self.context_limit - self.reserve_tokens
+        if self.max_prompt_tokens is not None:
+            limit = min(limit, self.max_prompt_tokens)
+        return max(0, limit - prompt_tokens)
+
+    def cost(self, example: Dict[str, Any]) -> int:
+        """Token di un esempio (messaggio human + ai), calcolati una volta sola."""
+        key = (str(example.get("input", "")), str(example.get("output", "")))
+        cost = self._costs.get(key)
+        if cost is None:
+            cost = self._costs[key] = 2 * MESSAGE_OVERHEAD + count_text_tokens(key[0]) + count_text_tokens(key[1])
+        return cost
+
+    def _ranked(self, input_variables: Dict[str, Any]):
+        if self.ranker is None:
+            return self.examples
+        scores = getattr(self.ranker, "scores", None)
+        if scores is not None:
+            order = (-scores(input_variables)).argsort(kind="stable")
+            return (self.ranker.examples[i] for i in order)
+        return self.ranker.select_examples(input_variables)
+
+    def select_examples(self, input_variables: Dict[str, Any]) -> List[Dict[str, Any]]:
+        remaining = self.budget(int(input_variables.get("prompt_tokens", 0)))
+        smallest = 2 * MESSAGE_OVERHEAD + 2
+        selected = []
+        for example in self._ranked(input_variables):
+            if remaining < smallest or (self.max_examples is not None and len(selected) >= self.max_examples):
+                break
+            cost = self.cost(example)
+            # Greedy: un esempio troppo grande viene saltato, uno più piccolo e meno rilevante può ancora entrare
+            if cost <= remaining:
+                selected.append(example)
+                remaining -= cost
+        return selected
@@ -3,6 +3,7 @@ from langchain_core.messages import HumanMessage, SystemMessage, AIMessage
 from langchain_core.prompts import PromptTemplate, FewShotPromptTemplate
 from dotenv import load_dotenv
 import os
+from example_selector import VectorExampleSelector
 
 load_dotenv()
 
@@ -89,3 +90,22 @@ if __name__ == '__main__':
     response = llm.invoke(prompt_template.invoke({"input": "What is the largest planet in our solar system?"}))
     print(response.content)
 
+    # Con molti esempi conviene mandare solo quelli più simili alla domanda: il selettore vettoriale
+    # calcola gli embedding una volta sola e sceglie i k esempi con la similarità del coseno
+    examples += [
+        {"input": "What is the capital of Japan?", "thought": "I need to recall the capital city of Japan.", "output": "The capital of Japan is Tokyo."},
+        {"input": "Who painted the Mona Lisa?", "thought": "I need to remember the painter of the Mona Lisa.", "output": "Leonardo da Vinci painted the Mona Lisa."},
+        {"input": "What is the largest ocean on Earth?", "thought": "I need to recall the largest ocean.", "output": "The Pacific Ocean is the largest ocean on Earth."},
+    ]
+
+    print("=== Esempio 8: FewShotPromptTemplate con selezione vettoriale degli esempi ===")
+    prompt_template = FewShotPromptTemplate(
+        example_selector=VectorExampleSelector(examples, k=2),
+        example_prompt=example_prompt,
+        prefix="Here are some examples of questions and answers:",
+        suffix="Now, answer the following question:\nQuestion: {input}\nThought:",
+        input_variables=["input"]
+    )
+    print(prompt_template.invoke({"input": "What is the capital of Italy?"}).to_string())
+    response = llm.invoke(prompt_template.invoke({"input": "What is the capital of Italy?"}))
+    print(response.content)
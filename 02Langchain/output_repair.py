@@ -0,0 +1,174 @@
+"""
+Riparazione locale del JSON prima di OutputFixingParser (usata in "D02 Schemas and output parsers.py").
+
+OutputFixingParser manda ogni output non valido al modello, anche quando l'errore è banale (apici
+singoli, una virgola in più): una chiamata LLM intera per una correzione di sintassi.
+LocalRepairOutputParser prova prima il parser originale, poi lo stesso parser sul testo riparato da
+repair_json(), e solo se anche questo non supera la validazione passa al fallback (OutputFixingParser).
+Le statistiche contano le chiamate LLM evitate.
+
+repair_json() lavora in una sola passata sul testo e corregge:
+- blocchi ```json ... ``` e testo prima o dopo il valore JSON
+- stringhe con apici singoli (e virgolette doppie al loro interno)
+- letterali Python True / False / None
+- virgole prima di } o ]
+- parentesi e stringhe non chiuse (risposta troncata) e parentesi chiuse in più
+"""
+
+import re
+from typing import Annotated, Any, Dict, List, TypeVar
+
+from langchain_classic.output_parsers import OutputFixingParser
+from langchain_core.exceptions import OutputParserException
+from langchain_core.language_models import BaseLanguageModel
+from langchain_core.output_parsers import BaseOutputParser
+from pydantic import ConfigDict, Field, SkipValidation
+
+T = TypeVar("T")
+
+_FENCE = re.compile(r"```[a-zA-Z]*[ \t]*\n?(.*?)(?:```|$)", re.DOTALL)
+_LITERALS = {"True": "true", "False": "false", "None": "null"}
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+def _drop_trailing_comma(out: List[str]) -> None:
+    i = len(out) - 1
+    while i >= 0 and out[i].isspace():
+        i -= 1
+    if i >= 0 and out[i] == ",":
+        del out[i]
+
+
+def repair_json(text: str) -> str:
+    """Restituisce il testo con gli errori di sintassi più comuni corretti (non lo valida)."""
+    fence = _FENCE.search(text)
+    if fence:
+        text = fence.group(1)
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    if not starts:
+        return text.strip()
+
+    out: List[str] = []
+    stack: List[str] = []
+    i, n = min(starts), len(text)
+    while i < n:
+        c = text[i]
+        if c == '"' or c == "'":
+            # Stringa con apici doppi o singoli: riscritta sempre con apici doppi
+            quote, i = c, i + 1
+            parts = ['"']
+            while i < n and text[i] != quote:
+                ch = text[i]
+                if ch == "\\":
+                    escaped = text[i + 1:i + 2]
+                    parts.append("'" if escaped == "'" else ch + escaped)  # \' non è valido in JSON
+                    i += 2
+                    continue
+                parts.append('\\"' if ch == '"' else "\\n" if ch == "\n" else ch)
+                i += 1
+            parts.append('"')
+            out.append("".join(parts))
+        elif c in _CLOSERS:
+            stack.append(_CLOSERS[c])
+            out.append(c)
+        elif c == "}" or c == "]":
+            _drop_trailing_comma(out)
+            if c in stack:
+                # Chiude anche le parentesi rimaste aperte all'interno
+                while stack:
+                    closer = stack.pop()
+                    out.append(closer)
+                    if closer == c:
+                        break
+            if not stack:
+                break  # valore principale completo: il resto è testo
+        elif c.isalpha() or c == "_":
+            j = i
+            while j < n and (text[j].isalnum() or text[j] == "_"):
+                j += 1
+            word = text[i:j]
+            out.append(_LITERALS.get(word, word))
+            i = j
+            continue
+        else:
+            out.append(c)
+        i += 1
+
+    _drop_trailing_comma(out)
+    out.extend(reversed(stack))
+    return "".join(out)
+
+
+class RepairStats:
+    """Quante risposte erano già valide, quante riparate localmente e quante mandate al modello."""
+
+    def __init__(self):
+        self.valid = 0
+        self.repaired = 0
+        self.llm_fixes = 0
+        self.failed = 0
+
+    @property
+    def avoided_llm_calls(self) -> int:
+        return self.repaired
+
+    def as_dict(self) -> Dict[str, int]:
+        return {"valid": self.valid, "repaired": self.repaired, "llm_fixes": self.llm_fixes,
+                "failed": self.failed, "avoided_llm_calls": self.avoided_llm_calls}
+
+
+class LocalRepairOutputParser(BaseOutputParser[T]):
+    """Parser -> riparazione locale -> fallback (di solito OutputFixingParser) solo se serve."""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    # Come in OutputFixingParser: i parser generici non vengono validati da pydantic
+    parser: Annotated[Any, SkipValidation()]
+    fallback: Annotated[Any, SkipValidation()] = None
+    stats: RepairStats = Field(default_factory=RepairStats, exclude=True)
+
+    @classmethod
+    def from_llm(cls, llm: BaseLanguageModel, parser: BaseOutputParser[T], **kwargs: Any) -> "LocalRepairOutputParser[T]":
+        """Come OutputFixingParser.from_llm, con la riparazione locale davanti."""
+        return cls(parser=parser, fallback=OutputFixingParser.from_llm(llm, parser, **kwargs))
+
+    def _parse_locally(self, completion: str):
+        try:
+            result = self.parser.parse(completion)
+            self.stats.valid += 1
+            return True, result, None
+        except OutputParserException as e:
+            error = e
+        try:
+            result = self.parser.parse(repair_json(completion))
+            self.stats.repaired += 1
+            return True, result, None
+        except OutputParserException:
+            return False, None, error
+
+    def parse(self, completion: str) -> T:
+        ok, result, error = self._parse_locally(completion)
+        if ok:
+            return result
+        if self.fallback is None:
+            self.stats.failed += 1
+            raise error
+        self.stats.llm_fixes += 1
+        return self.fallback.parse(completion)
+
+    async def aparse(self, completion: str) -> T:
+        ok, result, error = self._parse_locally(completion)
+        if ok:
+            return result
+        if self.fallback is None:
+            self.stats.failed += 1
+            raise error
+        self.stats.llm_fixes += 1
+        return await self.fallback.aparse(completion)
+
+    def get_format_instructions(self) -> str:
+        return self.parser.get_format_instructions()
+
+    @property
+    def _type(self) -> str:
+        return "local_repair"
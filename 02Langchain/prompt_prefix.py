@@ -0,0 +1,109 @@
+"""
+Prefisso di prompt stabile per il ChatBot di "E01 Chatbot Application.py".
+
+Il prompt caching del provider (OpenAI: dai 1024 token in su) riusa il calcolo solo se l'inizio
+della richiesta è identico byte per byte a una richiesta recente. Qui il prompt è diviso in:
+- un prefisso statico: un solo messaggio di sistema, poi gli esempi few-shot (senza duplicati)
+- una coda dinamica: la conversazione della sessione
+
+Il prefisso viene costruito una volta per ogni coppia (istruzioni, esempi) e condiviso da tutte le
+sessioni dello stesso bot, che quindi non ricreano i messaggi e mandano sempre gli stessi byte.
+Il suo `fingerprint` è adatto come `prompt_cache_key`. Ogni prefisso tiene le statistiche di cache
+lette da `usage_metadata` delle risposte.
+"""
+
+import hashlib
+import json
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from langchain_core.messages import AIMessage, BaseMessage, SystemMessage
+from langchain_core.prompts import ChatPromptTemplate, FewShotChatMessagePromptTemplate
+
+
+class CacheUsage:
+    """Token di prompt, token letti dalla cache del provider e latenza, per chiamate con e senza hit."""
+
+    def __init__(self):
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self._latency = {True: [0, 0.0], False: [0, 0.0]}  # hit -> [chiamate, secondi]
+        self._lock = threading.Lock()
+
+    def record(self, message: AIMessage, latency: Optional[float] = None) -> int:
+        """Registra l'usage di una risposta; restituisce i token letti dalla cache."""
+        usage = message.usage_metadata or {}
+        cached = (usage.get("input_token_details") or {}).get("cache_read") or 0
+        with self._lock:
+            self.calls += 1
+            self.prompt_tokens += usage.get("input_tokens", 0)
+            self.cached_tokens += cached
+            if latency is not None:
+                bucket = self._latency[cached > 0]
+                bucket[0] += 1
+                bucket[1] += latency
+        return cached
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            hits, misses = self._latency[True], self._latency[False]
+            return {
+                "calls": self.calls,
+                "prompt_tokens": self.prompt_tokens,
+                "cached_tokens": self.cached_tokens,
+                "cached_ratio": self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0,
+                "hit_latency_ms": hits[1] / hits[0] * 1000 if hits[0] else 0.0,
+                "miss_latency_ms": misses[1] / misses[0] * 1000 if misses[0] else 0.0,
+            }
+
+
+class PromptPrefix:
+    """Messaggi statici del prompt, immutabili e condivisi; usare `get_prefix` per ottenerli."""
+
+    def __init__(self, instructions: str, examples: List[Dict[str, str]]):
+        self.instructions = instructions
+        self.examples = _unique(examples)
+        # Le istruzioni compaiono una sola volta, prima degli esempi (non dentro ogni esempio)
+        few_shot = FewShotChatMessagePromptTemplate(
+            example_prompt=ChatPromptTemplate.from_messages([("human", "{input}"), ("ai", "{output}")]),
+            examples=self.examples,
+        )
+        self.messages: Tuple[BaseMessage, ...] = (SystemMessage(instructions),
+                                                  *few_shot.invoke({}).to_messages())
+        self.fingerprint = _fingerprint(instructions, self.examples)
+        self.usage = CacheUsage()
+
+    def render(self, tail: List[BaseMessage]) -> List[BaseMessage]:
+        """Prompt completo: prefisso statico + coda dinamica della sessione."""
+        return [*self.messages, *tail]
+
+
+def _unique(examples: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    seen = set()
+    result = []
+    for example in examples:
+        key = (example["input"], example["output"])
+        if key not in seen:
+            seen.add(key)
+            result.append({"input": example["input"], "output": example["output"]})
+    return result
+
+
+def _fingerprint(instructions: str, examples: List[Dict[str, str]]) -> str:
+    payload = json.dumps([instructions, examples], ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+_prefixes: Dict[str, PromptPrefix] = {}
+_lock = threading.Lock()
+
+
+def get_prefix(instructions: str, examples: List[Dict[str, str]]) -> PromptPrefix:
+    """Restituisce il prefisso condiviso per (istruzioni, esempi), creandolo alla prima richiesta."""
+    key = _fingerprint(instructions, _unique(examples))
+    with _lock:
+        prefix = _prefixes.get(key)
+        if prefix is None:
+            prefix = _prefixes[key] = PromptPrefix(instructions, examples)
+        return prefix
@@ -0,0 +1,229 @@
+"""
+Gestore delle sessioni ChatBot in-process, pensato per decine di migliaia di conversazioni.
+
+- Le sessioni sono distribuite su N shard (dizionari con un lock ciascuno), così thread diversi che
+  lavorano su sessioni diverse non si contendono un unico lock globale.
+- Ogni shard tiene le sessioni in ordine LRU. Quando la memoria stimata delle sessioni residenti
+  supera il tetto, le sessioni inattive da più tempo vengono scritte su disco e rimosse dalla RAM.
+- Al messaggio successivo la sessione viene ricaricata dal disco (fault-in) in modo trasparente.
+
+Il lock di uno shard protegge solo il dizionario: creazione della sessione (factory), lettura e
+scrittura su disco avvengono fuori dal lock, così una sessione lenta da creare o da salvare non
+blocca le altre sessioni dello stesso shard.
+
+Una sessione è qualunque oggetto con un attributo `messages` (lista di messaggi LangChain), come il
+ChatBot di "E01 Chatbot Application.py".
+"""
+
+import json
+import os
+import re
+import statistics
+import threading
+import time
+import zlib
+from collections import OrderedDict, deque
+from typing import Any, Callable, Dict, List, Optional
+
+from langchain_core.messages import BaseMessage, messages_from_dict, messages_to_dict
+
+# Stima dell'overhead in RAM di un messaggio LangChain oltre al testo (oggetto pydantic, metadati)
+MESSAGE_OVERHEAD_BYTES = 600
+
+
+def estimate_bytes(messages: List[BaseMessage]) -> int:
+    """Stima grezza della memoria occupata da una lista di messaggi."""
+    return sum(MESSAGE_OVERHEAD_BYTES + len(str(m.content)) for m in messages)
+
+
+def resident_set_size() -> int:
+    """RSS attuale del processo in byte (Linux), altrimenti il picco riportato da getrusage."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        pass
+    try:
+        import resource
+    except ImportError:  # Windows
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+
+class _Entry:
+    __slots__ = ("session", "lock", "size", "last_used")
+
+    def __init__(self, session: Any, size: int):
+        self.session = session
+        self.lock = threading.Lock()
+        self.size = size
+        self.last_used = time.monotonic()
+
+
+class _Shard:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sessions: "OrderedDict[str, _Entry]" = OrderedDict()
+        # Sessioni in fase di creazione o di fault-in: gli altri thread aspettano l'evento
+        self.loading: Dict[str, threading.Event] = {}
+
+
+class SessionManager:
+    """
+    - factory: funzione senza argomenti che crea una nuova sessione (es. lambda: ChatBot(...))
+    - directory: cartella dove vengono scritte le sessioni sfrattate dalla RAM
+    - shards: numero di dizionari indipendenti tra cui sono distribuite le sessioni
+    - max_resident_bytes: tetto di memoria (stimata) per le sessioni residenti
+    """
+
+    def __init__(self,
+                 factory: Callable[[], Any],
+                 directory: str,
+                 shards: int = 64,
+                 max_resident_bytes: int = 512 * 1024 * 1024):
+        self.factory = factory
+        self.directory = directory
+        self.max_resident_bytes = max_resident_bytes
+        self._shards = [_Shard() for _ in range(shards)]
+        self._stats_lock = threading.Lock()
+        self._resident_bytes = 0
+        self._started = time.monotonic()
+        self.evictions = 0
+        self.fault_ins = 0
+        self._fault_in_latencies = deque(maxlen=1000)
+        os.makedirs(directory, exist_ok=True)
+
+    def _shard(self, session_id: str) -> _Shard:
+        return self._shards[zlib.crc32(session_id.encode()) % len(self._shards)]
+
+    def _path(self, session_id: str) -> str:
+        if not re.fullmatch(r"[\w.-]+", session_id):
+            raise ValueError(f"session_id non valido: {session_id!r}")
+        return os.path.join(self.directory, f"{session_id}.json")
+
+    def _add_bytes(self, delta: int) -> None:
+        with self._stats_lock:
+            self._resident_bytes += delta
+
+    def _entry(self, session_id: str) -> _Entry:
+        """Restituisce la sessione residente, caricandola dal disco o creandola se necessario."""
+        shard = self._shard(session_id)
+        path = self._path(session_id)
+        while True:
+            with shard.lock:
+                entry = shard.sessions.get(session_id)
+                if entry is not None:
+                    shard.sessions.move_to_end(session_id)
+                    entry.last_used = time.monotonic()
+                    return entry
+                loading = shard.loading.get(session_id)
+                if loading is None:
+                    loading = shard.loading[session_id] = threading.Event()
+                    break
+            # Un altro thread sta creando o ricaricando la stessa sessione: si usa la sua
+            loading.wait()
+
+        try:
+            session = self.factory()
+            if os.path.exists(path):
+                start = time.perf_counter()
+                with open(path, encoding="utf-8") as f:
+                    session.messages = messages_from_dict(json.load(f))
+                # Rimosso prima dell'inserimento: finché la sessione non è residente nessuno può sfrattarla
+                os.remove(path)
+                with self._stats_lock:
+                    self.fault_ins += 1
+                    self._fault_in_latencies.append(time.perf_counter() - start)
+            entry = _Entry(session, estimate_bytes(session.messages))
+            with shard.lock:
+                shard.sessions[session_id] = entry
+        finally:
+            with shard.lock:
+                del shard.loading[session_id]
+            loading.set()
+        self._add_bytes(entry.size)
+        self._enforce_limit()
+        return entry
+
+    def invoke(self, session_id: str, user_message: str):
+        """Inoltra il messaggio alla sessione `session_id` e restituisce la risposta del ChatBot."""
+        while True:
+            entry = self._entry(session_id)
+            with entry.lock:
+                # Tra la ricerca e l'acquisizione del lock la sessione può essere stata sfrattata
+                if self._shard(session_id).sessions.get(session_id) is not entry:
+                    continue
+                response = entry.session.invoke(user_message)
+                size = estimate_bytes(entry.session.messages)
+                delta, entry.size = size - entry.size, size
+                entry.last_used = time.monotonic()
+                break
+        self._add_bytes(delta)
+        self._enforce_limit()
+        return response
+
+    def get(self, session_id: str) -> Any:
+        """Restituisce l'oggetto sessione (ricaricandolo dal disco se era stato sfrattato)."""
+        return self._entry(session_id).session
+
+    def evict(self, session_id: str) -> bool:
+        """Scrive la sessione su disco e la rimuove dalla RAM. False se non era residente o è occupata."""
+        shard = self._shard(session_id)
+        with shard.lock:
+            entry = shard.sessions.get(session_id)
+            # Una sessione che sta elaborando un messaggio non viene sfrattata
+            if entry is None or not entry.lock.acquire(blocking=False):
+                return False
+        # Scrittura fuori dal lock dello shard; il lock della sessione ferma invoke finché non è rimossa
+        try:
+            path = self._path(session_id)
+            tmp = f"{path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(messages_to_dict(entry.session.messages), f, ensure_ascii=False)
+            os.replace(tmp, path)
+            with shard.lock:
+                del shard.sessions[session_id]
+        finally:
+            entry.lock.release()
+        self._add_bytes(-entry.size)
+        with self._stats_lock:
+            self.evictions += 1
+        return True
+
+    def _enforce_limit(self) -> None:
+        """Sfratta le sessioni inattive da più tempo finché la memoria stimata rientra nel tetto."""
+        skipped = set()
+        while self._resident_bytes > self.max_resident_bytes:
+            oldest_id, oldest_time = None, None
+            for shard in self._shards:
+                with shard.lock:
+                    # La sessione libera meno recente dello shard: quelle occupate vengono saltate
+                    for session_id, entry in shard.sessions.items():
+                        if session_id in skipped or entry.lock.locked():
+                            continue
+                        if oldest_time is None or entry.last_used < oldest_time:
+                            oldest_id, oldest_time = session_id, entry.last_used
+                        break
+            if oldest_id is None:
+                return
+            if not self.evict(oldest_id):
+                skipped.add(oldest_id)
+
+    def stats(self) -> Dict[str, Optional[float]]:
+        """Metriche per il dimensionamento degli host: RSS, sessioni residenti, sfratti e fault-in."""
+        resident = sum(len(shard.sessions) for shard in self._shards)
+        elapsed = time.monotonic() - self._started
+        with self._stats_lock:
+            latencies = sorted(self._fault_in_latencies)
+            evictions, fault_ins, resident_bytes = self.evictions, self.fault_ins, self._resident_bytes
+        return {
+            "rss_bytes": resident_set_size(),
+            "resident_sessions": resident,
+            "resident_bytes_estimate": resident_bytes,
+            "evictions": evictions,
+            "evictions_per_second": evictions / elapsed if elapsed else 0.0,
+            "fault_ins": fault_ins,
+            "fault_in_p50_ms": statistics.median(latencies) * 1000 if latencies else None,
+            "fault_in_p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000 if len(latencies) >= 20 else None,
+        }
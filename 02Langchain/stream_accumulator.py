@@ -0,0 +1,112 @@
+"""
+Accumulatore incrementale per lo streaming di "D01 Streaming.py".
+
+Invece di tenere la lista dei chunk e ricalcolare testo e conteggi a ogni chunk (O(n) per chunk,
+O(n²) in totale), StreamAccumulator aggiorna tutto in O(lunghezza del chunk):
+- testo: solo le stringhe dei delta (nessun oggetto chunk trattenuto), unite quando servono
+- parole: conta le parole del delta, tenendo conto di una parola spezzata tra due chunk
+- token: un chunk di contenuto corrisponde a un token dell'API; se l'ultimo chunk porta
+  `usage_metadata` vale quel numero
+
+Misura anche il time-to-first-token, i percentili della latenza tra token e i token al secondo.
+"""
+
+import statistics
+import time
+from array import array
+from typing import Any, Callable, Dict, List, Optional
+
+from langchain_core.messages import AIMessage
+
+
+class StreamAccumulator:
+    def __init__(self, clock: Callable[[], float] = time.perf_counter):
+        self._clock = clock
+        self.started = clock()
+        self.first_token_at: Optional[float] = None
+        self.last_token_at: Optional[float] = None
+        self.word_count = 0
+        self.token_count = 0
+        self.char_count = 0
+        self.usage_metadata: Optional[Dict[str, Any]] = None
+        self._parts: List[str] = []
+        self._text: Optional[str] = ""
+        self._ends_with_space = True
+        self._gaps = array("d")  # secondi tra un token e il successivo
+
+    def feed(self, chunk: Any) -> str:
+        """Aggiunge un chunk (messaggio LangChain o stringa) e restituisce il suo testo."""
+        usage = getattr(chunk, "usage_metadata", None)
+        if usage:
+            self.usage_metadata = usage
+        delta = chunk if isinstance(chunk, str) else chunk.content
+        if not isinstance(delta, str) or not delta:
+            return ""
+
+        now = self._clock()
+        if self.first_token_at is None:
+            self.first_token_at = now
+        else:
+            self._gaps.append(now - self.last_token_at)
+        self.last_token_at = now
+        self.token_count += 1
+        self.char_count += len(delta)
+
+        words = len(delta.split())
+        # Il chunk continua l'ultima parola del precedente ("Fé" + "dération")
+        if words and not self._ends_with_space and not delta[0].isspace():
+            words -= 1
+        self.word_count += words
+        self._ends_with_space = delta[-1].isspace()
+
+        self._parts.append(delta)
+        self._text = None
+        return delta
+
+    @property
+    def text(self) -> str:
+        """Testo accumulato; le parti vengono unite una sola volta e poi riusate."""
+        if self._text is None:
+            self._text = "".join(self._parts)
+            self._parts = [self._text]
+        return self._text
+
+    @property
+    def tokens(self) -> int:
+        if self.usage_metadata and self.usage_metadata.get("output_tokens"):
+            return self.usage_metadata["output_tokens"]
+        return self.token_count
+
+    @property
+    def ttft(self) -> Optional[float]:
+        """Time to first token in secondi, dall'avvio dell'accumulatore."""
+        return None if self.first_token_at is None else self.first_token_at - self.started
+
+    def inter_token_latency(self, percentiles=(50, 95, 99)) -> Dict[str, float]:
+        """Percentili della latenza tra token consecutivi, in secondi."""
+        if len(self._gaps) < 2:
+            value = self._gaps[0] if self._gaps else 0.0
+            return {f"p{p}": value for p in percentiles}
+        cuts = statistics.quantiles(self._gaps, n=100, method="inclusive")
+        return {f"p{p}": cuts[p - 1] for p in percentiles}
+
+    @property
+    def tokens_per_second(self) -> float:
+        """Velocità di generazione dal primo all'ultimo token."""
+        if self.first_token_at is None or self.last_token_at == self.first_token_at:
+            return 0.0
+        return (self.token_count - 1) / (self.last_token_at - self.first_token_at)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "ttft_ms": None if self.ttft is None else self.ttft * 1000,
+            "inter_token_ms": {k: v * 1000 for k, v in self.inter_token_latency().items()},
+            "tokens_per_second": self.tokens_per_second,
+            "tokens": self.tokens,
+            "words": self.word_count,
+            "chars": self.char_count,
+        }
+
+    def message(self) -> AIMessage:
+        """Il messaggio completo, con l'usage dell'ultimo chunk se presente."""
+        return AIMessage(content=self.text, usage_metadata=self.usage_metadata)
@@ -0,0 +1,205 @@
+"""
+Cancellazione degli stream che chiude davvero la connessione verso il provider.
+
+Interrompere il ciclo su `llm.stream(...)` non basta: finché il generatore resta aperto (o il thread
+resta bloccato sulla lettura del prossimo chunk) la risposta HTTP resta aperta, il provider continua
+a generare (e a fatturare) e la connessione non torna al pool.
+
+- CancellationToken: si cancella da qualsiasi thread (un handler di Ctrl+C, un altro task, un
+  timeout). Alla cancellazione chiude subito (shutdown del socket) le risposte HTTP aperte sotto il
+  token, anche se un thread è fermo sulla lettura, e registra il risultato parziale in `partial`.
+- cancellable_http_client / cancellable_async_http_client: i client httpx da passare a ChatOpenAI
+  (`http_client`, `http_async_client`); un event hook collega ogni risposta al token attivo.
+- stream / astream / astream_events: come i metodi dei Runnable (modelli e catene LCEL), ma si
+  fermano alla cancellazione, chiudono il generatore sottostante e accumulano il parziale.
+
+Uso:
+    llm = ChatOpenAI(http_client=cancellable_http_client(), http_async_client=cancellable_async_http_client())
+    token = CancellationToken()
+    for chunk in stream(chain, {"topic": "birds"}, token):   # token.cancel() da un altro thread
+        ...
+    if token.cancelled:
+        print(token.partial)
+"""
+
+import asyncio
+import contextvars
+import socket
+import threading
+from typing import Any, AsyncIterator, Callable, Iterator, List, Optional
+
+import httpx
+import openai
+
+_active_scope: contextvars.ContextVar[Optional["_StreamScope"]] = contextvars.ContextVar(
+    "active_stream_scope", default=None)
+
+
+class CancellationToken:
+    def __init__(self):
+        self.reason: Optional[str] = None
+        self.partial: Any = None
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks: List[Callable[[], None]] = []
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self, reason: str = "cancelled") -> None:
+        """Cancella il token (idempotente, thread-safe) e chiude le risposte aperte."""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.reason = reason
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def register(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """Esegue `callback` alla cancellazione (subito se è già cancellato); restituisce la funzione per rimuoverlo."""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return lambda: self._unregister(callback)
+        callback()
+        return lambda: None
+
+    def _unregister(self, callback: Callable[[], None]) -> None:
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+
+class _StreamScope:
+    """Le risposte HTTP aperte da uno stream: collegate al token solo finché lo stream è in corso."""
+
+    def __init__(self, token: CancellationToken):
+        self.token = token
+        self._unregister: List[Callable[[], None]] = []
+
+    def attach(self, response: httpx.Response) -> None:
+        network_stream = response.extensions.get("network_stream")
+        sock = network_stream.get_extra_info("socket") if network_stream is not None else None
+        if sock is not None:
+            self._unregister.append(self.token.register(lambda: _shutdown(sock)))
+
+    def close(self) -> None:
+        # Stream finito: la connessione può tornare al pool e non va più toccata dal token
+        for unregister in self._unregister:
+            unregister()
+        self._unregister = []
+
+
+def _shutdown(sock: socket.socket) -> None:
+    # shutdown (non close) sveglia subito il thread fermo in recv e manda il FIN al server
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+
+def _attach_response(response: httpx.Response) -> None:
+    scope = _active_scope.get()
+    if scope is not None:
+        scope.attach(response)
+
+
+async def _aattach_response(response: httpx.Response) -> None:
+    _attach_response(response)
+
+
+def cancellable_http_client(**kwargs) -> httpx.Client:
+    """Client httpx (con i default dell'SDK openai) le cui risposte si chiudono alla cancellazione."""
+    return openai.DefaultHttpxClient(event_hooks={"response": [_attach_response]}, **kwargs)
+
+
+def cancellable_async_http_client(**kwargs) -> httpx.AsyncClient:
+    return openai.DefaultAsyncHttpxClient(event_hooks={"response": [_aattach_response]}, **kwargs)
+
+
+def _add(partial: Any, chunk: Any) -> Any:
+    """Somma dei chunk come in LangChain (AIMessageChunk, stringhe); altrimenti l'ultimo chunk."""
+    if partial is None:
+        return chunk
+    try:
+        return partial + chunk
+    except TypeError:
+        return chunk
+
+
+def stream(runnable: Any, input: Any, token: CancellationToken, config: Optional[dict] = None,
+           **kwargs) -> Iterator:
+    """`runnable.stream(...)` che si ferma (senza errori) alla cancellazione del token."""
+    iterator = runnable.stream(input, config, **kwargs)
+    scope = _StreamScope(token)
+    try:
+        while not token.cancelled:
+            context = _active_scope.set(scope)
+            try:
+                chunk = next(iterator)
+            except StopIteration:
+                return
+            except Exception:
+                # Socket chiuso dalla cancellazione mentre si leggeva il prossimo chunk
+                if token.cancelled:
+                    return
+                raise
+            finally:
+                _active_scope.reset(context)
+            token.partial = _add(token.partial, chunk)
+            yield chunk
+    except (KeyboardInterrupt, GeneratorExit):
+        token.cancel("interrupted")
+        raise
+    finally:
+        # Chiude la risposta HTTP adesso, non quando il generatore verrà raccolto
+        iterator.close()
+        scope.close()
+
+
+async def _aiterate(iterator: AsyncIterator, token: CancellationToken, on_item: Callable[[Any], None]):
+    scope = _StreamScope(token)
+    try:
+        while not token.cancelled:
+            context = _active_scope.set(scope)
+            try:
+                item = await iterator.__anext__()
+            except StopAsyncIteration:
+                return
+            except Exception:
+                if token.cancelled:
+                    return
+                raise
+            finally:
+                _active_scope.reset(context)
+            on_item(item)
+            yield item
+    except (asyncio.CancelledError, GeneratorExit, KeyboardInterrupt):
+        # Task cancellato o consumatore uscito prima della fine: si chiude anche il socket
+        token.cancel("interrupted")
+        raise
+    finally:
+        await iterator.aclose()
+        scope.close()
+
+
+def astream(runnable: Any, input: Any, token: CancellationToken, config: Optional[dict] = None,
+            **kwargs) -> AsyncIterator:
+    """`runnable.astream(...)` che si ferma alla cancellazione del token."""
+    def on_chunk(chunk):
+        token.partial = _add(token.partial, chunk)
+
+    return _aiterate(runnable.astream(input, config, **kwargs), token, on_chunk)
+
+
+def astream_events(runnable: Any, input: Any, token: CancellationToken, config: Optional[dict] = None,
+                   version: str = "v2", **kwargs) -> AsyncIterator[dict]:
+    """`runnable.astream_events(...)`; il parziale è la somma dei chunk `on_chat_model_stream`."""
+    def on_event(event):
+        if event["event"] == "on_chat_model_stream":
+            token.partial = _add(token.partial, event["data"]["chunk"])
+
+    return _aiterate(runnable.astream_events(input, config, version=version, **kwargs), token, on_event)
@@ -0,0 +1,125 @@
+"""
+Checkpoint e ripresa di una risposta in streaming interrotta (usato da `play`/`resume` in
+"D01 Streaming.py").
+
+- StreamCheckpoint: il prompt inviato, il testo parziale dell'assistente, l'offset in token e il
+  finish_reason (None se lo stream si è interrotto). Si salva nella memoria come AIMessage, con
+  offset e finish_reason in `response_metadata`, e si ricostruisce da lì.
+- continuation(): lo stesso prompt seguito dal testo parziale come messaggio assistant (prefisso
+  dell'assistente). Niente turno "continua" in più né storia aggiuntiva: il modello riparte
+  dall'ultima parola. I provider con il prefill dell'assistente continuano esattamente; gli altri
+  a volte ripetono le ultime parole o ricominciano da capo.
+- OverlapStitcher: toglie dall'inizio della continuazione la parte che ripete la fine del testo
+  parziale (o l'intero parziale, se il modello ricomincia), mentre i chunk arrivano.
+"""
+
+from typing import Any, List, Optional, Sequence
+
+from langchain_core.messages import AIMessage, BaseMessage
+
+# Motivi di fine per cui non c'è niente da riprendere ("length" invece si può continuare)
+COMPLETE_FINISH_REASONS = {"stop", "tool_calls", "function_call", "content_filter"}
+
+
+class StreamCheckpoint:
+    def __init__(self,
+                 prompt: Sequence[BaseMessage],
+                 text: str = "",
+                 token_offset: int = 0,
+                 finish_reason: Optional[str] = None):
+        self.prompt = list(prompt)
+        self.text = text
+        self.token_offset = token_offset
+        self.finish_reason = finish_reason
+
+    @classmethod
+    def record(cls, prompt: Sequence[BaseMessage], accumulator: Any,
+               finish_reason: Optional[str] = None) -> "StreamCheckpoint":
+        """Checkpoint dallo StreamAccumulator di uno stream."""
+        return cls(prompt, accumulator.text, accumulator.tokens, finish_reason)
+
+    def resumed(self, accumulator: Any, finish_reason: Optional[str] = None) -> "StreamCheckpoint":
+        """Nuovo checkpoint dopo una ripresa: testo e offset salvati + quelli della continuazione."""
+        return StreamCheckpoint(self.prompt, self.text + accumulator.text,
+                                self.token_offset + accumulator.tokens, finish_reason)
+
+    @classmethod
+    def from_memory(cls, memory: List[BaseMessage], prompt_messages: int = 1) -> Optional["StreamCheckpoint"]:
+        """Ricostruisce il checkpoint dall'ultima risposta in memoria e dai `prompt_messages` messaggi prima."""
+        if not memory or not isinstance(memory[-1], AIMessage):
+            return None
+        last = memory[-1]
+        metadata = last.response_metadata or {}
+        return cls(memory[-1 - prompt_messages:-1],
+                   last.content if isinstance(last.content, str) else "",
+                   metadata.get("token_offset", 0),
+                   metadata.get("finish_reason"))
+
+    @property
+    def complete(self) -> bool:
+        return self.finish_reason in COMPLETE_FINISH_REASONS
+
+    def continuation(self) -> List[BaseMessage]:
+        """Prompt originale + testo parziale come prefisso dell'assistente."""
+        if not self.text:
+            return list(self.prompt)
+        return [*self.prompt, AIMessage(content=self.text)]
+
+    def to_message(self) -> AIMessage:
+        return AIMessage(content=self.text,
+                         response_metadata={"token_offset": self.token_offset, "finish_reason": self.finish_reason})
+
+
+class OverlapStitcher:
+    """
+    Rimuove la sovrapposizione tra la fine di `previous` e l'inizio della continuazione.
+    I primi caratteri della continuazione restano in attesa finché non si sa quanto si sovrappongono
+    (al massimo `window` caratteri); dopo, feed() restituisce i delta così come arrivano.
+    Sovrapposizioni più corte di `min_overlap` caratteri non vengono tolte ("e" + "ed" non è una
+    ripetizione), tranne quando il modello ricomincia dall'inizio.
+    """
+
+    def __init__(self, previous: str, min_overlap: int = 8, window: int = 512):
+        self.previous = previous
+        self.min_overlap = min_overlap
+        self.removed = 0
+        self._buffer = ""
+        self._resolved = not previous
+        tail = previous[-window:]
+        # Lunghezze possibili della sovrapposizione, dalla più lunga
+        lengths = range(len(tail), min(min_overlap, len(tail)) - 1, -1)
+        self._suffixes = [tail[-k:] for k in lengths if k >= min_overlap or k == len(previous)]
+        if len(previous) > len(tail):
+            self._suffixes.insert(0, previous)  # il modello ricomincia la risposta da capo
+
+    def feed(self, delta: str) -> str:
+        if self._resolved:
+            return delta
+        self._buffer += delta
+        buffer = self._buffer
+        # Suffissi ancora compatibili con quello che è arrivato finora
+        self._suffixes = [s for s in self._suffixes if s.startswith(buffer) or buffer.startswith(s)]
+        if any(len(s) > len(buffer) for s in self._suffixes):
+            return ""
+        return self._resolve()
+
+    def flush(self) -> str:
+        """Da chiamare a fine stream: restituisce quello che è rimasto in attesa."""
+        if self._resolved:
+            return ""
+        # Lo stream è finito dentro la sovrapposizione: era tutta ripetizione
+        if any(s.startswith(self._buffer) for s in self._suffixes):
+            self.removed = len(self._buffer)
+            self._resolved = True
+            self._buffer = ""
+            return ""
+        return self._resolve()
+
+    def _resolve(self) -> str:
+        overlap = max((len(s) for s in self._suffixes if self._buffer.startswith(s)), default=0)
+        self.removed = overlap
+        text = self._buffer[overlap:]
+        self._resolved = True
+        self._buffer = ""
+        self._suffixes = []
+        return text
@@ -0,0 +1,268 @@
+"""
+Gateway HTTP asincrono (aiohttp) che porta ai browser le sessioni ChatBot di "D01 Streaming.py",
+sopra SessionRuntime (stream_runtime.py).
+
+- GET/POST /sessions/{session_id}/sse   il messaggio è in `?message=` o nel body JSON
+  {"message": ...}; la risposta è in Server-Sent Events: `event: delta` con {"text": ...} e alla
+  fine `event: end` con le statistiche dello stream (o `event: error`)
+- GET /sessions/{session_id}/ws         WebSocket: ogni messaggio di testo del client è un turno,
+  il server risponde con frame JSON {"type": "delta", "text": ...} e {"type": "end", ...}
+
+Un body che non è un oggetto JSON con `message` stringa riceve 400; quando il runtime ha raggiunto il
+tetto di sessioni (tutte in streaming) una nuova sessione riceve 503.
+
+Invece di una write (e una syscall) per chunk, i chunk vengono uniti in un frame ogni `cadence`
+secondi, o prima se superano `max_frame_chars`; il primo chunk parte subito, per non ritardare il
+time-to-first-token.
+
+Contropressione per connessione: ogni write aspetta che il buffer del socket del client si svuoti;
+intanto il gateway non legge altri chunk, la coda della sessione si riempie e si ferma anche lo
+stream verso il provider. Un client che non legge per `send_timeout` secondi viene disconnesso.
+
+Spegnimento: drain() (chiamato anche da on_shutdown di aiohttp) rifiuta i nuovi stream con 503,
+lascia finire quelli in corso per `drain_timeout` secondi, poi li cancella e chiude i WebSocket.
+
+Uso:
+    gateway = StreamGateway(SessionRuntime(lambda llm: ChatBot(name, instructions, examples, llm=llm)))
+    web.run_app(gateway.app(), port=8080)
+"""
+
+import asyncio
+import json
+import re
+from typing import Any, AsyncIterator, Dict, Optional, Set
+
+from aiohttp import WSCloseCode, WSMsgType, web
+
+from stream_runtime import SessionLimitError, SessionRuntime
+
+
+async def coalesce(chunks: AsyncIterator[str], cadence: float, max_chars: int = 4096) -> AsyncIterator[str]:
+    """Unisce i chunk in frame: il primo subito, poi uno ogni `cadence` secondi (o a `max_chars` caratteri)."""
+    if cadence <= 0:
+        async for chunk in chunks:
+            yield chunk
+        return
+
+    loop = asyncio.get_running_loop()
+    parts, size = [], 0
+    deadline: Optional[float] = None
+    first = True
+    pending: Optional[asyncio.Future] = None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(chunks.__anext__())
+            timeout = None if deadline is None else max(0.0, deadline - loop.time())
+            # Allo scadere della cadenza si invia il buffer, senza cancellare la lettura in corso
+            done, _ = await asyncio.wait((pending,), timeout=timeout)
+            if done:
+                try:
+                    chunk = pending.result()
+                except StopAsyncIteration:
+                    pending = None
+                    break
+                pending = None
+                parts.append(chunk)
+                size += len(chunk)
+                if deadline is None:
+                    deadline = loop.time() + cadence
+                if not first and size < max_chars and loop.time() < deadline:
+                    continue
+            first = False
+            if parts:
+                yield "".join(parts)
+            parts, size, deadline = [], 0, None
+        if parts:
+            yield "".join(parts)
+    finally:
+        if pending is not None and not pending.done():
+            pending.cancel()
+            try:
+                await pending
+            except (asyncio.CancelledError, StopAsyncIteration):
+                pass
+
+
+def _session_id(request: web.Request) -> str:
+    session_id = request.match_info["session_id"]
+    if not re.fullmatch(r"[\w.-]{1,128}", session_id):
+        raise web.HTTPBadRequest(text="invalid session id")
+    return session_id
+
+
+def _sse(event: str, data: Any) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n".encode()
+
+
+class StreamGateway:
+    """
+    - runtime: il SessionRuntime con le sessioni e le loro code limitate
+    - cadence: secondi tra un frame e il successivo (0 = un frame per chunk)
+    - max_frame_chars: un frame parte prima della cadenza se il testo in attesa arriva a questa lunghezza
+    - send_timeout: secondi massimi di attesa per una write verso un client che non legge
+    - drain_timeout: secondi concessi agli stream in corso allo spegnimento
+    """
+
+    def __init__(self,
+                 runtime: SessionRuntime,
+                 cadence: float = 0.05,
+                 max_frame_chars: int = 4096,
+                 send_timeout: float = 30.0,
+                 drain_timeout: float = 10.0):
+        self.runtime = runtime
+        self.cadence = cadence
+        self.max_frame_chars = max_frame_chars
+        self.send_timeout = send_timeout
+        self.drain_timeout = drain_timeout
+        self.draining = False
+        self.counters = {"streams": 0, "chunks": 0, "frames": 0, "bytes": 0, "slow_clients": 0, "cancelled": 0}
+        self._streams: Set[asyncio.Task] = set()
+        self._sockets: Set[web.WebSocketResponse] = set()
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.add_routes([
+            web.get("/sessions/{session_id}/sse", self.sse),
+            web.post("/sessions/{session_id}/sse", self.sse),
+            web.get("/sessions/{session_id}/ws", self.websocket),
+        ])
+        app.on_shutdown.append(lambda app: self.drain())
+        app.on_cleanup.append(lambda app: self.runtime.aclose())
+        return app
+
+    async def _frames(self, session_id: str, message: str) -> AsyncIterator[str]:
+        async def counted():
+            async for chunk in self.runtime.send(session_id, message):
+                self.counters["chunks"] += 1
+                yield chunk
+
+        self.counters["streams"] += 1
+        async for frame in coalesce(counted(), self.cadence, self.max_frame_chars):
+            self.counters["frames"] += 1
+            self.counters["bytes"] += len(frame)
+            yield frame
+
+    def _end_stats(self, session_id: str) -> Dict[str, Any]:
+        session = self.runtime.sessions.get(session_id)
+        return getattr(session.bot, "last_stream_stats", {}) if session is not None else {}
+
+    def _open(self, session_id: str) -> None:
+        """Apre la sessione prima di rispondere: al tetto di sessioni il client riceve 503, non uno stream."""
+        try:
+            self.runtime.open(session_id)
+        except SessionLimitError as e:
+            raise web.HTTPServiceUnavailable(text=str(e))
+
+    async def _stream(self, request: web.Request, message: str, send) -> None:
+        """Invia la risposta frame per frame; drain() può fermarla, il client riceve comunque la fine."""
+        session_id = _session_id(request)
+
+        async def pump():
+            async for frame in self._frames(session_id, message):
+                # La write aspetta il client (contropressione); oltre send_timeout il client è troppo lento
+                async with asyncio.timeout(self.send_timeout):
+                    await send("delta", {"text": frame})
+
+        task = asyncio.create_task(pump())
+        self._streams.add(task)
+        try:
+            try:
+                await task
+                end = self._end_stats(session_id)
+            except asyncio.CancelledError:
+                if asyncio.current_task().cancelling():
+                    task.cancel()
+                    raise
+                # Fermato da drain(): la risposta si chiude comunque in modo regolare
+                self.counters["cancelled"] += 1
+                end = {"reason": "shutdown"}
+            except Exception as e:
+                if isinstance(e, (TimeoutError, ConnectionResetError)):
+                    raise
+                await send("error", {"error": type(e).__name__, "message": str(e)})
+                return
+            await send("end", end)
+        except TimeoutError:
+            # Client che non legge: si chiude la connessione invece di aspettarlo ancora
+            self.counters["slow_clients"] += 1
+            if request.transport is not None:
+                request.transport.abort()
+        except ConnectionResetError:
+            pass  # client già andato via
+        finally:
+            self._streams.discard(task)
+
+    async def sse(self, request: web.Request) -> web.StreamResponse:
+        if self.draining:
+            raise web.HTTPServiceUnavailable(text="gateway is shutting down")
+        session_id = _session_id(request)
+        message = request.query.get("message")
+        if message is None and request.can_read_body:
+            try:
+                body = await request.json()
+            except ValueError:  # JSON non valido (o non UTF-8)
+                raise web.HTTPBadRequest(text="body must be a JSON object")
+            if not isinstance(body, dict):
+                raise web.HTTPBadRequest(text="body must be a JSON object")
+            message = body.get("message")
+        if not message or not isinstance(message, str):
+            raise web.HTTPBadRequest(text="missing 'message'")
+        self._open(session_id)
+
+        response = web.StreamResponse(headers={
+            "Content-Type": "text/event-stream",
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",  # niente buffering nei reverse proxy
+        })
+        await response.prepare(request)
+
+        async def send(event, data):
+            await response.write(_sse(event, data))
+
+        await self._stream(request, message, send)
+        return response
+
+    async def websocket(self, request: web.Request) -> web.WebSocketResponse:
+        if self.draining:
+            raise web.HTTPServiceUnavailable(text="gateway is shutting down")
+        self._open(_session_id(request))
+        ws = web.WebSocketResponse(heartbeat=30.0)
+        await ws.prepare(request)
+
+        async def send(kind, data):
+            await ws.send_json({"type": kind, **data})
+
+        try:
+            # In _sockets solo mentre aspetta il prossimo messaggio: drain() chiude subito i WebSocket
+            # inattivi, quelli con uno stream in corso si chiudono dopo l'evento di fine
+            self._sockets.add(ws)
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    continue
+                self._sockets.discard(ws)
+                await self._stream(request, msg.data, send)
+                if self.draining:
+                    break
+                self._sockets.add(ws)
+        finally:
+            self._sockets.discard(ws)
+            if not ws.closed:
+                await ws.close(code=WSCloseCode.GOING_AWAY if self.draining else WSCloseCode.OK)
+        return ws
+
+    async def drain(self, timeout: Optional[float] = None) -> None:
+        """Spegnimento ordinato: niente nuovi stream, quelli in corso finiscono o vengono cancellati."""
+        self.draining = True
+        timeout = self.drain_timeout if timeout is None else timeout
+        if self._streams:
+            _, unfinished = await asyncio.wait(set(self._streams), timeout=timeout)
+            for task in unfinished:
+                task.cancel()
+        # WebSocket senza stream in corso: si chiudono con 1001 (going away)
+        for ws in list(self._sockets):
+            await ws.close(code=WSCloseCode.GOING_AWAY, message=b"server shutdown")
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.counters, "active_streams": len(self._streams), "websockets": len(self._sockets),
+                **self.runtime.stats()}
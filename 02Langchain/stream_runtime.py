@@ -0,0 +1,198 @@
+"""
+Runtime asincrono per migliaia di conversazioni in streaming su un solo event loop.
+
+- Ogni sessione ha il suo ChatBot (di "D01 Streaming.py") e la sua configurazione del modello
+  (modello, temperatura, max_tokens, ...). Le istanze ChatOpenAI sono condivise tra le sessioni con
+  la stessa configurazione e usano tutte un unico httpx.AsyncClient, invece di un pool di
+  connessioni per sessione.
+- Un task produttore per risposta legge lo stream del modello e lo mette in una coda limitata
+  (`queue_size` pezzi di testo). Se il consumatore è lento la coda si riempie, il produttore si
+  ferma e smette di leggere dal socket: la contropressione arriva fino al provider, senza
+  accumulare in memoria un'intera risposta per ogni client lento.
+- Non vengono trattenuti eventi né chunk: in memoria restano la conversazione e la coda.
+- Le sessioni non sono eterne: quelle senza messaggi da `idle_timeout` secondi vengono chiuse e,
+  oltre `max_sessions`, si chiudono le meno recenti. Le sessioni in streaming non vengono mai
+  chiuse; se sono tutte in streaming e il tetto è raggiunto, open() solleva SessionLimitError.
+
+Uso:
+    runtime = SessionRuntime(lambda llm: ChatBot(name, instructions, examples, llm=llm))
+    runtime.open("user-1", model="gpt-4o-mini", temperature=0.2)
+    async for text in runtime.send("user-1", "Ciao!"):
+        ...
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+import httpx
+from langchain_openai import ChatOpenAI
+
+from stream_cancel import cancellable_async_http_client
+
+_END = object()
+
+
+class SessionLimitError(RuntimeError):
+    """Tetto di sessioni raggiunto e nessuna sessione inattiva da chiudere."""
+
+
+class _Failure:
+    __slots__ = ("error",)
+
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+class StreamSession:
+    """Una conversazione: il bot, la coda limitata verso il consumatore e il task che la riempie."""
+
+    __slots__ = ("session_id", "bot", "queue", "task", "last_used")
+
+    def __init__(self, session_id: str, bot: Any, queue_size: int):
+        self.session_id = session_id
+        self.bot = bot
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.task: Optional[asyncio.Task] = None
+        self.last_used = time.monotonic()
+
+    @property
+    def streaming(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    async def _produce(self, message: str) -> None:
+        try:
+            async for text in self.bot.astream(message):
+                # Coda piena = consumatore lento: il produttore aspetta e non legge altro dal modello
+                await self.queue.put(text)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            await self.queue.put(_Failure(e))
+            return
+        await self.queue.put(_END)
+
+    async def reply(self, message: str) -> AsyncIterator[str]:
+        """Invia il messaggio e restituisce la risposta un pezzo di testo alla volta."""
+        if self.streaming:
+            raise RuntimeError(f"session {self.session_id!r} is already streaming a reply")
+        self.task = asyncio.create_task(self._produce(message))
+        try:
+            while True:
+                item = await self.queue.get()
+                if item is _END:
+                    return
+                if isinstance(item, _Failure):
+                    raise item.error
+                yield item
+        finally:
+            # Consumatore uscito prima della fine (disconnessione, errore): si ferma anche il produttore
+            if not self.task.done():
+                self.task.cancel()
+                try:
+                    await self.task
+                except asyncio.CancelledError:
+                    pass
+            while not self.queue.empty():
+                self.queue.get_nowait()
+
+
+class SessionRuntime:
+    """
+    - bot_factory: funzione che riceve il ChatOpenAI configurato e crea il bot della sessione
+    - queue_size: pezzi di testo in attesa per sessione prima che il produttore si fermi
+    - max_connections: connessioni HTTP contemporanee verso il provider (una per stream attivo)
+    - default_config: parametri di ChatOpenAI validi per tutte le sessioni, sovrascrivibili in open()
+    - max_sessions: sessioni aperte al massimo (None = nessun tetto)
+    - idle_timeout: secondi senza messaggi dopo cui una sessione viene chiusa (None = mai)
+    """
+
+    def __init__(self,
+                 bot_factory: Callable[[ChatOpenAI], Any],
+                 queue_size: int = 16,
+                 max_connections: int = 4096,
+                 default_config: Optional[Dict[str, Any]] = None,
+                 http_client: Optional[httpx.AsyncClient] = None,
+                 max_sessions: Optional[int] = 10_000,
+                 idle_timeout: Optional[float] = 3600.0):
+        self.bot_factory = bot_factory
+        self.queue_size = queue_size
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.expired = 0
+        self.default_config = {"model": "gpt-4o-mini", "temperature": 0.0, **(default_config or {})}
+        # Le risposte si chiudono alla cancellazione dello stream (stream_cancel.py)
+        self.http_client = http_client or cancellable_async_http_client(
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=256),
+            timeout=httpx.Timeout(60.0, connect=10.0),
+        )
+        # In ordine di ultimo utilizzo: le prime sono le candidate alla chiusura
+        self.sessions: "OrderedDict[str, StreamSession]" = OrderedDict()
+        self._models: Dict[Tuple, ChatOpenAI] = {}
+
+    def llm(self, **config) -> ChatOpenAI:
+        """ChatOpenAI per la configurazione data, condiviso tra le sessioni che la usano."""
+        config = {**self.default_config, **config}
+        key = tuple(sorted((k, repr(v)) for k, v in config.items()))
+        model = self._models.get(key)
+        if model is None:
+            model = self._models[key] = ChatOpenAI(http_async_client=self.http_client, **config)
+        return model
+
+    def _expire(self) -> None:
+        """Chiude le sessioni inattive da idle_timeout e, oltre max_sessions, le meno recenti non in streaming."""
+        now = time.monotonic()
+        excess = len(self.sessions) + 1 - self.max_sessions if self.max_sessions is not None else 0
+        victims: List[str] = []
+        for session_id, session in self.sessions.items():
+            idle = self.idle_timeout is not None and now - session.last_used > self.idle_timeout
+            if not idle and len(victims) >= excess:
+                break
+            if not session.streaming:
+                victims.append(session_id)
+        for session_id in victims:
+            del self.sessions[session_id]
+        self.expired += len(victims)
+        if self.max_sessions is not None and len(self.sessions) >= self.max_sessions:
+            raise SessionLimitError(f"{len(self.sessions)} sessions are streaming, the limit is {self.max_sessions}")
+
+    def open(self, session_id: str, **config) -> StreamSession:
+        """Crea la sessione (o restituisce quella esistente) con la sua configurazione del modello."""
+        session = self.sessions.get(session_id)
+        if session is None:
+            self._expire()
+            bot = self.bot_factory(self.llm(**config))
+            session = self.sessions[session_id] = StreamSession(session_id, bot, self.queue_size)
+        else:
+            self.sessions.move_to_end(session_id)
+        session.last_used = time.monotonic()
+        return session
+
+    def send(self, session_id: str, message: str) -> AsyncIterator[str]:
+        """Invia un messaggio alla sessione (creata con la configurazione di default se non esiste)."""
+        return self.open(session_id).reply(message)
+
+    async def close(self, session_id: str) -> None:
+        session = self.sessions.pop(session_id, None)
+        if session is not None and session.streaming:
+            session.task.cancel()
+            try:
+                await session.task
+            except asyncio.CancelledError:
+                pass
+
+    async def aclose(self) -> None:
+        for session_id in list(self.sessions):
+            await self.close(session_id)
+        await self.http_client.aclose()
+
+    def stats(self) -> Dict[str, int]:
+        streaming = [s for s in self.sessions.values() if s.streaming]
+        return {
+            "sessions": len(self.sessions),
+            "streaming": len(streaming),
+            "queued_chunks": sum(s.queue.qsize() for s in streaming),
+            "models": len(self._models),
+            "expired_sessions": self.expired,
+        }
@@ -0,0 +1,307 @@
+"""
+Structured output in streaming per "D02 Schemas and output parsers.py".
+
+`llm.with_structured_output(Performer)` restituisce l'oggetto solo quando il JSON è completo; i
+parser JSON di LangChain in streaming invece rileggono tutto il testo ricevuto a ogni chunk
+(O(n²) sulla lunghezza della risposta).
+
+- IncrementalJSONParser: parser JSON a push; ogni carattere viene esaminato una sola volta (il
+  contenuto delle stringhe a blocchi, con una regex) e per ogni valore completato chiama
+  `on_value(path, value)`, per esempio (("film_names", 3), "Cast Away"). Ogni contenitore sa quale
+  token si aspetta (chiave, `:`, valore, `,` o chiusura): JSON malformato solleva
+  OutputParserException appena arriva il carattere sbagliato.
+- StreamingStructuredParser: valida ogni campo (e ogni elemento delle liste) appena il suo valore è
+  completo, con il TypeAdapter del campo, e restituisce oggetti parziali del modello pydantic
+  costruiti solo con valori già validati. Alla fine valida l'oggetto intero.
+- stream_structured / astream_structured: come `with_structured_output(schema).stream(...)`, ma
+  producono un oggetto parziale appena arriva un nuovo valore (un nuovo film della lista appena la
+  sua stringa si chiude).
+"""
+
+import json
+import re
+import types
+from typing import (Annotated, Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple, Type, Union,
+                    get_args, get_origin)
+
+from langchain_core.exceptions import OutputParserException
+from pydantic import BaseModel, TypeAdapter, ValidationError
+
+_STRING_STOP = re.compile(r'["\\]')
+_SCALAR_END = re.compile(r'[\s,\]}]')
+_DECODER = json.JSONDecoder(strict=False)  # accetta anche a capo non escapati nelle stringhe
+
+# Token attesi dal contenitore corrente (o dal livello principale)
+_VALUE = "a value"
+_VALUE_OR_END = "a value or ']'"
+_KEY = "a key"
+_KEY_OR_END = "a key or '}'"
+_COLON = "':'"
+_COMMA_OR_END = "',' or the end of the container"
+_DONE = "the end of the stream"
+
+
+class _Frame:
+    __slots__ = ("container", "key", "is_object", "expect")
+
+    def __init__(self, container):
+        self.container = container
+        self.key = None
+        self.is_object = isinstance(container, dict)
+        self.expect = _KEY_OR_END if self.is_object else _VALUE_OR_END
+
+
+class IncrementalJSONParser:
+    def __init__(self, on_value: Optional[Callable[[Tuple, Any], None]] = None):
+        self.on_value = on_value
+        self.value: Any = None
+        self.done = False
+        self._stack: List[_Frame] = []
+        self._expect = _VALUE  # token atteso al livello principale
+        self._string: Optional[List[str]] = None  # parti grezze della stringa in corso
+        self._escape = False  # backslash alla fine del chunk precedente
+        self._scalar: List[str] = []  # numero o letterale in corso
+
+    def _expected(self) -> str:
+        return self._stack[-1].expect if self._stack else self._expect
+
+    def _set_expected(self, expect: str) -> None:
+        if self._stack:
+            self._stack[-1].expect = expect
+        else:
+            self._expect = expect
+
+    def _unexpected(self, c: str) -> OutputParserException:
+        return OutputParserException(f"Unexpected {c!r} in JSON stream: expected {self._expected()}")
+
+    def feed(self, text: str) -> None:
+        i, n = 0, len(text)
+        while i < n:
+            if self._string is not None:
+                if self._escape:
+                    self._string.append(text[i])
+                    self._escape = False
+                    i += 1
+                    continue
+                stop = _STRING_STOP.search(text, i)
+                if stop is None:
+                    self._string.append(text[i:])
+                    return
+                j = stop.start()
+                self._string.append(text[i:j])
+                if text[j] == '"':
+                    raw, self._string = "".join(self._string), None
+                    self._complete_string(raw)
+                    i = j + 1
+                elif j + 1 < n:
+                    self._string.append(text[j:j + 2])  # sequenza di escape, decodificata a fine stringa
+                    i = j + 2
+                else:
+                    self._string.append("\\")
+                    self._escape = True
+                    i = j + 1
+                continue
+
+            if self._scalar:
+                end = _SCALAR_END.search(text, i)
+                if end is None:
+                    self._scalar.append(text[i:])
+                    return
+                self._scalar.append(text[i:end.start()])
+                self._flush_scalar()
+                i = end.start()
+                continue
+
+            c = text[i]
+            i += 1
+            if c.isspace():
+                continue
+            expect = self._expected()
+            if c == '"':
+                if expect not in (_VALUE, _VALUE_OR_END, _KEY, _KEY_OR_END):
+                    raise self._unexpected(c)
+                self._string = []
+            elif c == "{" or c == "[":
+                if expect not in (_VALUE, _VALUE_OR_END):
+                    raise self._unexpected(c)
+                self._stack.append(_Frame({} if c == "{" else []))
+            elif c == "}" or c == "]":
+                frame = self._stack[-1] if self._stack else None
+                if (frame is None or frame.is_object != (c == "}")
+                        or expect not in (_COMMA_OR_END, _KEY_OR_END if c == "}" else _VALUE_OR_END)):
+                    raise self._unexpected(c)
+                self._complete(self._stack.pop().container)
+            elif c == ",":
+                if expect != _COMMA_OR_END or not self._stack:
+                    raise self._unexpected(c)
+                self._set_expected(_KEY if self._stack[-1].is_object else _VALUE)
+            elif c == ":":
+                if expect != _COLON:
+                    raise self._unexpected(c)
+                self._set_expected(_VALUE)
+            elif expect in (_VALUE, _VALUE_OR_END):
+                self._scalar.append(c)
+            else:
+                raise self._unexpected(c)
+
+    def close(self) -> Any:
+        """Fine dello stream: restituisce il valore completo."""
+        if self._scalar:
+            self._flush_scalar()
+        if not self.done:
+            raise OutputParserException("Incomplete JSON in stream")
+        return self.value
+
+    def _flush_scalar(self) -> None:
+        token, self._scalar = "".join(self._scalar), []
+        try:
+            value = json.loads(token)
+        except json.JSONDecodeError as e:
+            raise OutputParserException(f"Invalid JSON value {token!r}") from e
+        self._complete(value)
+
+    def _complete_string(self, raw: str) -> None:
+        value = _DECODER.decode(f'"{raw}"')
+        frame = self._stack[-1] if self._stack else None
+        if frame is not None and frame.expect in (_KEY, _KEY_OR_END):
+            frame.key = value
+            frame.expect = _COLON
+        else:
+            self._complete(value)
+
+    def _complete(self, value: Any) -> None:
+        if not self._stack:
+            self.value = value
+            self.done = True
+            self._expect = _DONE  # dopo il valore principale sono ammessi solo spazi
+            if self.on_value:
+                self.on_value((), value)
+            return
+        frame = self._stack[-1]
+        frame.expect = _COMMA_OR_END
+        if self.on_value:
+            # Percorso del valore: chiavi degli oggetti e indici delle liste che lo contengono
+            path = tuple(f.key if f.is_object else len(f.container) for f in self._stack)
+            self.on_value(path, value)
+        if frame.is_object:
+            frame.container[frame.key] = value
+        else:
+            frame.container.append(value)
+
+
+def _list_item_type(annotation: Any) -> Any:
+    """Tipo degli elementi se il campo è una lista, anche dentro Optional[...] o Annotated[...]; altrimenti None."""
+    while True:
+        origin = get_origin(annotation)
+        if origin is Annotated:
+            annotation = get_args(annotation)[0]
+        elif origin is Union or origin is types.UnionType:
+            options = [arg for arg in get_args(annotation) if arg is not type(None)]
+            if len(options) != 1:
+                return None
+            annotation = options[0]
+        elif origin is list and get_args(annotation):
+            return get_args(annotation)[0]
+        else:
+            return None
+
+
+class StreamingStructuredParser:
+    """Oggetti parziali validati di `schema` man mano che arriva il JSON."""
+
+    def __init__(self, schema: Type[BaseModel]):
+        self.schema = schema
+        self._names: Dict[str, str] = {}
+        self._adapters: Dict[str, TypeAdapter] = {}
+        self._item_adapters: Dict[str, TypeAdapter] = {}
+        for name, field in schema.model_fields.items():
+            key = field.alias or name
+            self._names[key] = name
+            self._adapters[key] = TypeAdapter(field.annotation)
+            item_type = _list_item_type(field.annotation)
+            if item_type is not None:
+                self._item_adapters[key] = TypeAdapter(item_type)
+        self._values: Dict[str, Any] = {}
+        self._changed = False
+        self._json = IncrementalJSONParser(self._on_value)
+
+    def _on_value(self, path: Tuple, value: Any) -> None:
+        try:
+            if len(path) == 1 and path[0] in self._names:
+                # Campo completo (per le liste gli elementi sono già stati validati uno a uno)
+                if path[0] in self._item_adapters and isinstance(value, list):
+                    if len(self._values.get(path[0], ())) == len(value):
+                        return
+                self._values[path[0]] = self._adapters[path[0]].validate_python(value)
+            elif len(path) == 2 and path[0] in self._item_adapters and isinstance(path[1], int):
+                item = self._item_adapters[path[0]].validate_python(value)
+                self._values.setdefault(path[0], []).append(item)
+            else:
+                return
+        except ValidationError:
+            return  # il valore non valido resta fuori dagli oggetti parziali; l'errore arriva in result()
+        self._changed = True
+
+    def feed(self, text: str) -> Optional[BaseModel]:
+        """Aggiunge un pezzo di JSON; restituisce un nuovo oggetto parziale se è arrivato un valore."""
+        self._json.feed(text)
+        if not self._changed:
+            return None
+        self._changed = False
+        return self.partial()
+
+    def partial(self) -> BaseModel:
+        """L'oggetto con i valori validati finora; i campi mancanti hanno il default o None."""
+        values = {}
+        for key, name in self._names.items():
+            field = self.schema.model_fields[name]
+            if key in self._values:
+                value = self._values[key]
+                values[name] = list(value) if isinstance(value, list) else value
+            else:
+                values[name] = None if field.is_required() else field.get_default(call_default_factory=True)
+        return self.schema.model_construct(**values)
+
+    def result(self) -> BaseModel:
+        """Fine dello stream: l'oggetto completo, validato per intero."""
+        try:
+            return self.schema.model_validate(self._json.close())
+        except ValidationError as e:
+            raise OutputParserException(str(e)) from e
+
+
+def _structured_runnable(llm: Any, schema: Type[BaseModel], method: str):
+    # Stesse impostazioni di with_structured_output, ma senza il parser finale che aspetta il JSON intero
+    if method == "function_calling":
+        return llm.bind_tools([schema], tool_choice=schema.__name__)
+    if method == "json_schema":
+        return llm.bind(response_format={"type": "json_schema", "json_schema": {
+            "name": schema.__name__, "schema": schema.model_json_schema()}})
+    raise ValueError(f"Unsupported method {method!r}: use 'function_calling' or 'json_schema'")
+
+
+def _json_delta(chunk: Any) -> str:
+    if chunk.tool_call_chunks:
+        return chunk.tool_call_chunks[0].get("args") or ""
+    return chunk.content if isinstance(chunk.content, str) else ""
+
+
+def stream_structured(llm: Any, schema: Type[BaseModel], input: Any, method: str = "function_calling",
+                      **kwargs) -> Iterator[BaseModel]:
+    """Oggetti parziali validati durante lo stream; l'ultimo è l'oggetto completo validato."""
+    parser = StreamingStructuredParser(schema)
+    for chunk in _structured_runnable(llm, schema, method).stream(input, **kwargs):
+        partial = parser.feed(_json_delta(chunk))
+        if partial is not None:
+            yield partial
+    yield parser.result()
+
+
+async def astream_structured(llm: Any, schema: Type[BaseModel], input: Any, method: str = "function_calling",
+                             **kwargs) -> AsyncIterator[BaseModel]:
+    parser = StreamingStructuredParser(schema)
+    async for chunk in _structured_runnable(llm, schema, method).astream(input, **kwargs):
+        partial = parser.feed(_json_delta(chunk))
+        if partial is not None:
+            yield partial
+    yield parser.result()